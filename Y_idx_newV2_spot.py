@@ -14,9 +14,22 @@ from datetime import datetime
 from yquant.db.models.bn_account import BnAccount
 from yquant.config.config import cfg
 import yquant.common.common_utils as common
+import yquant.common.kline_cache as kline_cache
+import yquant.common.local_ingest as local_ingest
+import yquant.common.daily_store as daily_store
+import yquant.common.stream_ingest as stream_ingest
+import yquant.common.ingest_manifest as ingest_manifest
+import yquant.common.index_engine as index_engine
+import yquant.common.index_state as index_state
+import yquant.common.universe_index as universe_index
+import yquant.common.memo_cache as memo_cache
+import yquant.common.candle_store as candle_store
+from yquant.common.index_dag import IndexDAG
+from yquant.common.market_panel import MarketPanel, get_panel_dir
 from draw_spot import *
 import warnings
 import pandas as pd
+import numpy as np
 import os
 import time
 import sys
@@ -34,66 +47,218 @@ pd.set_option('display.width', 180) # 设置打印宽度(**重要**)
 
 
 
+# 山寨指数排除的稳定币和资产支持代币
+ALCOIN_BLACKLIST = ['BTCDOMUSDT', 'WBTCUSDT', 'WBETHUSDT', 'BNSOLUSDT', 'USDCUSDT', 'PAXGUSDT']  # 示例黑名单，请根据需要修改
+
+# 派生列：山寨指数用于筛选前50的成交额（1d: 365日均值，1h: 48h合计）
+ALCOIN_VOLUME_COL = '山寨筛选成交额'
+# 派生列：全市场涨跌幅指数用于筛选前50的成交额（1d/1h 都是7d合计）
+MARKET_VOLUME_COL = '市场筛选成交额'
+
+# 每日计算的统计周期：全市场涨跌幅指数 7/30/90，山寨指数 30/90/365
+MARKET_STATDAYS = [7, 30, 90]
+ALCOIN_STATDAYS = [30, 90, 365]
+
+
+def compact_market_frame(all_df, float32_volume=False):
+    """
+    紧凑表示的市场长表，返回新的 DataFrame，不修改 all_df
+
+    只保留指数计算需要的 candle_begin_time/symbol/close/quote_volume 四列
+    （open/high/low/volume 指数计算从不读取），symbol 转为分类类型（类别按字母排序，行内只存整数编码），
+    float32_volume=True 时 quote_volume 存为 float32。
+    close 始终保持 float64，涨跌幅与 float64 路径完全相同；
+    float32 成交额只可能在成交额几乎相同的币种之间改变前50的筛选结果，
+    影响程度可以用 verify_compact_dtype.py 检查。
+    """
+    compact = pd.DataFrame({
+        'candle_begin_time': all_df['candle_begin_time'].to_numpy(),
+        'symbol': pd.Categorical(all_df['symbol'].to_numpy(dtype=object)),
+        'close': all_df['close'].to_numpy(dtype='float64'),
+        'quote_volume': all_df['quote_volume'].to_numpy(dtype='float32' if float32_volume else 'float64'),
+    })
+    return compact
+
+
+def build_index_features(all_df, statdays=(7, 30, 90, 365), interval='1d'):
+    """
+    计算山寨指数和全市场涨跌幅指数共用的派生列，返回新的 DataFrame，不修改 all_df
+
+    只保留 candle_begin_time/symbol/close/quote_volume 四列，再加上：
+        涨跌幅{N}d: 每个币种按行计算的N期涨跌幅
+        ALCOIN_VOLUME_COL / MARKET_VOLUME_COL: 两种指数筛选前50使用的滚动成交额
+
+    行按 symbol 稳定排序，与原来 groupby('symbol') 后 concat 的顺序一致，
+    保证后续 rank(method='first') 的并列处理不变。
+    一次计算的结果可以传给所有周期的 alcoin_stat / market_zdf_stat 共用。
+
+    interval='1h' 时 all_df 为小时长表，统计周期仍以天为单位（N天 = 24*N 根K线），
+    涨跌幅和滚动成交额在长表数组上逐币种计算（见 index_engine），避免 24 倍行数下的分组开销
+    """
+    features = sort_index_frame(all_df)
+    groups = symbol_groups(features, interval)
+    for statday in statdays:
+        features[f'涨跌幅{statday}d'] = index_return_column(features, statday, interval, groups)
+    features[ALCOIN_VOLUME_COL], features[MARKET_VOLUME_COL] = index_volume_columns(features, interval, groups)
+    return features
+
+
+def sort_index_frame(all_df):
+    """
+    candle_begin_time/symbol/close/quote_volume 四列，行按 symbol 稳定排序
+    """
+    features = all_df[['candle_begin_time', 'symbol', 'close', 'quote_volume']]
+    symbol = features['symbol']
+    if isinstance(symbol.dtype, pd.CategoricalDtype) and symbol.cat.categories.is_monotonic_increasing:
+        # 分类类型（见 compact_market_frame）直接按整数编码排序
+        order = np.argsort(symbol.cat.codes.to_numpy(), kind='stable')
+    else:
+        order = np.argsort(symbol.to_numpy(dtype=object), kind='stable')
+    return features.iloc[order].reset_index(drop=True)
+
+
+def symbol_groups(features, interval='1d'):
+    """
+    sort_index_frame 结果的按币种分组：1d 为 groupby 对象，1h 为 index_engine.group_bounds 的分段边界
+    """
+    if interval == '1h':
+        return index_engine.group_bounds(pd.factorize(features['symbol'], sort=True)[0])
+    elif interval != '1d':
+        raise ValueError(f"不支持的时间间隔: {interval}")
+    return features.groupby('symbol', sort=False, observed=True)
+
+
+def index_return_column(features, statday, interval='1d', groups=None):
+    """
+    每个币种按行计算的N期涨跌幅（1h 时为 24*N 根K线）
+
+    Returns:
+        np.ndarray: 与 features 的行对齐
+    """
+    groups = symbol_groups(features, interval) if groups is None else groups
+    if interval == '1h':
+        return index_engine.pct_change_rows(features['close'].to_numpy(dtype='float64'), groups, statday * 24)
+    return groups['close'].pct_change(statday).to_numpy()
+
+
+def index_volume_columns(features, interval='1d', groups=None):
+    """
+    两种指数筛选前50使用的滚动成交额
+
+    Returns:
+        tuple: (ALCOIN_VOLUME_COL, MARKET_VOLUME_COL)，均为与 features 的行对齐的 np.ndarray
+    """
+    groups = symbol_groups(features, interval) if groups is None else groups
+    if interval == '1h':
+        quote_volume = features['quote_volume'].to_numpy(dtype='float64')
+        alcoin_volume = index_engine.rolling_rows(quote_volume, groups, 48, 48)  # 48h成交额
+        market_volume = index_engine.rolling_rows(quote_volume, groups, 24 * 7, 7)  # 7d成交额
+        return alcoin_volume, market_volume
+
+    alcoin_volume = groups['quote_volume'].rolling(365, min_periods=365).mean()  # 过滤过去一年成交额最大的50个B构建指数
+    market_volume = groups['quote_volume'].rolling(7, min_periods=7).sum()  # 7d成交额
+    return (alcoin_volume.reset_index(level=0, drop=True).reindex(features.index).to_numpy(),
+            market_volume.reset_index(level=0, drop=True).reindex(features.index).to_numpy())
+
+
+def panel_index_features(panel, statdays=(7, 30, 90, 365), interval='1d'):
+    """
+    在市场面板上计算 build_index_features 的派生列，返回 index_engine.PanelSection
+
+    面板（通常是 MarketPanel.load 内存映射读取的）提供日期轴、币种轴和 close/quote_volume 矩阵。
+    派生列按 币种、日期 的顺序取出面板中有数据的位置计算，与 sort_index_frame 的行顺序相同，
+    再放回 日期 × 币种 矩阵；指数和成员索引直接在面板上分块计算，
+    结果与从长表计算的逐字节一致（verify_index_engine.py）
+    """
+    symbol_ids, date_ids = np.nonzero(~np.isnan(panel.close).T)
+    features = pd.DataFrame({'symbol': symbol_ids, 'close': panel.close[date_ids, symbol_ids],
+                             'quote_volume': panel.quote_volume[date_ids, symbol_ids]})
+    groups = symbol_groups(features, interval)
+    columns = {f'涨跌幅{statday}d': index_return_column(features, statday, interval, groups) for statday in statdays}
+    columns[ALCOIN_VOLUME_COL], columns[MARKET_VOLUME_COL] = index_volume_columns(features, interval, groups)
+    for col, values in columns.items():
+        matrix = np.full(panel.shape, np.nan)
+        matrix[date_ids, symbol_ids] = values
+        columns[col] = matrix
+    return index_engine.PanelSection(panel, columns)
+
+
+def ensure_index_features(df, statdays, interval='1d'):
+    """
+    df 已经是 build_index_features / panel_index_features 的结果（包含所需派生列，长表按 symbol 排序）时直接返回，
+    否则基于 df（长表或 MarketPanel）重新计算
+    """
+    columns = [f'涨跌幅{statday}d' for statday in statdays] + [ALCOIN_VOLUME_COL, MARKET_VOLUME_COL]
+    if isinstance(df, index_engine.PanelSection):
+        if all(col in df.columns for col in columns):
+            return df
+        df = df.panel
+    if isinstance(df, MarketPanel):
+        return panel_index_features(df, statdays=statdays, interval=interval)
+    if all(col in df.columns for col in columns) and df['symbol'].is_monotonic_increasing:
+        return df
+    return build_index_features(df, statdays=statdays, interval=interval)
+
+
+def memo_index_features(all_df, statdays, interval='1d', cache=None, data_key=None):
+    """
+    build_index_features 的缓存版本：每个周期的涨跌幅、两列滚动成交额分别按 (日线的键, 参数) 缓存，
+    增加或减少一个周期只计算该周期的涨跌幅
+
+    Args:
+        all_df: 日线（或小时）长表
+        statdays: 统计周期
+        cache: memo_cache.MemoCache
+        data_key: all_df 的键（例如 memo_local_data 的结果），None 时按 all_df 的内容计算指纹
+
+    Returns:
+        tuple: (features, keys)，keys 为 {派生列名: 缓存键}，供下游步骤组成自己的键
+    """
+    features = sort_index_frame(all_df)
+    data_key = data_key or memo_cache.fingerprint(features)
+    groups = symbol_groups(features, interval)
+    keys = {}
+    for statday in statdays:
+        col = f'涨跌幅{statday}d'
+        features[col], keys[col] = cache.memoize(col, [data_key, interval, statday], index_return_column, features,
+                                                 statday, interval, groups)
+    volumes, keys[ALCOIN_VOLUME_COL] = cache.memoize('滚动成交额', [data_key, interval], index_volume_columns,
+                                                     features, interval, groups)
+    features[ALCOIN_VOLUME_COL], features[MARKET_VOLUME_COL] = volumes
+    keys[MARKET_VOLUME_COL] = keys[ALCOIN_VOLUME_COL]
+    return features, keys
+
+
 def alcoin_stat(alcoin_df, statdays=[30], save_img=True, start_time=None, interval='1d', filename='altcoin_index30', market_type='swap'):
     print(f'alcoin统计开始，统计参数{statdays}')
     '''
     根据Altcoin网站上山寨指数计算方式：If 75% of the Top 50 coins performed better than Bitcoin over the last season (90 days) it is Altcoin Season.
     Excluded from the Top 50 are Stablecoins (Tether, DAI…) and asset backed tokens (WBTC, stETH, cLINK,…)的方法
-    '''
-    # 过滤稳定币和资产支持代币
-    blacklist = ['BTCDOMUSDT', 'WBTCUSDT', 'WBETHUSDT', 'BNSOLUSDT', 'USDCUSDT', 'PAXGUSDT']  # 示例黑名单，请根据需要修改
-    # 过滤掉黑名单中的币种
-    alcoin_df = alcoin_df[~alcoin_df['symbol'].isin(blacklist)]
-    print("过滤黑名单币种完成！")
 
-    # 按币种分组计算N日涨跌幅
-    df_list = []
-    for symbol, _df in alcoin_df.groupby('symbol'):
-        for statday in statdays:
-            _df[f'涨跌幅{statday}d'] = _df['close'].pct_change(statday)
+    alcoin_df 不会被修改；传入 build_index_features / panel_index_features 的结果时直接复用其中的涨跌幅和成交额
+    '''
+    # 按币种分组计算N日涨跌幅和筛选成交额（已计算过则直接复用）
+    alcoin_df = ensure_index_features(alcoin_df, statdays, interval)
 
-        if interval == '1h':
-            _df['成交额'] = _df['quote_volume'].rolling(48, min_periods=48).sum()  # 48h成交额
-        elif interval == '1d':
-            _df['成交额'] = _df['quote_volume'].rolling(365, min_periods=365).mean()  # 过滤过去一年成交额最大的50个B构建指数
-        df_list.append(_df)
-    alcoin_df = pd.concat(df_list)
-    alcoin_df.reset_index(inplace=True)
-
-    # 计算山寨指数
-    final_df = pd.DataFrame(columns=['candle_begin_time', 'BTC排名', '全币种数量', '山寨指数'])
-    for candle_begin_time, _df in alcoin_df.groupby('candle_begin_time'):
-        _df: pd.DataFrame = _df
-        # 过滤成交额前50
-        _df['成交额排名'] = _df['成交额'].rank(ascending=False, method='first')
-        _df = _df[_df['成交额排名'] <= 50]
-
-        # 通过涨跌幅排名计算山寨指数
-        altcoin_index_sum = 0
-        for statday in statdays:
-            _df[f'涨跌幅排名{statday}d'] = _df[f'涨跌幅{statday}d'].rank(ascending=False, method='first')
-            # 安全版本 ✅
-            btc_row = _df[_df['symbol'] == 'BTCUSDT']
-            total_rank = len(_df)
-            if not btc_row.empty:
-                btc_rank = btc_row[f'涨跌幅排名{statday}d'].iloc[0]
-            else:
-                # print(f"警告：未找到 BTCUSDT 在 {candle_begin_time} 时间点的数据")
-                btc_rank = total_rank + 1  # BTC 不在名单内，则排最后一名
-                continue  # 或者设为默认值、跳过该时间点计算
+    # 过滤掉黑名单中的稳定币和资产支持代币（面板上计算时由 blacklist 参数排除）
+    if isinstance(alcoin_df, pd.DataFrame):
+        alcoin_df = alcoin_df[~alcoin_df['symbol'].isin(ALCOIN_BLACKLIST)]
+    print("过滤黑名单币种完成！")
 
-            if pd.isnull(btc_rank) or btc_rank > total_rank:
-                btc_rank = total_rank
+    # 计算山寨指数：每个时间点成交额前50中 BTC 的涨跌幅排名 / 入选数量
+    # 在 日期 × 币种 矩阵上向量化计算（见 index_engine.altcoin_index_frame），
+    # 结果与原来逐时间点 groupby + rank + concat 的实现逐字节一致（verify_index_engine.py）
+    final_df = index_engine.altcoin_index_frame(alcoin_df, statdays, ALCOIN_VOLUME_COL, top_n=50,
+                                                blacklist=ALCOIN_BLACKLIST)
 
-            altcoin_index = round(btc_rank / total_rank, 2)
+    return save_altcoin_index(final_df, statdays, save_img=save_img, start_time=start_time, filename=filename,
+                              market_type=market_type)
 
-            altcoin_index_sum += altcoin_index
-        altcoin_index = altcoin_index_sum / len(statdays)
-        data = {'candle_begin_time': candle_begin_time, 'BTC排名': btc_rank, '全币种数量': total_rank,
-                '山寨指数': altcoin_index}
-        row_df = pd.DataFrame(data, columns=['candle_begin_time', 'BTC排名', '全币种数量', '山寨指数'], index=[0])
-        final_df = pd.concat([final_df, row_df], ignore_index=True)
 
+def save_altcoin_index(final_df, statdays, save_img=True, start_time=None, filename='altcoin_index30', market_type='swap'):
+    """
+    过滤起始时间后保存山寨指数的CSV和图片
+    """
     if start_time is not None:
         final_df = final_df[final_df['candle_begin_time'] > start_time]
 
@@ -109,27 +274,20 @@ def alcoin_stat(alcoin_df, statdays=[30], save_img=True, start_time=None, interv
 
 
     if save_img:
-        draw_index(final_df, market_type, title=f'altcoin_index_{market_type}_{statdays}d', xaxle='山寨指数', min_val=0.05, max_val=0.75, border=0.25,
-                   border_n=2, save_name=filename+'_v2', axhline_high=0.75, axhline_low=0.25, axhline_low2=0.1)
+        draw_altcoin_index(final_df, statdays, filename=filename, market_type=market_type)
 
     return final_df
 
 
+def draw_altcoin_index(final_df, statdays, filename='altcoin_index30', market_type='swap'):
+    draw_index(final_df, market_type, title=f'altcoin_index_{market_type}_{statdays}d', xaxle='山寨指数', min_val=0.05, max_val=0.75, border=0.25,
+               border_n=2, save_name=filename+'_v2', axhline_high=0.75, axhline_low=0.25, axhline_low2=0.1)
+
+
 def market_zdf_stat(market_df, statdays=[30], save_img=True, start_time=None, interval='1d', filename='marketzdf_index30', market_type='swap'):
     print(f'market_zdf统计开始，统计参数{statdays}')
-    # 按币种分组计算N日涨跌幅
-    df_list = []
-    for symbol, _df in market_df.groupby('symbol'):
-        for statday in statdays:
-            _df[f'涨跌幅{statday}d'] = _df['close'].pct_change(statday)
-
-        if interval == '1h':
-            _df['成交额'] = _df['quote_volume'].rolling(24 * 7, min_periods=7).sum()  # 7d成交额
-        elif interval == '1d':
-            _df['成交额'] = _df['quote_volume'].rolling(7, min_periods=7).sum()  # 7d成交额
-        df_list.append(_df)
-    market_df = pd.concat(df_list)
-    market_df.reset_index(inplace=True)
+    # 按币种分组计算N日涨跌幅和7d成交额（已计算过则直接复用），market_df 不会被修改
+    market_df = ensure_index_features(market_df, statdays, interval)
 
     '''
     指数计算：
@@ -138,26 +296,18 @@ def market_zdf_stat(market_df, statdays=[30], save_img=True, start_time=None, in
         计算这些币种在不同统计周期的平均涨跌幅
         最终指数 = 所有统计周期的平均涨跌幅的平均值
     '''
-    dfs = []
-    for candle_begin_time, _df in market_df.groupby('candle_begin_time'):
-        _df = _df.copy()
-
-        # 过滤成交额前n
-        _df['成交额排名'] = _df['成交额'].rank(ascending=False, method='first')
-        _df = _df[_df['成交额排名'] <= 50]
-
-        marketdzf_index_sum = 0
-        row = {'candle_begin_time': candle_begin_time}
-        for statday in statdays:
-            marketzdf_index = _df[f'涨跌幅{statday}d'].sum() / len(_df)
-            marketdzf_index_sum += marketzdf_index
-            row[f'全市场涨跌幅指数{statday}d'] = marketzdf_index
-        marketzdf_index = marketdzf_index_sum / len(statdays)
-        row['全市场涨跌幅指数'] = marketzdf_index
-        dfs.append(pd.DataFrame([row]))
-
-    final_df = pd.concat(dfs, ignore_index=True)
+    # 在 日期 × 币种 矩阵上向量化计算（见 index_engine.market_index_frame），前50只筛选一次，
+    # 所有统计周期一起计算；结果与原来逐时间点的实现逐字节一致（verify_index_engine.py）
+    final_df = index_engine.market_index_frame(market_df, statdays, MARKET_VOLUME_COL, top_n=50)
+
+    return save_market_index(final_df, statdays, save_img=save_img, start_time=start_time, filename=filename,
+                             market_type=market_type)
 
+
+def save_market_index(final_df, statdays, save_img=True, start_time=None, filename='marketzdf_index30', market_type='swap'):
+    """
+    过滤起始时间后保存全市场涨跌幅指数的CSV和图片
+    """
     if start_time is not None:
         final_df = final_df[final_df['candle_begin_time'] > start_time]
 
@@ -171,12 +321,449 @@ def market_zdf_stat(market_df, statdays=[30], save_img=True, start_time=None, in
     print('market_zdf统计完成：', final_df)
 
     if save_img:
-        draw_index(final_df, market_type, title=f'market_zdf_{market_type}_{statdays}d', xaxle='全市场涨跌幅指数', min_val=-0.75, max_val=1, border=0.25,
-                   border_n=20, save_name=filename+'_v2', axhline_high=1, axhline_low=0, axhline_low2=-0.3)
+        draw_market_index(final_df, statdays, filename=filename, market_type=market_type)
 
     return final_df
 
 
+def draw_market_index(final_df, statdays, filename='marketzdf_index30', market_type='swap'):
+    draw_index(final_df, market_type, title=f'market_zdf_{market_type}_{statdays}d', xaxle='全市场涨跌幅指数', min_val=-0.75, max_val=1, border=0.25,
+               border_n=20, save_name=filename+'_v2', axhline_high=1, axhline_low=0, axhline_low2=-0.3)
+
+
+def universe_files(suffix=''):
+    """
+    两种指数的成员索引文件名（相对于 FLdata/{market_type}/universe）
+
+    Returns:
+        tuple: (全市场涨跌幅指数, 山寨指数)
+    """
+    return f'market_top50{suffix}.npz', f'altcoin_top50{suffix}.npz'
+
+
+def build_index_universes(features, market_type='swap', suffix='', save=True):
+    """
+    筛选两种指数每个时间点的成交额前50成员，所有周期共用，save=True 时保存到成员索引目录
+
+    Returns:
+        tuple: (market_universe, altcoin_universe)
+    """
+    market_universe = universe_index.build_universe(features, MARKET_VOLUME_COL, top_n=50)
+    altcoin_universe = universe_index.build_universe(features, ALCOIN_VOLUME_COL, top_n=50, blacklist=ALCOIN_BLACKLIST)
+    if save:
+        save_index_universes((market_universe, altcoin_universe), market_type=market_type, suffix=suffix)
+    return market_universe, altcoin_universe
+
+
+def save_index_universes(universes, market_type='swap', suffix=''):
+    """
+    保存 (market_universe, altcoin_universe) 到成员索引目录
+    """
+    universe_dir = universe_index.get_universe_dir(market_type)
+    for universe, filename in zip(universes, universe_files(suffix)):
+        universe_index.save_universe(os.path.join(universe_dir, filename), universe)
+
+
+def memo_index_universes(features, keys, cache, top_n=50, blacklist=ALCOIN_BLACKLIST):
+    """
+    两种指数的前 top_n 成员索引，按 (滚动成交额的键, 成交额列, top_n, 黑名单) 缓存；
+    全市场涨跌幅指数不使用黑名单，只改黑名单时直接命中
+
+    Returns:
+        tuple: ((market_universe, altcoin_universe), (market_key, altcoin_key))
+    """
+    market_universe, market_key = cache.memoize(
+        '成员索引', [keys[MARKET_VOLUME_COL], MARKET_VOLUME_COL, top_n, []], universe_index.build_universe,
+        features, MARKET_VOLUME_COL, top_n=top_n)
+    altcoin_universe, altcoin_key = cache.memoize(
+        '成员索引', [keys[ALCOIN_VOLUME_COL], ALCOIN_VOLUME_COL, top_n, sorted(blacklist)],
+        universe_index.build_universe, features, ALCOIN_VOLUME_COL, top_n=top_n, blacklist=blacklist)
+    return (market_universe, altcoin_universe), (market_key, altcoin_key)
+
+
+def memo_index_frames(features, keys, cache, market_statdays=MARKET_STATDAYS, altcoin_statdays=ALCOIN_STATDAYS,
+                      top_n=50, blacklist=ALCOIN_BLACKLIST, universes=None):
+    """
+    index_engine.index_frames 的缓存版本：每个周期的指数按 (涨跌幅{N}d 的键, 成员索引的键) 缓存，
+    未命中的周期在一次 index_frames 遍历中一起计算
+
+    Args:
+        features / keys: memo_index_features 的结果
+        universes: 已经取得的 memo_index_universes 结果（口径与 top_n/blacklist 相同），None 时从缓存读取
+
+    Returns:
+        tuple: (market_frames, altcoin_frames)，与 market_statdays / altcoin_statdays 一一对应的 DataFrame 列表
+    """
+    if universes is None:
+        universes = memo_index_universes(features, keys, cache, top_n=top_n, blacklist=blacklist)
+    universes, universe_keys = universes
+    frame_keys = {
+        'market': [cache.key('全市场涨跌幅指数', [keys[f'涨跌幅{statday}d'], universe_keys[0]])
+                   for statday in market_statdays],
+        'altcoin': [cache.key('山寨指数', [keys[f'涨跌幅{statday}d'], universe_keys[1]])
+                    for statday in altcoin_statdays],
+    }
+    frames = {kind: [cache.get(key) for key in kind_keys] for kind, kind_keys in frame_keys.items()}
+    missing = {kind: [i for i, (hit, _) in enumerate(kind_frames) if not hit] for kind, kind_frames in frames.items()}
+    cache.hits += sum(hit for kind_frames in frames.values() for hit, _ in kind_frames)
+    cache.misses += len(missing['market']) + len(missing['altcoin'])
+
+    if missing['market'] or missing['altcoin']:
+        print(f'计算未缓存的指数：全市场涨跌幅指数{[market_statdays[i] for i in missing["market"]]}，'
+              f'山寨指数{[altcoin_statdays[i] for i in missing["altcoin"]]}')
+        computed = index_engine.index_frames(
+            features, market_groups=[[market_statdays[i]] for i in missing['market']],
+            altcoin_groups=[[altcoin_statdays[i]] for i in missing['altcoin']], market_volume_col=MARKET_VOLUME_COL,
+            altcoin_volume_col=ALCOIN_VOLUME_COL, top_n=top_n, blacklist=blacklist, market_universe=universes[0],
+            altcoin_universe=universes[1])
+        for kind, kind_frames in zip(('market', 'altcoin'), computed):
+            for i, final_df in zip(missing[kind], kind_frames):
+                cache.put(frame_keys[kind][i], final_df)
+                frames[kind][i] = (True, final_df)
+    return [final_df for _, final_df in frames['market']], [final_df for _, final_df in frames['altcoin']]
+
+
+def index_stat_horizons(features, market_statdays=MARKET_STATDAYS, altcoin_statdays=ALCOIN_STATDAYS,
+                        market_img_days=(30, 90), altcoin_img_days=(30, 90, 365), start_time=None, interval='1d',
+                        market_type='swap', suffix='', cache=None, keys=None):
+    """
+    一次计算全市场涨跌幅指数和山寨指数的所有周期，每个周期分别保存
+
+    共用的中间结果只计算一次：涨跌幅和滚动成交额（build_index_features），
+    以及每个时间点的两个前50成员集合（build_index_universes，同时保存为成员索引）。
+    每个周期的输出与单独调用 market_zdf_stat / alcoin_stat(statdays=[N]) 完全相同，
+    文件名为 marketzdf_index{N}{suffix}.csv / altcoin_index{N}{suffix}.csv
+
+    Args:
+        features: 长表、MarketPanel，或 build_index_features / panel_index_features 的结果
+        market_statdays: 全市场涨跌幅指数的周期
+        altcoin_statdays: 山寨指数的周期
+        market_img_days / altcoin_img_days: 需要画图的周期
+        suffix: 文件名后缀，例如小时级指数使用 '_1h'
+        cache / keys: memo_cache.MemoCache 和 memo_index_features 的键，提供时成员索引和各周期指数走缓存
+
+    Returns:
+        tuple: (market_results, altcoin_results)，均为 {N: DataFrame}
+    """
+    print(f'指数统计开始，全市场涨跌幅指数周期{list(market_statdays)}，山寨指数周期{list(altcoin_statdays)}')
+    if cache is not None:
+        universes = memo_index_universes(features, keys, cache)
+        save_index_universes(universes[0], market_type=market_type, suffix=suffix)
+        market_frames, altcoin_frames = memo_index_frames(features, keys, cache, market_statdays=market_statdays,
+                                                          altcoin_statdays=altcoin_statdays, universes=universes)
+    else:
+        features = ensure_index_features(features, sorted(set(market_statdays) | set(altcoin_statdays)), interval)
+        market_universe, altcoin_universe = build_index_universes(features, market_type=market_type, suffix=suffix)
+        market_frames, altcoin_frames = index_engine.index_frames(
+            features, market_groups=[[statday] for statday in market_statdays],
+            altcoin_groups=[[statday] for statday in altcoin_statdays], market_volume_col=MARKET_VOLUME_COL,
+            altcoin_volume_col=ALCOIN_VOLUME_COL, top_n=50, blacklist=ALCOIN_BLACKLIST,
+            market_universe=market_universe, altcoin_universe=altcoin_universe)
+
+    market_results = {}
+    for statday, final_df in zip(market_statdays, market_frames):
+        market_results[statday] = save_market_index(final_df, [statday], save_img=statday in market_img_days,
+                                                    start_time=start_time, filename=f'marketzdf_index{statday}{suffix}',
+                                                    market_type=market_type)
+    altcoin_results = {}
+    for statday, final_df in zip(altcoin_statdays, altcoin_frames):
+        altcoin_results[statday] = save_altcoin_index(final_df, [statday], save_img=statday in altcoin_img_days,
+                                                      start_time=start_time, filename=f'altcoin_index{statday}{suffix}',
+                                                      market_type=market_type)
+    return market_results, altcoin_results
+
+
+def y_index_frame(adf, mdf, y_col='Y_idx'):
+    """
+    山寨指数与全市场涨跌幅指数按时间合并，Y指数 = (全市场涨跌幅指数 + 山寨指数) * 100
+
+    Returns:
+        DataFrame: candle_begin_time/全市场涨跌幅指数/山寨指数/y_col
+    """
+    adf = adf.assign(candle_begin_time=pd.to_datetime(adf['candle_begin_time']))
+    mdf = mdf.assign(candle_begin_time=pd.to_datetime(mdf['candle_begin_time']))
+    merged_df = pd.merge(adf, mdf, on='candle_begin_time', how='inner')
+    merged_df = merged_df.sort_values('candle_begin_time')
+    merged_df = merged_df[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
+    merged_df[y_col] = (merged_df['全市场涨跌幅指数'] + merged_df['山寨指数']) * 100
+    return merged_df
+
+
+# Y指数：每项对应一个 Y指数N 节点（见 build_index_dag），增加周期只需增加一项
+#   statday: 山寨指数和全市场涨跌幅指数的周期
+#   filename / y_col: 保存的文件名和列名
+#   title / save_name / axhline_high: 画图参数（标题和图片名后面加 _{market_type}）
+Y_INDEX_SPECS = [
+    dict(statday=30, filename='Y_idx_V2', y_col='Y_idx', title='Yindex', save_name='Y_idx_v2', axhline_high=150),
+    dict(statday=90, filename='Y_idx90_V2', y_col='Y_idx90', title='Yindex90', save_name='Y_idx90_v2', axhline_high=200),
+]
+
+# 合约现货比：每项对应一个节点，比较 swap/spot 的全市场涨跌幅指数N，其余为画图参数
+SWAP_SPOT_SPECS = [
+    dict(statday=7, min_val=-0.35, max_val=0.35, border_n=6, axhline_high=0.5, axhline_low2=-0.25, days_limit=180),
+    dict(statday=30, min_val=-0.75, max_val=1, border_n=25, axhline_high=1, axhline_low2=-0.3, days_limit=600),
+]
+
+# 增量更新时同时追加的Y指数：(周期, 文件名, 列名)
+Y_INDEX_FILES = [(spec['statday'], spec['filename'], spec['y_col']) for spec in Y_INDEX_SPECS]
+
+
+def update_indices_incremental(all_df, market_type='swap', start_time='2021-01-01', full=False, save_img=True):
+    """
+    增量更新指数CSV：只计算上次最后一个日期及之后的指数，追加到
+    marketzdf_index{N}.csv / altcoin_index{N}.csv / Y_idx_V2.csv / Y_idx90_V2.csv 末尾
+
+    状态（每个币种最近 index_state.WINDOW_ROWS 行日线）见 index_state。
+    full=True，或没有状态、统计周期/起始时间变化、窗口内历史数据与本次不一致时全量计算，
+    全量模式同时用于校验增量结果（verify_index_state.py）。
+
+    Args:
+        all_df: 本次的全部日线（load_local_data 的结果）
+        market_type: 市场类型
+        start_time: 指数的起始时间
+        full: 是否全量计算
+        save_img: 是否画图
+
+    Returns:
+        tuple: (market_results, altcoin_results)，均为 {N: 完整指数 DataFrame}，
+            增量计算时 attrs['updated_from'] 为本次替换的起始日期
+    """
+    save_dir = os.path.join('/Users/houjl/Downloads/FLdata', market_type)
+    os.makedirs(save_dir, exist_ok=True)
+    statdays = sorted(set(MARKET_STATDAYS) | set(ALCOIN_STATDAYS))
+    market_img_days, altcoin_img_days = ((30, 90), (30, 90, 365)) if save_img else ((), ())
+    meta = {'market_statdays': MARKET_STATDAYS, 'altcoin_statdays': ALCOIN_STATDAYS, 'start_time': start_time}
+    outputs = [f'marketzdf_index{statday}.csv' for statday in MARKET_STATDAYS] + \
+              [f'altcoin_index{statday}.csv' for statday in ALCOIN_STATDAYS] + \
+              [f'{filename}.csv' for _, filename, _ in Y_INDEX_FILES] + \
+              [os.path.join('universe', filename) for filename in universe_files()]
+
+    state_dir = index_state.get_state_dir(market_type)
+    window, previous = (None, None) if full else index_state.load_state(state_dir)
+    incremental = (window is not None and all(previous.get(key) == value for key, value in meta.items())
+                   and all(os.path.exists(os.path.join(save_dir, name)) for name in outputs))
+    if incremental:
+        last_date = pd.Timestamp(previous['last_date'])
+        if not index_state.is_consistent(window, all_df, last_date):
+            print('历史日线与增量状态不一致，全量计算指数')
+            incremental = False
+
+    if not incremental:
+        print(f'{market_type}全量计算指数')
+        features = build_index_features(all_df, statdays=statdays, interval='1d')
+        mdfs, adfs = index_stat_horizons(features, market_statdays=MARKET_STATDAYS, altcoin_statdays=ALCOIN_STATDAYS,
+                                         market_img_days=market_img_days, altcoin_img_days=altcoin_img_days,
+                                         start_time=start_time, interval='1d', market_type=market_type)
+        for statday, filename, y_col in Y_INDEX_FILES:
+            y_df = y_index_frame(adfs[statday], mdfs[statday], y_col)
+            y_df[['candle_begin_time', y_col]].to_csv(os.path.join(save_dir, f'{filename}.csv'), index=False)
+    else:
+        # 最后一个日期可能是未走完的当天，回退后与新日线一起重算
+        print(f'{market_type}增量计算指数，从 {last_date.strftime("%Y-%m-%d")} 开始')
+        new_df = all_df.loc[all_df['candle_begin_time'] >= last_date, index_state.WINDOW_COLUMNS]
+        work_df = pd.concat([window[window['candle_begin_time'] < last_date], new_df], ignore_index=True)
+        features = build_index_features(work_df, statdays=statdays, interval='1d')
+        universes = build_index_universes(features, save=False)
+        market_frames, altcoin_frames = index_engine.index_frames(
+            features, market_groups=[[statday] for statday in MARKET_STATDAYS],
+            altcoin_groups=[[statday] for statday in ALCOIN_STATDAYS], market_volume_col=MARKET_VOLUME_COL,
+            altcoin_volume_col=ALCOIN_VOLUME_COL, top_n=50, blacklist=ALCOIN_BLACKLIST, market_universe=universes[0],
+            altcoin_universe=universes[1])
+
+        # 成员索引同样只替换最后一个日期及之后的部分
+        universe_dir = universe_index.get_universe_dir(market_type)
+        for universe, filename in zip(universes, universe_files()):
+            path = os.path.join(universe_dir, filename)
+            stored = universe_index.load_universe(path)
+            if stored is not None and stored.same_definition(universe.volume_col, universe.top_n, universe.blacklist):
+                universe = stored.splice(universe, last_date)
+            universe_index.save_universe(path, universe)
+
+        def new_rows(final_df):
+            final_df = final_df[final_df['candle_begin_time'] >= last_date]
+            if start_time is not None:
+                final_df = final_df[final_df['candle_begin_time'] > start_time]
+            return final_df
+
+        market_rows = dict(zip(MARKET_STATDAYS, map(new_rows, market_frames)))
+        altcoin_rows = dict(zip(ALCOIN_STATDAYS, map(new_rows, altcoin_frames)))
+        for statday, rows in market_rows.items():
+            index_state.append_csv_rows(os.path.join(save_dir, f'marketzdf_index{statday}.csv'), rows, last_date,
+                                        encoding='gbk')
+        for statday, rows in altcoin_rows.items():
+            index_state.append_csv_rows(os.path.join(save_dir, f'altcoin_index{statday}.csv'), rows, last_date,
+                                        encoding='gbk')
+        for statday, filename, y_col in Y_INDEX_FILES:
+            y_df = y_index_frame(altcoin_rows[statday], market_rows[statday], y_col)
+            index_state.append_csv_rows(os.path.join(save_dir, f'{filename}.csv'), y_df[['candle_begin_time', y_col]],
+                                        last_date)
+        print(f'{market_type}新增指数 {len(market_rows[MARKET_STATDAYS[0]])} 行')
+
+        # 读回完整指数，供Y指数合并和画图使用（按原文精度解析，与全量计算的数值相同）
+        mdfs = {statday: pd.read_csv(os.path.join(save_dir, f'marketzdf_index{statday}.csv'), encoding='gbk',
+                                     parse_dates=['candle_begin_time'], float_precision='round_trip')
+                for statday in MARKET_STATDAYS}
+        adfs = {statday: pd.read_csv(os.path.join(save_dir, f'altcoin_index{statday}.csv'), encoding='gbk',
+                                     parse_dates=['candle_begin_time'], float_precision='round_trip')
+                for statday in ALCOIN_STATDAYS}
+        # 标记本次只更新了 last_date 及之后的行，依赖图的输出节点据此不再整体重写（见 save_y_index）
+        for final_df in list(mdfs.values()) + list(adfs.values()):
+            final_df.attrs['updated_from'] = last_date
+        for statday in market_img_days:
+            draw_market_index(mdfs[statday], [statday], filename=f'marketzdf_index{statday}', market_type=market_type)
+        for statday in altcoin_img_days:
+            draw_altcoin_index(adfs[statday], [statday], filename=f'altcoin_index{statday}', market_type=market_type)
+
+    meta['last_date'] = str(features['candle_begin_time'].max())
+    index_state.save_state(state_dir, index_state.tail_window(features), meta)
+    return mdfs, adfs
+
+
+def backfill_indices(market_type='swap', t0=None, t1=None, start_time='2021-01-01', njobs=1, propagate=True):
+    """
+    上游修正了 [t0, t1] 的小时K线后，只重算受影响日期的指数，替换已有输出中对应的行
+
+    修正的日线会影响之后 最长周期 行以内的涨跌幅和365日均成交额，propagate=True 时重算到最后一个受影响的日期
+    （见 index_state.affected_until），否则只重算 [t0, t1]。
+    只读取计算需要的历史：每个币种从 t0 往前 最长周期 + 365日均成交额窗口 天的小时K线
+    （窗口内缺失太多、行数不够时该币种读取全部历史，见 local_ingest.aggregate_daily_window），
+    结果与全量计算中对应日期的行相同。替换的输出：
+        marketzdf_index{N}.csv / altcoin_index{N}.csv / Y指数CSV / 成员索引 / ALL/df_swap_spot_{N}.csv
+    增量状态的窗口中对应的数值同时修补（见 index_state.patch_window），数据清单（ingest_manifest）记为修正后的文件状态。
+    不重画图片，all_df_from_Y_idx_newV2.csv 和面板在下次每日任务时更新。
+
+    Args:
+        market_type: 市场类型
+        t0 / t1: 数据被修正的第一天 / 最后一天（包含）
+        start_time: 全量计算时的起始时间，必须与生成已有输出时相同
+        njobs: 读取本地K线时使用的进程数
+        propagate: 是否同时重算 t1 之后受影响的日期
+
+    Returns:
+        tuple: (market_rows, altcoin_rows)，均为 {N: 重算的行}
+    """
+    t0, t1 = pd.Timestamp(t0).normalize(), pd.Timestamp(t1).normalize()
+    if t1 < t0:
+        raise ValueError(f'结束日期 {t1} 早于开始日期 {t0}')
+    save_dir = os.path.join('/Users/houjl/Downloads/FLdata', market_type)
+    outputs = [f'marketzdf_index{statday}.csv' for statday in MARKET_STATDAYS] + \
+              [f'altcoin_index{statday}.csv' for statday in ALCOIN_STATDAYS] + \
+              [f'{filename}.csv' for _, filename, _ in Y_INDEX_FILES]
+    missing = [name for name in outputs if not os.path.exists(os.path.join(save_dir, name))]
+    if missing:
+        raise Exception(f'{market_type}没有已有的指数输出 {missing}，请先全量计算')
+
+    # 涨跌幅需要当前行之前N行，365日均成交额需要之前364行；按日期多读一年，缺失日期较多时也够用
+    statdays = sorted(set(MARKET_STATDAYS) | set(ALCOIN_STATDAYS))
+    min_rows = max(statdays + [365 - 1])
+    load_start = t0 - pd.Timedelta(days=max(statdays) + 365)
+    if start_time is not None:
+        load_start = max(load_start, pd.Timestamp(start_time).normalize())
+    print(f'{market_type}修正 {t0.strftime("%Y-%m-%d")} ~ {t1.strftime("%Y-%m-%d")} 的数据，'
+          f'读取 {load_start.strftime("%Y-%m-%d")} 之后的K线')
+
+    local_data_path = f'/Users/houjl/Downloads/FLdata/coin-binance-spot-swap-preprocess-pkl-1h/split/{market_type}/'
+    import glob
+    csv_files = glob.glob(os.path.join(local_data_path, '*.csv'))
+    # 修正后的文件以重写的形式出现在清单比对中，这里不做同步检查，重算完成后把当前文件状态记为新的清单
+    manifest_path = ingest_manifest.get_manifest_path(local_data_path)
+    manifest, report = ingest_manifest.scan(csv_files, ingest_manifest.load_manifest(manifest_path))
+    ingest_manifest.print_report(report, market_type)
+    all_df = local_ingest.ingest_daily_window(csv_files, load_start, None if propagate else t1 + pd.Timedelta(days=1),
+                                              t0, min_rows, history_start=start_time,
+                                              cache_dir=kline_cache.get_cache_dir(local_data_path), njobs=njobs)
+    if propagate:
+        t1 = index_state.affected_until(all_df, t0, t1, rows=min_rows)
+        print(f'受影响的指数到 {t1.strftime("%Y-%m-%d")} 为止')
+
+    features = build_index_features(all_df, statdays=statdays, interval='1d')
+    universes = build_index_universes(features, save=False)
+    market_frames, altcoin_frames = index_engine.index_frames(
+        features, market_groups=[[statday] for statday in MARKET_STATDAYS],
+        altcoin_groups=[[statday] for statday in ALCOIN_STATDAYS], market_volume_col=MARKET_VOLUME_COL,
+        altcoin_volume_col=ALCOIN_VOLUME_COL, top_n=50, blacklist=ALCOIN_BLACKLIST, market_universe=universes[0],
+        altcoin_universe=universes[1])
+
+    def window_rows(final_df):
+        final_df = final_df[(final_df['candle_begin_time'] >= t0) & (final_df['candle_begin_time'] <= t1)]
+        if start_time is not None:
+            final_df = final_df[final_df['candle_begin_time'] > start_time]
+        return final_df
+
+    market_rows = dict(zip(MARKET_STATDAYS, map(window_rows, market_frames)))
+    altcoin_rows = dict(zip(ALCOIN_STATDAYS, map(window_rows, altcoin_frames)))
+    for statday, rows in market_rows.items():
+        index_state.splice_csv_rows(os.path.join(save_dir, f'marketzdf_index{statday}.csv'), rows, t0, t1,
+                                    encoding='gbk')
+    for statday, rows in altcoin_rows.items():
+        index_state.splice_csv_rows(os.path.join(save_dir, f'altcoin_index{statday}.csv'), rows, t0, t1,
+                                    encoding='gbk')
+    for statday, filename, y_col in Y_INDEX_FILES:
+        y_df = y_index_frame(altcoin_rows[statday], market_rows[statday], y_col)
+        index_state.splice_csv_rows(os.path.join(save_dir, f'{filename}.csv'), y_df[['candle_begin_time', y_col]],
+                                    t0, t1)
+
+    universe_dir = universe_index.get_universe_dir(market_type)
+    for universe, filename in zip(universes, universe_files()):
+        path = os.path.join(universe_dir, filename)
+        stored = universe_index.load_universe(path)
+        if stored is not None and stored.same_definition(universe.volume_col, universe.top_n, universe.blacklist):
+            universe_index.save_universe(path, stored.splice(universe, t0, t1))
+
+    # 合约现货比：另一个市场的全市场涨跌幅指数从已有CSV读取（按原文精度解析）
+    other_type = 'spot' if market_type == 'swap' else 'swap'
+    for spec in SWAP_SPOT_SPECS:
+        statday = spec['statday']
+        path = f'/Users/houjl/Downloads/FLdata/ALL/df_swap_spot_{statday}.csv'
+        other_path = f'/Users/houjl/Downloads/FLdata/{other_type}/marketzdf_index{statday}.csv'
+        if statday not in market_rows or not os.path.exists(path) or not os.path.exists(other_path):
+            continue
+        other = pd.read_csv(other_path, encoding='gbk', parse_dates=['candle_begin_time'], float_precision='round_trip')
+        col = f'全市场涨跌幅指数{statday}d'
+        frames = {market_type: market_rows[statday], other_type: other}
+        df_swap_spot = pd.merge(
+            frames['swap'][['candle_begin_time', col]].rename(columns={col: f'market_swap_{statday}d'}),
+            frames['spot'][['candle_begin_time', col]].rename(columns={col: f'market_spot_{statday}d'}),
+            on='candle_begin_time', how='inner')
+        index_state.splice_csv_rows(path, df_swap_spot, t0, t1, encoding='gbk')
+
+    state_dir = index_state.get_state_dir(market_type)
+    window, meta = index_state.load_state(state_dir)
+    if window is not None and t0 <= pd.Timestamp(meta['last_date']):
+        patched = index_state.patch_window(window, all_df, t0, t1)
+        if patched is not None:
+            index_state.save_state(state_dir, patched, meta)
+        else:
+            print('修正后的日线增加或删除了行，增量状态无法修补，下次每日任务将全量计算')
+    # 清单记为修正后的状态之前，让日线存储对修正的币种全量聚合，下次每日任务不会沿用修正前的日线
+    daily_store.invalidate_symbols(daily_store.get_store_dir(local_data_path),
+                                   [local_ingest.symbol_of(name) for name in report['rewritten']])
+    ingest_manifest.record_errors(manifest, all_df.attrs.get('ingest_errors', {}))
+    ingest_manifest.save_manifest(manifest_path, manifest)
+    print(f'{market_type}重算完成，替换 {len(market_rows[MARKET_STATDAYS[0]])} 行')
+    return market_rows, altcoin_rows
+
+
+def backfill_cli(argv=None):
+    """
+    命令行：python Y_idx_newV2_spot.py backfill 2024-03-01 2024-03-05 [--market swap spot] [--njobs 8]
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='Y_idx_newV2_spot.py backfill', description='重算一段日期的指数')
+    parser.add_argument('t0', help='数据被修正的第一天，例如 2024-03-01')
+    parser.add_argument('t1', help='数据被修正的最后一天（包含）')
+    parser.add_argument('--market', nargs='+', default=['swap', 'spot'], choices=['swap', 'spot'], help='市场类型')
+    parser.add_argument('--start-time', default='2021-01-01', help='全量计算时的起始时间')
+    parser.add_argument('--njobs', type=int, default=1, help='读取本地K线时使用的进程数')
+    parser.add_argument('--only-range', action='store_true', help='只重算 [t0, t1]，不重算之后受影响的日期')
+    args = parser.parse_args(argv)
+    start = time.time()
+    for market_type in args.market:
+        backfill_indices(market_type, args.t0, args.t1, start_time=args.start_time, njobs=args.njobs,
+                         propagate=not args.only_range)
+    print(f'重算完成，耗时 {time.time() - start:.1f}s')
+
+
 def get_default_exchange(acc:str):
     api : BnAccount = cfg.binance.getApi(acc)
     exchange = ccxt.binance({
@@ -202,9 +789,20 @@ def close_exchange(exchange):
 
 
 
-def load_local_data(market_type='swap', start_time='2021-01-01'):
+def load_local_data(market_type='swap', start_time='2021-01-01', use_cache=True, njobs=1, incremental=False,
+                    grouped_resample=False, streaming=False, memory_budget_mb=256, verify_sync=True):
     """
     从本地CSV文件读取数据并聚合为日线数据
+
+    use_cache=True 时小时K线优先从 Parquet 列式缓存读取（见 kline_cache），
+    缓存按源文件 mtime/size 失效
+    njobs > 1 时逐文件的 读取+过滤+resample 在进程池中并行执行（见 local_ingest）
+    incremental=True 时使用持久化的日线存储，只聚合各币种水位线之后的小时K线（见 daily_store）
+    grouped_resample=True 时堆叠所有币种的小时K线，一次分组聚合为日线（见 local_ingest.resample_daily_all）
+    streaming=True 时按块读取小时K线，内存占用受 memory_budget_mb 限制（见 stream_ingest）
+
+    每次读取前先与上次的数据清单比对（见 ingest_manifest），报告新增/下架币种；
+    verify_sync=True 时如果上游同步看起来不完整或损坏，直接抛出异常而不继续计算
     """
     print(f'正在从本地读取数据，数据类型{market_type}')
     
@@ -215,56 +813,35 @@ def load_local_data(market_type='swap', start_time='2021-01-01'):
     import glob
     csv_files = glob.glob(os.path.join(local_data_path, '*.csv'))
     print(f'找到 {len(csv_files)} 个币种数据文件')
-    
-    df_list = []
-    total_files = len(csv_files)
-    
-    for idx, csv_file in enumerate(csv_files, 1):
-        try:
-            # 每处理50个文件显示一次进度
-            if idx % 50 == 0 or idx == total_files:
-                print(f'进度: {idx}/{total_files} ({idx*100//total_files}%)')
-            
-            # 读取CSV文件，只读取需要的列
-            df = pd.read_csv(csv_file, 
-                           usecols=['candle_begin_time', 'open', 'high', 'low', 'close', 'volume', 'quote_volume', '是否交易'],
-                           parse_dates=['candle_begin_time'])
-            
-            # 过滤有效数据
-            df = df[df['是否交易'] == 1].copy()
-            
-            if len(df) == 0:
-                continue
-            
-            # 提取symbol名称（从文件名）
-            symbol_name = os.path.basename(csv_file).replace('.csv', '').replace('-', '')
-            df['symbol'] = symbol_name
-            
-            # 聚合为日线数据
-            df.set_index('candle_begin_time', inplace=True)
-            df_daily = df.resample('D').agg({
-                'open': 'first',
-                'high': 'max',
-                'low': 'min',
-                'close': 'last',
-                'volume': 'sum',
-                'quote_volume': 'sum',
-                'symbol': 'first'
-            }).dropna()
-            
-            df_daily.reset_index(inplace=True)
-            df_list.append(df_daily)
-            
-        except Exception as e:
-            print(f'读取文件 {os.path.basename(csv_file)} 失败: {e}')
-            continue
-    
-    print(f'成功读取 {len(df_list)} 个币种的数据')
-    
-    # 合并所有数据
-    print('正在合并数据...')
-    all_df = pd.concat(df_list, ignore_index=True)
+
+    # 与上次成功读取时的清单比对
+    manifest_path = ingest_manifest.get_manifest_path(local_data_path)
+    previous_manifest = ingest_manifest.load_manifest(manifest_path)
+    manifest, report = ingest_manifest.scan(csv_files, previous_manifest)
+    ingest_manifest.print_report(report, market_type)
+    sync_issues = ingest_manifest.check_sync(report, len(previous_manifest['files']))
+    if sync_issues and verify_sync:
+        raise Exception(f'{market_type}数据同步异常: {"；".join(sync_issues)}')
+
+    if incremental:
+        # 只读取水位线之后的小时K线，更新日线存储；是否变化按日线存储自己记录的文件指纹判断，
+        # 清单判断为重写的文件全量聚合
+        store_dir = daily_store.get_store_dir(local_data_path)
+        all_df = daily_store.update_daily_store(csv_files, store_dir, njobs=njobs, rewritten=set(report['rewritten']))
+    elif streaming:
+        # 按块读取小时K线，日线先写入磁盘
+        out_dir = stream_ingest.get_stream_dir(local_data_path)
+        all_df = stream_ingest.ingest_daily_streaming(csv_files, out_dir, memory_budget_mb=memory_budget_mb)
+    else:
+        cache_dir = kline_cache.get_cache_dir(local_data_path) if use_cache else None
+
+        # 逐文件读取并聚合为日线，合并为一张长表
+        all_df = local_ingest.ingest_daily(csv_files, cache_dir=cache_dir, njobs=njobs, grouped=grouped_resample)
     print(f'合并完成，共 {len(all_df)} 条记录')
+
+    # 记录本次读取失败的文件并保存清单
+    ingest_manifest.record_errors(manifest, all_df.attrs.get('ingest_errors', {}))
+    ingest_manifest.save_manifest(manifest_path, manifest)
     
     # 过滤起始时间
     if start_time:
@@ -275,28 +852,86 @@ def load_local_data(market_type='swap', start_time='2021-01-01'):
     return all_df
 
 
-def download_data(acc:str, backdays=1800, interval = '1d', start_time='2024-01-01', market_type='swap'):
+def load_local_hourly_data(market_type='swap', start_time='2024-01-01', use_cache=True, verify_sync=True):
+    """
+    从本地CSV文件读取小时K线，不聚合为日线（小时级指数使用）
+
+    同样先与数据清单比对检查上游同步，但不保存清单：清单记录的是日线读取的状态
+    """
+    print(f'正在从本地读取小时数据，数据类型{market_type}')
+
+    # 设置本地数据路径
+    local_data_path = f'/Users/houjl/Downloads/FLdata/coin-binance-spot-swap-preprocess-pkl-1h/split/{market_type}/'
+
+    # 获取所有CSV文件
+    import glob
+    csv_files = glob.glob(os.path.join(local_data_path, '*.csv'))
+    print(f'找到 {len(csv_files)} 个币种数据文件')
+
+    previous_manifest = ingest_manifest.load_manifest(ingest_manifest.get_manifest_path(local_data_path))
+    _, report = ingest_manifest.scan(csv_files, previous_manifest)
+    ingest_manifest.print_report(report, market_type)
+    sync_issues = ingest_manifest.check_sync(report, len(previous_manifest['files']))
+    if sync_issues and verify_sync:
+        raise Exception(f'{market_type}数据同步异常: {"；".join(sync_issues)}')
+
+    cache_dir = kline_cache.get_cache_dir(local_data_path) if use_cache else None
+    hourly_df = local_ingest.ingest_hourly(csv_files, cache_dir=cache_dir)
+
+    # 过滤起始时间
+    if start_time:
+        print(f'过滤起始时间 >= {start_time}')
+        hourly_df = hourly_df[hourly_df['candle_begin_time'] >= start_time]
+        print(f'过滤后剩余 {len(hourly_df)} 条记录')
+
+    return hourly_df
+
+
+def download_data(acc:str, backdays=1800, interval = '1d', start_time='2024-01-01', market_type='swap', use_store=True):
+    """
+    下载数据并计算指数，返回 (30天山寨指数, 30天全市场涨跌幅指数, 90天山寨指数, 90天全市场涨跌幅指数)
+    """
+    mdfs, adfs = download_indices(acc, backdays=backdays, interval=interval, start_time=start_time,
+                                  market_type=market_type, use_store=use_store)
+    return adfs[30], mdfs[30], adfs[90], mdfs[90]
+
+
+def download_indices(acc:str, backdays=1800, interval = '1d', start_time='2024-01-01', market_type='swap',
+                     use_store=True):
+    """
+    从交易所下载日线并计算所有周期的指数
+
+    use_store: 是否使用本地K线存储（见 candle_store），只下载上次运行之后收盘的K线，新上线的交易对下载全部
+
+    Returns:
+        tuple: (market_results, altcoin_results)，均为 {N: DataFrame}
+    """
     print(f'正在下载数据，数据类型{market_type}')
     exchange = get_default_exchange(acc)
     try:
+        # 交易规则只请求一次，交易对列表和上线时间共用（现货 exchangeInfo 的权重为 20）
+        exchange_info = binance.get_exchangeinfo(exchange, market_type)
         # 获取合约数据
         if market_type == 'swap':
             # 获取永续合约交易对
-            symbol_list = binance.get_symbol_list(exchange, market_type='swap')
+            symbol_list = binance.get_symbol_list(exchange, market_type='swap', exchange_info=exchange_info)
 
         elif market_type == 'spot':
             # 获取现货交易对
-            symbol_list = binance.get_symbol_list(exchange, market_type='spot')
+            symbol_list = binance.get_symbol_list(exchange, market_type='spot', exchange_info=exchange_info)
 
         else:
             raise ValueError("market_type 必须是 'swap' 或 'spot'")
 
         run_time = common.cacu_run_time('1h', datetime.now())
+        store = candle_store.CandleStore() if use_store else None
+        # 合约按上线时间规划分页，现货查询第一根K线
+        listing = binance.get_onboard_dates(exchange, market_type=market_type, exchange_info=exchange_info)
 
         if interval == '1h':
-            df_dict = binance.u_furture_fetch_all_candle_data(exchange, symbol_list, '1h', run_time, 24 * backdays * 2 + 10, market_type, njobs=8)
+            df_dict = binance.u_furture_fetch_all_candle_data(exchange, symbol_list, '1h', run_time, 24 * backdays * 2 + 10, market_type, use_async=True, store=store, listing=listing)
         elif interval == '1d':
-            df_dict = binance.u_furture_fetch_all_candle_data(exchange, symbol_list, '1d', run_time, backdays * 2 + 10, market_type, njobs=8)
+            df_dict = binance.u_furture_fetch_all_candle_data(exchange, symbol_list, '1d', run_time, backdays * 2 + 10, market_type, use_async=True, store=store, listing=listing)
 
         # 全币种数据合成一个df
         df_list = []
@@ -310,50 +945,56 @@ def download_data(acc:str, backdays=1800, interval = '1d', start_time='2024-01-0
         print('数据储存完成')
         print('数据下载完成，开始计算指数')
 
-        # =====权重涨跌幅指数=====
-        print('开始计算涨跌幅指数')
-        market_df = pd.DataFrame()
-        for i in [7, 30, 90]:
-            market_df = all_df.copy()
-            if i == 30:
-                mdf = market_zdf_stat(market_df, statdays=[i], save_img=True, start_time=start_time, interval='1d',
-                                filename=f'marketzdf_index{i}', market_type=market_type)
-            elif i == 90:
-                mdf90 = market_zdf_stat(market_df, statdays=[i], save_img=True, start_time=start_time, interval='1d',
-                                filename=f'marketzdf_index{i}', market_type=market_type)
-            else:
-                mdf90 = market_zdf_stat(market_df, statdays=[i], save_img=False, start_time=start_time, interval='1d',
-                                filename=f'marketzdf_index{i}', market_type=market_type)
-
-
-        # =====山寨指数=====
-        print('开始计算山寨指数')
-        # 画一个月山寨曲线看看
-        alcoin_df30 = all_df.copy()
-        adf = alcoin_stat(alcoin_df30, statdays=[30], save_img=True, start_time=start_time, interval='1d', filename='altcoin_index30', market_type=market_type)
+        # 所有周期共用的涨跌幅和滚动成交额只计算一次，不再为每个周期复制 all_df
+        features = build_index_features(all_df, statdays=[7, 30, 90, 365], interval='1d')
+        del all_df
 
-        # 画一个季山寨曲线看看
-        alcoin_df90 = all_df.copy()
-        adf90 = alcoin_stat(alcoin_df90, statdays=[90], save_img=True, start_time=start_time, interval='1d', filename='altcoin_index90', market_type=market_type)
-
-        # 画一个年山寨曲线看看
-        alcoin_stat(all_df, statdays=[365], save_img=True, start_time=start_time, interval='1d', filename='altcoin_index365', market_type=market_type)
-
-        return adf, mdf, adf90, mdf90
+        # =====权重涨跌幅指数 / 山寨指数=====
+        # 全市场涨跌幅指数 7/30/90 和山寨指数 30/90/365 在一次遍历中计算，每个时间点的前50成员只筛选一次
+        print('开始计算涨跌幅指数和山寨指数')
+        return index_stat_horizons(features, market_statdays=MARKET_STATDAYS, altcoin_statdays=ALCOIN_STATDAYS,
+                                   start_time=start_time, interval='1d', market_type=market_type)
     finally:
         # 确保关闭 exchange 连接
         close_exchange(exchange)
 
 
 
-def run_with_local_data(market_type='swap', start_time='2021-01-01'):
+def run_with_local_data(market_type='swap', start_time='2021-01-01', njobs=1, incremental=False, compact=False,
+                        float32_volume=False, incremental_index=False):
     """
-    使用本地数据运行Y指数计算
+    使用本地数据运行Y指数计算，返回 (30天山寨指数, 30天全市场涨跌幅指数, 90天山寨指数, 90天全市场涨跌幅指数)
+
+    参数见 local_indices
+    """
+    mdfs, adfs = local_indices(market_type=market_type, start_time=start_time, njobs=njobs, incremental=incremental,
+                               compact=compact, float32_volume=float32_volume, incremental_index=incremental_index)
+    return adfs[30], mdfs[30], adfs[90], mdfs[90]
+
+
+def local_indices(market_type='swap', start_time='2021-01-01', njobs=1, incremental=False, compact=False,
+                  float32_volume=False, incremental_index=False, memo=False):
+    """
+    使用本地数据计算所有周期的指数
+
+    njobs: 读取本地K线时使用的进程数
+    incremental: 是否增量聚合日线（见 load_local_data）
+    compact: 是否先转为紧凑表示再计算指数（见 compact_market_frame），float32_volume 控制成交额是否用 float32
+    incremental_index: 是否只计算新日期的指数并追加到已有CSV（见 update_indices_incremental）
+    memo: 是否使用中间结果缓存（见 memo_cache），小时CSV没有变化时日线、涨跌幅、成交额、成员索引、指数都直接读取
+
+    Returns:
+        tuple: (market_results, altcoin_results)，均为 {N: DataFrame}
     """
     print(f'开始处理{market_type}数据')
     
     # 从本地读取数据
-    all_df = load_local_data(market_type=market_type, start_time=start_time)
+    cache = memo_cache.MemoCache() if memo else None
+    if cache is not None:
+        all_df, data_key = memo_local_data(market_type=market_type, start_time=start_time, cache=cache, njobs=njobs,
+                                           incremental=incremental)
+    else:
+        all_df = load_local_data(market_type=market_type, start_time=start_time, njobs=njobs, incremental=incremental)
     
     # 保存合并后的数据
     save_dir = os.path.join('/Users/houjl/Downloads/FLdata', market_type)
@@ -361,340 +1002,288 @@ def run_with_local_data(market_type='swap', start_time='2021-01-01'):
         os.makedirs(save_dir)
     all_df.to_csv(f'/Users/houjl/Downloads/FLdata/{market_type}/all_df_from_Y_idx_newV2.csv', index=False, encoding='gbk')
     print('数据储存完成')
+
+    # 保存 日期×币种 面板，供指数计算、看板和研究脚本以内存映射方式读取
+    panel_dir = get_panel_dir(market_type)
+    MarketPanel.from_long(all_df).save(panel_dir)
+    print('面板储存完成')
+
+    if compact:
+        all_df = compact_market_frame(all_df, float32_volume=float32_volume)
+        if cache is not None:
+            data_key = cache.key('紧凑表示', [data_key, float32_volume])
+
+    if incremental_index:
+        return update_indices_incremental(all_df, market_type=market_type, start_time=start_time)
     
-    # =====权重涨跌幅指数=====
-    print('开始计算涨跌幅指数')
-    for i in [7, 30, 90]:
-        market_df = all_df.copy()
-        if i == 30:
-            mdf = market_zdf_stat(market_df, statdays=[i], save_img=True, start_time=start_time, interval='1d',
-                            filename=f'marketzdf_index{i}', market_type=market_type)
-        elif i == 90:
-            mdf90 = market_zdf_stat(market_df, statdays=[i], save_img=True, start_time=start_time, interval='1d',
-                            filename=f'marketzdf_index{i}', market_type=market_type)
-        else:
-            mdf7 = market_zdf_stat(market_df, statdays=[i], save_img=False, start_time=start_time, interval='1d',
-                            filename=f'marketzdf_index{i}', market_type=market_type)
+    # 所有周期共用的涨跌幅和滚动成交额只计算一次，不再为每个周期复制 all_df
+    keys = None
+    if cache is not None:
+        features, keys = memo_index_features(all_df, statdays=[7, 30, 90, 365], interval='1d', cache=cache,
+                                             data_key=data_key)
+    elif compact:
+        features = build_index_features(all_df, statdays=[7, 30, 90, 365], interval='1d')
+    del all_df
+    if cache is None and not compact:
+        # 涨跌幅、成交额、成员索引和指数都在内存映射读取的面板上计算，不再从长表重建矩阵
+        features = panel_index_features(MarketPanel.load(panel_dir), statdays=[7, 30, 90, 365], interval='1d')
+
+    # =====权重涨跌幅指数 / 山寨指数=====
+    # 全市场涨跌幅指数 7/30/90 和山寨指数 30/90/365 在一次遍历中计算，每个时间点的前50成员只筛选一次
+    print('开始计算涨跌幅指数和山寨指数')
+    return index_stat_horizons(features, market_statdays=MARKET_STATDAYS, altcoin_statdays=ALCOIN_STATDAYS,
+                               start_time=start_time, interval='1d', market_type=market_type, cache=cache, keys=keys)
+
+
+def memo_local_data(market_type='swap', start_time='2021-01-01', cache=None, **kwargs):
+    """
+    load_local_data 的缓存版本：日线长表按 (数据清单中各文件的指纹, 起始时间) 缓存，
+    小时CSV没有变化时不再读取和聚合
+
+    与 load_local_data 相同，先与数据清单比对并检查上游同步，命中缓存时同样会因同步异常而停止，
+    并保存本次的清单
 
-    # =====山寨指数=====
-    print('开始计算山寨指数')
-    # 画一个月山寨曲线看看
-    alcoin_df30 = all_df.copy()
-    adf = alcoin_stat(alcoin_df30, statdays=[30], save_img=True, start_time=start_time, interval='1d', filename='altcoin_index30', market_type=market_type)
+    Args:
+        cache: memo_cache.MemoCache
+        kwargs: load_local_data 的其他参数（只影响读取方式，不影响结果）
 
-    # 画一个季山寨曲线看看
-    alcoin_df90 = all_df.copy()
-    adf90 = alcoin_stat(alcoin_df90, statdays=[90], save_img=True, start_time=start_time, interval='1d', filename='altcoin_index90', market_type=market_type)
+    Returns:
+        tuple: (all_df, 键)
+    """
+    local_data_path = f'/Users/houjl/Downloads/FLdata/coin-binance-spot-swap-preprocess-pkl-1h/split/{market_type}/'
+    import glob
+    csv_files = glob.glob(os.path.join(local_data_path, '*.csv'))
 
-    # 画一个年山寨曲线看看
-    alcoin_stat(all_df, statdays=[365], save_img=True, start_time=start_time, interval='1d', filename='altcoin_index365', market_type=market_type)
+    manifest_path = ingest_manifest.get_manifest_path(local_data_path)
+    previous_manifest = ingest_manifest.load_manifest(manifest_path)
+    manifest, report = ingest_manifest.scan(csv_files, previous_manifest)
+    ingest_manifest.print_report(report, market_type)
+    sync_issues = ingest_manifest.check_sync(report, len(previous_manifest['files']))
+    if sync_issues and kwargs.get('verify_sync', True):
+        raise Exception(f'{market_type}数据同步异常: {"；".join(sync_issues)}')
 
-    return adf, mdf, adf90, mdf90
+    all_df, key = cache.memoize('日线', [memo_cache.manifest_fingerprint(manifest), market_type, start_time],
+                                load_local_data, market_type=market_type, start_time=start_time, **kwargs)
+    ingest_manifest.record_errors(manifest, all_df.attrs.get('ingest_errors', {}))
+    ingest_manifest.save_manifest(manifest_path, manifest)
+    return all_df, key
 
 
-def calculate_indices_from_local(start_time: str = '2021-01-01'):
+def research_indices(market_type='swap', start_time='2021-01-01', market_statdays=MARKET_STATDAYS,
+                     altcoin_statdays=ALCOIN_STATDAYS, top_n=50, blacklist=ALCOIN_BLACKLIST, cache=None):
     """
-    使用本地预处理后的K线数据，重新计算所有指数并更新到本地CSV
+    研究用：按给定的周期、top_n、山寨指数黑名单计算指数，不保存CSV和图片
 
-    该函数会顺序执行：
-    1. 计算合约市场（swap）的山寨指数、全市场涨跌幅指数
-    2. 计算现货市场（spot）的山寨指数、全市场涨跌幅指数
-    3. 基于上述结果计算 Y 指数（30天 / 90天）
-    4. 生成合约 vs 现货 对比所需的 ALL 市场数据
+    每一步都走中间结果缓存（见 memo_cache），反复调整一个参数时只重算它下游的部分，例如
+    只改 blacklist 时日线、涨跌幅、成交额、全市场涨跌幅指数都直接读取，只重新筛选山寨指数的成员并计算山寨指数
 
-    注意：该函数依赖本地路径 /Users/houjl/Downloads/FLdata 下的预处理数据，
-    不会访问交易所接口。
+    Args:
+        cache: memo_cache.MemoCache，默认使用 FLdata/memo_cache
+
+    Returns:
+        tuple: (market_results, altcoin_results)，均为 {N: DataFrame}，已过滤起始时间
     """
-    # 处理合约数据
-    print('开始处理swap数据')
-    df1_swap, df2_swap, df1_90_swap, df2_90_swap = run_with_local_data(market_type='swap', start_time=start_time)
-
-    # 处理现货数据
-    print('开始处理spot数据')
-    df1_spot, df2_spot, df1_90_spot, df2_90_spot = run_with_local_data(market_type='spot', start_time=start_time)
-
-    # =========计算Y指数（swap）================================================
-    print('开始计算swap的Y指数')
-    # 30天Y指数
-    df1_swap['candle_begin_time'] = pd.to_datetime(df1_swap['candle_begin_time'])
-    df2_swap['candle_begin_time'] = pd.to_datetime(df2_swap['candle_begin_time'])
-    merged_df_swap = pd.merge(df1_swap, df2_swap, on='candle_begin_time', how='inner')
-    merged_df_swap = merged_df_swap.sort_values('candle_begin_time')
-    merged_df_swap = merged_df_swap[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
-    merged_df_swap['Y_idx'] = (merged_df_swap['全市场涨跌幅指数'] + merged_df_swap['山寨指数']) * 100
-    draw_index(merged_df_swap, 'swap', title=f'Yindex_swap', xaxle='Y_idx', min_val=-50, max_val=150, border=10,
-               border_n=18, save_name=f'Y_idx_v2_swap', axhline_high=150, axhline_low=0, axhline_low2=-20)
-    merged_df_swap[['candle_begin_time', 'Y_idx']].to_csv(f'/Users/houjl/Downloads/FLdata/swap/Y_idx_V2.csv', index=False)
-
-    # 90天Y指数
-    df1_90_swap['candle_begin_time'] = pd.to_datetime(df1_90_swap['candle_begin_time'])
-    df2_90_swap['candle_begin_time'] = pd.to_datetime(df2_90_swap['candle_begin_time'])
-    merged_df90_swap = pd.merge(df1_90_swap, df2_90_swap, on='candle_begin_time', how='inner')
-    merged_df90_swap = merged_df90_swap.sort_values('candle_begin_time')
-    merged_df90_swap = merged_df90_swap[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
-    merged_df90_swap['Y_idx90'] = (merged_df90_swap['全市场涨跌幅指数'] + merged_df90_swap['山寨指数']) * 100
-    draw_index(merged_df90_swap, 'swap', title=f'Yindex90_swap', xaxle='Y_idx90', min_val=-50, max_val=150, border=10,
-               border_n=18, save_name=f'Y_idx90_v2_swap', axhline_high=200, axhline_low=0, axhline_low2=-20)
-    merged_df90_swap[['candle_begin_time', 'Y_idx90']].to_csv(f'/Users/houjl/Downloads/FLdata/swap/Y_idx90_V2.csv', index=False)
-
-    # =========计算Y指数（spot）================================================
-    print('开始计算spot的Y指数')
-    print(f'df1_spot shape: {df1_spot.shape}, df2_spot shape: {df2_spot.shape}')
-
-    # 30天Y指数
-    df1_spot['candle_begin_time'] = pd.to_datetime(df1_spot['candle_begin_time'])
-    df2_spot['candle_begin_time'] = pd.to_datetime(df2_spot['candle_begin_time'])
-    print('开始合并spot的30天数据')
-    merged_df_spot = pd.merge(df1_spot, df2_spot, on='candle_begin_time', how='inner')
-    print(f'合并后数据shape: {merged_df_spot.shape}')
-    merged_df_spot = merged_df_spot.sort_values('candle_begin_time')
-    merged_df_spot = merged_df_spot[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
-    merged_df_spot['Y_idx'] = (merged_df_spot['全市场涨跌幅指数'] + merged_df_spot['山寨指数']) * 100
-    print('开始绘制spot的Y_idx图表')
-    draw_index(merged_df_spot, 'spot', title=f'Yindex_spot', xaxle='Y_idx', min_val=-50, max_val=150, border=10,
-               border_n=18, save_name=f'Y_idx_v2_spot', axhline_high=150, axhline_low=0, axhline_low2=-20)
-    merged_df_spot[['candle_begin_time', 'Y_idx']].to_csv(f'/Users/houjl/Downloads/FLdata/spot/Y_idx_V2.csv', index=False)
-    print('spot的30天Y指数计算完成')
-
-    # 90天Y指数
-    print('开始计算spot的90天Y指数')
-    df1_90_spot['candle_begin_time'] = pd.to_datetime(df1_90_spot['candle_begin_time'])
-    df2_90_spot['candle_begin_time'] = pd.to_datetime(df2_90_spot['candle_begin_time'])
-    print('开始合并spot的90天数据')
-    merged_df90_spot = pd.merge(df1_90_spot, df2_90_spot, on='candle_begin_time', how='inner')
-    print(f'合并后90天数据shape: {merged_df90_spot.shape}')
-    merged_df90_spot = merged_df90_spot.sort_values('candle_begin_time')
-    merged_df90_spot = merged_df90_spot[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
-    merged_df90_spot['Y_idx90'] = (merged_df90_spot['全市场涨跌幅指数'] + merged_df90_spot['山寨指数']) * 100
-    print('开始绘制spot的Y_idx90图表')
-    draw_index(merged_df90_spot, 'spot', title=f'Yindex90_spot', xaxle='Y_idx90', min_val=-50, max_val=150, border=10,
-               border_n=18, save_name=f'Y_idx90_v2_spot', axhline_high=200, axhline_low=0, axhline_low2=-20)
-    merged_df90_spot[['candle_begin_time', 'Y_idx90']].to_csv(f'/Users/houjl/Downloads/FLdata/spot/Y_idx90_V2.csv', index=False)
-    print('spot的90天Y指数计算完成')
-
-    # 绘制合约现货比曲线
-    df_swap = pd.DataFrame()
-    df_spot = pd.DataFrame()
-    df_swap_spot = pd.DataFrame()
-
-    # 确保 ALL 目录存在
-    all_dir = '/Users/houjl/Downloads/FLdata/ALL'
-    if not os.path.exists(all_dir):
-        os.makedirs(all_dir)
-        print(f'创建目录: {all_dir}')
-
-    for i in [7, 30]:
-        print(f'开始处理合约现货比{i}天数据')
-        for s in ['swap', 'spot']:
-            try:
-                if s == 'swap':
-                    df_swap = pd.read_csv(f'/Users/houjl/Downloads/FLdata/{s}/marketzdf_index{i}.csv', encoding='gbk', usecols=['candle_begin_time', f'全市场涨跌幅指数{i}d'])
-                    df_swap.rename(columns={f'全市场涨跌幅指数{i}d': f'market_{s}_{i}d'}, inplace=True)
-                    print(f'成功读取 {s} 市场 {i}天数据')
-                if s == 'spot':
-                    df_spot = pd.read_csv(f'/Users/houjl/Downloads/FLdata/{s}/marketzdf_index{i}.csv', encoding='gbk', usecols=['candle_begin_time', f'全市场涨跌幅指数{i}d'])
-                    df_spot.rename(columns={f'全市场涨跌幅指数{i}d': f'market_{s}_{i}d'}, inplace=True)
-                    print(f'成功读取 {s} 市场 {i}天数据')
-            except Exception as e:
-                print(f'读取 {s} 市场 {i}天数据失败: {e}')
-                raise
-
-        # 合并及计算期货现货比
-        print(f'开始合并 {i}天数据')
-        df_swap_spot = pd.merge(df_swap, df_spot, on='candle_begin_time', how='inner')
-        df_swap_spot.to_csv(f'/Users/houjl/Downloads/FLdata/ALL/df_swap_spot_{i}.csv', index=False, encoding='gbk')
-        print(f'成功保存合并后的 {i}天数据')
-        if i == 7:
-            # 调用绘图函数画图
-            draw_index_list(df_swap_spot, market_type='ALL', title=f'market_{i}d',
-                            xaxle_list=[f'market_swap_{i}d', f'market_spot_{i}d'], min_val=-0.35, max_val=0.35,
-                            border=0.15, border_n=6, save_name=f'market_{i}d', axhline_high=0.5, axhline_low=0,
-                            axhline_low2=-0.25, days_limit=180)
-        else:
-            # 调用绘图函数画图
-            draw_index_list(df_swap_spot, market_type='ALL', title=f'market_{i}d',
-                            xaxle_list=[f'market_swap_{i}d', f'market_spot_{i}d'], min_val=-0.75, max_val=1,
-                            border=0.15, border_n=25, save_name=f'market_{i}d', axhline_high=1, axhline_low=0,
-                            axhline_low2=-0.3, days_limit=600)
+    cache = cache or memo_cache.MemoCache()
+    all_df, data_key = memo_local_data(market_type=market_type, start_time=start_time, cache=cache)
+    statdays = sorted(set(market_statdays) | set(altcoin_statdays))
+    features, keys = memo_index_features(all_df, statdays=statdays, interval='1d', cache=cache, data_key=data_key)
+    del all_df
+    market_frames, altcoin_frames = memo_index_frames(features, keys, cache, market_statdays=market_statdays,
+                                                      altcoin_statdays=altcoin_statdays, top_n=top_n,
+                                                      blacklist=blacklist)
+    print(f'缓存命中 {cache.hits} 次，未命中 {cache.misses} 次')
 
-    print('本地数据计算完成，所有指数已更新到 CSV')
+    def after_start(final_df):
+        return final_df[final_df['candle_begin_time'] > start_time] if start_time is not None else final_df
 
+    return (dict(zip(market_statdays, map(after_start, market_frames))),
+            dict(zip(altcoin_statdays, map(after_start, altcoin_frames))))
 
-def run(market_type='swap', start_time='2021-01-01'):
-    # df1是山寨指数，df2是全市场涨跌幅指数
-    df1, df2, df1_90, df2_90 = download_data(acc='qqdev', backdays=1800, interval='1d', start_time=start_time, market_type=market_type)
 
-    # =========30天Y指数================================================
-    # 确保candle_begin_time列是日期时间格式
-    df1['candle_begin_time'] = pd.to_datetime(df1['candle_begin_time'])
-    df2['candle_begin_time'] = pd.to_datetime(df2['candle_begin_time'])
+def run_hourly_with_local_data(market_type='swap', start_time='2024-01-01', statdays=(30, 90), save_img=False):
+    """
+    使用本地小时K线计算小时级Y指数
 
-    # 按candle_begin_time列合并
-    merged_df = pd.merge(df1, df2, on='candle_begin_time', how='inner')
+    直接读取小时K线（不聚合为日线），涨跌幅周期仍以天为单位（N天 = 24*N 根小时K线），
+    山寨指数按48h成交额、全市场涨跌幅指数按7d成交额筛选前50。
+    截面计算使用数组引擎（见 index_engine），耗时不会随时间点数量成倍增加。
+    结果保存为 altcoin_index{N}_1h.csv / marketzdf_index{N}_1h.csv / Y_idx{N}_1h.csv
 
-    # 按时间排序
-    merged_df = merged_df.sort_values('candle_begin_time')
-    print(merged_df)
+    Returns:
+        dict: {N: Y指数 DataFrame}
+    """
+    print(f'开始处理{market_type}小时数据')
+    hourly_df = load_local_hourly_data(market_type=market_type, start_time=start_time)
 
-    merged_df = merged_df[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
-    merged_df['Y_idx'] = (merged_df['全市场涨跌幅指数'] + merged_df['山寨指数']) * 100
+    # 所有周期共用的涨跌幅和滚动成交额只计算一次
+    features = build_index_features(hourly_df, statdays=list(statdays), interval='1h')
+    del hourly_df
+
+    # 两种指数的所有周期在一次遍历中计算
+    img_days = statdays if save_img else ()
+    mdfs, adfs = index_stat_horizons(features, market_statdays=statdays, altcoin_statdays=statdays,
+                                     market_img_days=img_days, altcoin_img_days=img_days, start_time=start_time,
+                                     interval='1h', market_type=market_type, suffix='_1h')
+
+    results = {}
+    for statday in statdays:
+        merged_df = y_index_frame(adfs[statday], mdfs[statday])
+        merged_df[['candle_begin_time', 'Y_idx']].to_csv(f'/Users/houjl/Downloads/FLdata/{market_type}/Y_idx{statday}_1h.csv', index=False)
+        print(f'{market_type}的{statday}天小时级Y指数计算完成')
+        results[statday] = merged_df
+
+    return results
+
+
+def pick_index(indices, kind, statday):
+    """
+    从 (market_results, altcoin_results) 中取出某个周期的指数
+
+    Args:
+        kind: 'market' 或 'altcoin'
+    """
+    market_results, altcoin_results = indices
+    return (market_results if kind == 'market' else altcoin_results)[statday]
+
+
+def save_y_index(adf, mdf, market_type, statday, filename, y_col, title, save_name, axhline_high):
+    """
+    Y指数节点：合并山寨指数和全市场涨跌幅指数，画图并保存为 FLdata/{market_type}/{filename}.csv
 
-    # 调用绘图函数
-    draw_index(merged_df, market_type, title=f'Yindex_{market_type}', xaxle='Y_idx', min_val=-50, max_val=150, border=10,
-               border_n=18, save_name=f'Y_idx_v2_{market_type}', axhline_high=150, axhline_low=0, axhline_low2=-20)
+    指数是增量计算的（attrs 中有 updated_from，见 update_indices_incremental）时，
+    新的行已经追加到CSV中，只画图
+    """
+    print(f'开始计算{market_type}的{statday}天Y指数')
+    merged_df = y_index_frame(adf, mdf, y_col)
+    draw_index(merged_df, market_type, title=f'{title}_{market_type}', xaxle=y_col, min_val=-50, max_val=150, border=10,
+               border_n=18, save_name=f'{save_name}_{market_type}', axhline_high=axhline_high, axhline_low=0,
+               axhline_low2=-20)
+    path = f'/Users/houjl/Downloads/FLdata/{market_type}/{filename}.csv'
+    if adf.attrs.get('updated_from') is None or not os.path.exists(path):
+        merged_df[['candle_begin_time', y_col]].to_csv(path, index=False)
+    print(f'{market_type}的{statday}天Y指数计算完成')
+    return merged_df
+
+
+def save_swap_spot(mdf_swap, mdf_spot, statday, min_val, max_val, border_n, axhline_high, axhline_low2, days_limit):
+    """
+    合约现货比节点：合并 swap/spot 的全市场涨跌幅指数N，保存为 FLdata/ALL/df_swap_spot_{N}.csv 并画图
 
-    # 保存Y指数数据
-    merged_df[['candle_begin_time', 'Y_idx']].to_csv(f'/Users/houjl/Downloads/FLdata/{market_type}/Y_idx_V2.csv', index=False)
+    两个市场的指数都是增量计算的（attrs 中有 updated_from）时，只替换两者中较早的起始日期及之后的行
+    """
+    print(f'开始处理合约现货比{statday}天数据')
+    all_dir = '/Users/houjl/Downloads/FLdata/ALL'
+    os.makedirs(all_dir, exist_ok=True)
+
+    col = f'全市场涨跌幅指数{statday}d'
+    df_swap = mdf_swap[['candle_begin_time', col]].rename(columns={col: f'market_swap_{statday}d'})
+    df_spot = mdf_spot[['candle_begin_time', col]].rename(columns={col: f'market_spot_{statday}d'})
+    df_swap_spot = pd.merge(df_swap, df_spot, on='candle_begin_time', how='inner')
+    path = f'{all_dir}/df_swap_spot_{statday}.csv'
+    updated_from = [mdf.attrs.get('updated_from') for mdf in (mdf_swap, mdf_spot)]
+    if None in updated_from or not os.path.exists(path):
+        df_swap_spot.to_csv(path, index=False, encoding='gbk')
+    else:
+        from_time = min(updated_from)
+        index_state.append_csv_rows(path, df_swap_spot[df_swap_spot['candle_begin_time'] >= from_time], from_time,
+                                    encoding='gbk')
+    print(f'成功保存合并后的 {statday}天数据')
+    draw_index_list(df_swap_spot, market_type='ALL', title=f'market_{statday}d',
+                    xaxle_list=[f'market_swap_{statday}d', f'market_spot_{statday}d'], min_val=min_val,
+                    max_val=max_val, border=0.15, border_n=border_n, save_name=f'market_{statday}d',
+                    axhline_high=axhline_high, axhline_low=0, axhline_low2=axhline_low2, days_limit=days_limit)
+    return df_swap_spot
+
+
+def build_index_dag(market_types=('swap', 'spot'), indices_func=None, indices_kwargs=None, swap_spot=True):
+    """
+    每日指数的依赖图
 
-    # =========90天Y指数================================================
-    # 确保candle_begin_time列是日期时间格式
-    df1_90['candle_begin_time'] = pd.to_datetime(df1_90['candle_begin_time'])
-    df2_90['candle_begin_time'] = pd.to_datetime(df2_90['candle_begin_time'])
+    节点：
+        {market_type}/indices: indices_func(market_type=..., **indices_kwargs)，返回所有周期的
+                               (market_results, altcoin_results)，例如 local_indices / download_indices
+        {market_type}/market{N}, {market_type}/altcoin{N}: 从中取出的某个周期
+        {market_type}/Y{N}: Y指数（Y_INDEX_SPECS）
+        ALL/swap_spot{N}: 合约现货比（SWAP_SPOT_SPECS，需要 swap 和 spot 两个市场）
 
-    # 按candle_begin_time列合并
-    merged_df90 = pd.merge(df1_90, df2_90, on='candle_begin_time', how='inner')
+    indices_func 增量计算指数时（incremental_index=True），输出节点只追加新的行，不再整体重写CSV；
+    图片需要完整的时间序列，每次都重画。
 
-    # 按时间排序
-    merged_df90 = merged_df90.sort_values('candle_begin_time')
-    print(merged_df90)
+    Returns:
+        IndexDAG
+    """
+    dag = IndexDAG()
+    indices_func = indices_func or local_indices
+
+    def index_node(market_type, kind, statday):
+        name = f'{market_type}/{kind}{statday}'
+        if name not in dag:
+            dag.add(name, pick_index, [f'{market_type}/indices'], dict(kind=kind, statday=statday), inline=True)
+        return name
+
+    for market_type in market_types:
+        dag.add(f'{market_type}/indices', indices_func, kwargs=dict(indices_kwargs or {}, market_type=market_type))
+        for spec in Y_INDEX_SPECS:
+            statday = spec['statday']
+            dag.add(f'{market_type}/Y{statday}', save_y_index,
+                    [index_node(market_type, 'altcoin', statday), index_node(market_type, 'market', statday)],
+                    dict(spec, market_type=market_type))
+
+    if swap_spot and {'swap', 'spot'} <= set(market_types):
+        for spec in SWAP_SPOT_SPECS:
+            statday = spec['statday']
+            dag.add(f'ALL/swap_spot{statday}', save_swap_spot,
+                    [index_node('swap', 'market', statday), index_node('spot', 'market', statday)], spec)
+    return dag
+
+
+def calculate_indices_from_local(start_time: str = '2021-01-01', max_workers=1, memo=False):
+    """
+    使用本地预处理后的K线数据，重新计算所有指数并更新到本地CSV
 
-    merged_df90 = merged_df90[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
-    merged_df90['Y_idx90'] = (merged_df90['全市场涨跌幅指数'] + merged_df90['山寨指数']) * 100
+    按依赖图（见 build_index_dag）执行：
+    1. 计算合约市场（swap）、现货市场（spot）所有周期的山寨指数、全市场涨跌幅指数
+    2. 基于上述结果计算 Y 指数（30天 / 90天）
+    3. 生成合约 vs 现货 对比所需的 ALL 市场数据
+    max_workers > 1 时互不依赖的节点并行执行
+    memo=True 时使用中间结果缓存（见 local_indices），本地数据没有变化时直接读取各步结果
+
+    注意：该函数依赖本地路径 /Users/houjl/Downloads/FLdata 下的预处理数据，
+    不会访问交易所接口。
+    """
+    dag = build_index_dag(indices_func=local_indices, indices_kwargs=dict(start_time=start_time, memo=memo))
+    dag.run(max_workers=max_workers)
+    print('本地数据计算完成，所有指数已更新到 CSV')
 
-    # 调用绘图函数
-    draw_index(merged_df90, market_type, title=f'Yindex90_{market_type}', xaxle='Y_idx90', min_val=-50, max_val=150, border=10,
-               border_n=18, save_name=f'Y_idx90_v2_{market_type}', axhline_high=200, axhline_low=0, axhline_low2=-20)
 
-    # 保存Y指数数据
-    merged_df90[['candle_begin_time', 'Y_idx90']].to_csv(f'/Users/houjl/Downloads/FLdata/{market_type}/Y_idx90_V2.csv', index=False)
+def run(market_type='swap', start_time='2021-01-01'):
+    """
+    从交易所下载数据，计算单个市场的指数和Y指数
+    """
+    dag = build_index_dag([market_type], indices_func=download_indices,
+                          indices_kwargs=dict(acc='qqdev', backdays=1800, interval='1d', start_time=start_time))
+    dag.run()
 
-    return
 
+def job(concurrent=True):
+    """
+    每日任务：计算 swap/spot 指数、Y指数和合约现货比
 
-def job():
+    concurrent=True 时依赖图中互不依赖的节点（swap/spot 的指数计算、各Y指数、合约现货比）在独立进程中并行执行
+    """
     # 使用循环而不是递归，避免进程无法退出
     max_retries = 3
     retry_count = 0
     
     while retry_count < max_retries:
         try:
-            # 处理合约数据
-            print('开始处理swap数据')
-            df1_swap, df2_swap, df1_90_swap, df2_90_swap = run_with_local_data(market_type='swap', start_time='2021-01-01')
-
-            print('等待3秒计算spot数据')
-            print(datetime.now())
-            # 休息3秒后处理现货数据
-            time.sleep(3)
-            print('休息完成，开始计算spot数据')
+            dag = build_index_dag(indices_func=local_indices,
+                                  indices_kwargs=dict(start_time='2021-01-01', njobs=8, incremental=True,
+                                                      incremental_index=True))
+            start = time.time()
+            dag.run(max_workers=4 if concurrent else 1)
+            print(f'指数计算完成，耗时 {time.time() - start:.1f}s')
             print(datetime.now())
-
-            # 处理现货数据
-            df1_spot, df2_spot, df1_90_spot, df2_90_spot = run_with_local_data(market_type='spot', start_time='2021-01-01')
-            
-            # =========计算Y指数（swap）================================================
-            print('开始计算swap的Y指数')
-            # 30天Y指数
-            df1_swap['candle_begin_time'] = pd.to_datetime(df1_swap['candle_begin_time'])
-            df2_swap['candle_begin_time'] = pd.to_datetime(df2_swap['candle_begin_time'])
-            merged_df_swap = pd.merge(df1_swap, df2_swap, on='candle_begin_time', how='inner')
-            merged_df_swap = merged_df_swap.sort_values('candle_begin_time')
-            merged_df_swap = merged_df_swap[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
-            merged_df_swap['Y_idx'] = (merged_df_swap['全市场涨跌幅指数'] + merged_df_swap['山寨指数']) * 100
-            draw_index(merged_df_swap, 'swap', title=f'Yindex_swap', xaxle='Y_idx', min_val=-50, max_val=150, border=10,
-                       border_n=18, save_name=f'Y_idx_v2_swap', axhline_high=150, axhline_low=0, axhline_low2=-20)
-            merged_df_swap[['candle_begin_time', 'Y_idx']].to_csv(f'/Users/houjl/Downloads/FLdata/swap/Y_idx_V2.csv', index=False)
-            
-            # 90天Y指数
-            df1_90_swap['candle_begin_time'] = pd.to_datetime(df1_90_swap['candle_begin_time'])
-            df2_90_swap['candle_begin_time'] = pd.to_datetime(df2_90_swap['candle_begin_time'])
-            merged_df90_swap = pd.merge(df1_90_swap, df2_90_swap, on='candle_begin_time', how='inner')
-            merged_df90_swap = merged_df90_swap.sort_values('candle_begin_time')
-            merged_df90_swap = merged_df90_swap[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
-            merged_df90_swap['Y_idx90'] = (merged_df90_swap['全市场涨跌幅指数'] + merged_df90_swap['山寨指数']) * 100
-            draw_index(merged_df90_swap, 'swap', title=f'Yindex90_swap', xaxle='Y_idx90', min_val=-50, max_val=150, border=10,
-                       border_n=18, save_name=f'Y_idx90_v2_swap', axhline_high=200, axhline_low=0, axhline_low2=-20)
-            merged_df90_swap[['candle_begin_time', 'Y_idx90']].to_csv(f'/Users/houjl/Downloads/FLdata/swap/Y_idx90_V2.csv', index=False)
-            
-            # =========计算Y指数（spot）================================================
-            print('开始计算spot的Y指数')
-            print(f'df1_spot shape: {df1_spot.shape}, df2_spot shape: {df2_spot.shape}')
-            
-            # 30天Y指数
-            df1_spot['candle_begin_time'] = pd.to_datetime(df1_spot['candle_begin_time'])
-            df2_spot['candle_begin_time'] = pd.to_datetime(df2_spot['candle_begin_time'])
-            print('开始合并spot的30天数据')
-            merged_df_spot = pd.merge(df1_spot, df2_spot, on='candle_begin_time', how='inner')
-            print(f'合并后数据shape: {merged_df_spot.shape}')
-            merged_df_spot = merged_df_spot.sort_values('candle_begin_time')
-            merged_df_spot = merged_df_spot[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
-            merged_df_spot['Y_idx'] = (merged_df_spot['全市场涨跌幅指数'] + merged_df_spot['山寨指数']) * 100
-            print('开始绘制spot的Y_idx图表')
-            draw_index(merged_df_spot, 'spot', title=f'Yindex_spot', xaxle='Y_idx', min_val=-50, max_val=150, border=10,
-                       border_n=18, save_name=f'Y_idx_v2_spot', axhline_high=150, axhline_low=0, axhline_low2=-20)
-            merged_df_spot[['candle_begin_time', 'Y_idx']].to_csv(f'/Users/houjl/Downloads/FLdata/spot/Y_idx_V2.csv', index=False)
-            print('spot的30天Y指数计算完成')
-            
-            # 90天Y指数
-            print('开始计算spot的90天Y指数')
-            df1_90_spot['candle_begin_time'] = pd.to_datetime(df1_90_spot['candle_begin_time'])
-            df2_90_spot['candle_begin_time'] = pd.to_datetime(df2_90_spot['candle_begin_time'])
-            print('开始合并spot的90天数据')
-            merged_df90_spot = pd.merge(df1_90_spot, df2_90_spot, on='candle_begin_time', how='inner')
-            print(f'合并后90天数据shape: {merged_df90_spot.shape}')
-            merged_df90_spot = merged_df90_spot.sort_values('candle_begin_time')
-            merged_df90_spot = merged_df90_spot[['candle_begin_time', '全市场涨跌幅指数', '山寨指数']]
-            merged_df90_spot['Y_idx90'] = (merged_df90_spot['全市场涨跌幅指数'] + merged_df90_spot['山寨指数']) * 100
-            print('开始绘制spot的Y_idx90图表')
-            draw_index(merged_df90_spot, 'spot', title=f'Yindex90_spot', xaxle='Y_idx90', min_val=-50, max_val=150, border=10,
-                       border_n=18, save_name=f'Y_idx90_v2_spot', axhline_high=200, axhline_low=0, axhline_low2=-20)
-            merged_df90_spot[['candle_begin_time', 'Y_idx90']].to_csv(f'/Users/houjl/Downloads/FLdata/spot/Y_idx90_V2.csv', index=False)
-            print('spot的90天Y指数计算完成')
-
-            # 绘制合约现货比曲线
-            df_swap = pd.DataFrame()
-            df_spot = pd.DataFrame()
-            df_swap_spot = pd.DataFrame()
-            
-            # 确保 ALL 目录存在
-            all_dir = '/Users/houjl/Downloads/FLdata/ALL'
-            if not os.path.exists(all_dir):
-                os.makedirs(all_dir)
-                print(f'创建目录: {all_dir}')
-            
-            for i in [7, 30]:
-                print(f'开始处理合约现货比{i}天数据')
-                for s in ['swap', 'spot']:
-                    try:
-                        if s == 'swap':
-                            df_swap = pd.read_csv(f'/Users/houjl/Downloads/FLdata/{s}/marketzdf_index{i}.csv', encoding='gbk', usecols=['candle_begin_time', f'全市场涨跌幅指数{i}d'])
-                            df_swap.rename(columns={f'全市场涨跌幅指数{i}d': f'market_{s}_{i}d'}, inplace=True)
-                            print(f'成功读取 {s} 市场 {i}天数据')
-                        if s == 'spot':
-                            df_spot = pd.read_csv(f'/Users/houjl/Downloads/FLdata/{s}/marketzdf_index{i}.csv', encoding='gbk', usecols=['candle_begin_time', f'全市场涨跌幅指数{i}d'])
-                            df_spot.rename(columns={f'全市场涨跌幅指数{i}d': f'market_{s}_{i}d'}, inplace=True)
-                            print(f'成功读取 {s} 市场 {i}天数据')
-                    except Exception as e:
-                        print(f'读取 {s} 市场 {i}天数据失败: {e}')
-                        raise
-                
-                # 合并及计算期货现货比
-                print(f'开始合并 {i}天数据')
-                df_swap_spot = pd.merge(df_swap, df_spot, on='candle_begin_time', how='inner')
-                df_swap_spot.to_csv(f'/Users/houjl/Downloads/FLdata/ALL/df_swap_spot_{i}.csv', index=False, encoding='gbk')
-                print(f'成功保存合并后的 {i}天数据')
-                if i == 7:
-                    # 调用绘图函数画图
-                    draw_index_list(df_swap_spot, market_type='ALL', title=f'market_{i}d',
-                                    xaxle_list=[f'market_swap_{i}d', f'market_spot_{i}d'], min_val=-0.35, max_val=0.35,
-                                    border=0.15, border_n=6, save_name=f'market_{i}d', axhline_high=0.5, axhline_low=0,
-                                    axhline_low2=-0.25, days_limit=180)
-                else:
-                    # 调用绘图函数画图
-                    draw_index_list(df_swap_spot, market_type='ALL', title=f'market_{i}d',
-                                    xaxle_list=[f'market_swap_{i}d', f'market_spot_{i}d'], min_val=-0.75, max_val=1,
-                                    border=0.15, border_n=25, save_name=f'market_{i}d', axhline_high=1, axhline_low=0,
-                                    axhline_low2=-0.3, days_limit=600)
             
             # 任务成功完成，退出循环
             break
@@ -713,6 +1302,10 @@ def job():
 
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'backfill':
+        # 上游数据修正后只重算一段日期：python Y_idx_newV2_spot.py backfill 2024-03-01 2024-03-05
+        backfill_cli(sys.argv[2:])
+        sys.exit(0)
     try:
         print(datetime.now())
         print('程序启动')
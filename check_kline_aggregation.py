@@ -260,6 +260,47 @@ def check_aggregation_for_market(market_type='swap', max_files=3):
             print(f'  3. 时间间隙可能导致某些日期的数据缺失')
 
 
+def check_grouped_aggregation(market_type='swap', max_files=20):
+    """
+    检查一次分组聚合（resample_daily_all）与逐文件 resample('D') 的结果是否完全一致
+    """
+    from yquant.common.kline_cache import read_hourly_csv_raw
+    from yquant.common.local_ingest import resample_daily, resample_daily_all
+
+    print(f'\n{"#"*80}')
+    print(f'# 检查 {market_type.upper()} 市场的分组聚合')
+    print(f'{"#"*80}')
+
+    local_data_path = f'/Users/houjl/Downloads/FLdata/coin-binance-spot-swap-preprocess-pkl-1h/split/{market_type}/'
+    csv_files = glob.glob(os.path.join(local_data_path, '*.csv'))[:max_files]
+    if len(csv_files) == 0:
+        print(f'❌ 错误: 没有找到任何CSV文件')
+        return False
+
+    hourly_list = []
+    expected_list = []
+    for csv_file in csv_files:
+        symbol_name = os.path.basename(csv_file).replace('.csv', '').replace('-', '')
+        df = read_hourly_csv_raw(csv_file)
+        df_daily = resample_daily(df, symbol_name)
+        if df_daily is not None:
+            expected_list.append(df_daily)
+        df['symbol'] = symbol_name
+        hourly_list.append(df)
+
+    expected = pd.concat(expected_list, ignore_index=True)
+    actual = resample_daily_all(pd.concat(hourly_list, ignore_index=True))
+
+    try:
+        pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected)
+    except AssertionError as e:
+        print(f'⚠️ 分组聚合与逐文件聚合不一致: {e}')
+        return False
+
+    print(f'✅ {len(csv_files)} 个文件，{len(actual)} 条日线，分组聚合与逐文件聚合完全一致')
+    return True
+
+
 if __name__ == '__main__':
     # 检查swap市场
     check_aggregation_for_market('swap', max_files=3)
@@ -269,5 +310,11 @@ if __name__ == '__main__':
     # 检查spot市场
     check_aggregation_for_market('spot', max_files=3)
 
+    print('\n' + '='*80 + '\n')
+
+    # 检查分组聚合与逐文件聚合的一致性
+    check_grouped_aggregation('swap')
+    check_grouped_aggregation('spot')
+
 
 
@@ -68,8 +68,8 @@ def render_sidebar():
         # 刷新按钮：基于本地最新元数据重算指数并刷新看板
         if st.button("🔄 刷新数据", use_container_width=True):
             with st.spinner("正在根据本地最新数据重新计算所有指数，请稍候..."):
-                # 使用本地预处理好的K线数据重算所有指数并更新CSV
-                Y_idx_newV2_spot.calculate_indices_from_local(start_time='2021-01-01')
+                # 使用本地预处理好的K线数据重算所有指数并更新CSV，没有变化的中间结果直接读取缓存
+                Y_idx_newV2_spot.calculate_indices_from_local(start_time='2021-01-01', memo=True)
             st.cache_data.clear()
             st.success("📊 指数已根据本地最新数据完成重算")
             st.rerun()
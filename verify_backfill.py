@@ -0,0 +1,88 @@
+"""
+验证按日期范围重算指数（Y_idx_newV2_spot.backfill_indices）
+
+    1. 只读取回看窗口内的K线计算的指数，在 [t0, 受影响的最后一天] 内与读取全部历史的结果逐字节相同
+    2. 把已有指数CSV中一段日期的行原样替换回去（index_state.splice_csv_rows），文件内容不变
+不修改 FLdata 下的任何输出。
+"""
+import os
+import glob
+import shutil
+import time
+import pandas as pd
+import warnings
+warnings.filterwarnings("ignore")
+
+import yquant.common.index_engine as index_engine
+import yquant.common.index_state as index_state
+import yquant.common.kline_cache as kline_cache
+import yquant.common.local_ingest as local_ingest
+from Y_idx_newV2_spot import (build_index_features, load_local_data, ALCOIN_BLACKLIST, ALCOIN_VOLUME_COL,
+                              MARKET_VOLUME_COL, MARKET_STATDAYS, ALCOIN_STATDAYS)
+
+
+def index_frames(all_df):
+    features = build_index_features(all_df, statdays=sorted(set(MARKET_STATDAYS) | set(ALCOIN_STATDAYS)))
+    return index_engine.index_frames(
+        features, market_groups=[[statday] for statday in MARKET_STATDAYS],
+        altcoin_groups=[[statday] for statday in ALCOIN_STATDAYS], market_volume_col=MARKET_VOLUME_COL,
+        altcoin_volume_col=ALCOIN_VOLUME_COL, top_n=50, blacklist=ALCOIN_BLACKLIST)
+
+
+def check_window(market_type, t0, t1, start_time='2021-01-01'):
+    """
+    回看窗口内的K线与全部历史计算的指数比较（口径同 backfill_indices）
+    """
+    t0, t1 = pd.Timestamp(t0), pd.Timestamp(t1)
+    statdays = sorted(set(MARKET_STATDAYS) | set(ALCOIN_STATDAYS))
+    min_rows = max(statdays + [365 - 1])
+    load_start = max(t0 - pd.Timedelta(days=max(statdays) + 365), pd.Timestamp(start_time))
+
+    local_data_path = f'/Users/houjl/Downloads/FLdata/coin-binance-spot-swap-preprocess-pkl-1h/split/{market_type}/'
+    csv_files = glob.glob(os.path.join(local_data_path, '*.csv'))
+    start = time.time()
+    window_df = local_ingest.ingest_daily_window(csv_files, load_start, None, t0, min_rows, history_start=start_time,
+                                                 cache_dir=kline_cache.get_cache_dir(local_data_path))
+    t_end = index_state.affected_until(window_df, t0, t1, rows=min_rows)
+    window_frames = index_frames(window_df)
+    window_seconds = time.time() - start
+
+    start = time.time()
+    full_frames = index_frames(load_local_data(market_type=market_type, start_time=start_time, verify_sync=False))
+    full_seconds = time.time() - start
+
+    def in_range(final_df):
+        final_df = final_df[(final_df['candle_begin_time'] >= t0) & (final_df['candle_begin_time'] <= t_end)]
+        return final_df[final_df['candle_begin_time'] > start_time].to_csv(index=False)
+
+    same = all(in_range(a) == in_range(b) for frames_a, frames_b in zip(full_frames, window_frames)
+               for a, b in zip(frames_a, frames_b))
+    print(f'{t0.strftime("%Y-%m-%d")} ~ {t_end.strftime("%Y-%m-%d")} 的指数: {"一致" if same else "不一致"}，'
+          f'回看窗口 {window_seconds:.1f}s（{len(window_df)} 行日线），全部历史 {full_seconds:.1f}s')
+    return same
+
+
+def check_splice(path, t0, t1, encoding='gbk', tmp_path='/tmp/verify_backfill.csv'):
+    """
+    把一段日期的行原样替换回去，文件不变
+    """
+    shutil.copyfile(path, tmp_path)
+    df = pd.read_csv(path, encoding=encoding, dtype=str)
+    times = pd.to_datetime(df['candle_begin_time'])
+    rows = df[(times >= t0) & (times <= t1)]
+    index_state.splice_csv_rows(tmp_path, rows, t0, t1, encoding=encoding)
+    with open(path, 'rb') as a, open(tmp_path, 'rb') as b:
+        same = a.read() == b.read()
+    os.remove(tmp_path)
+    print(f'{os.path.basename(path)} 替换 {len(rows)} 行: {"一致" if same else "不一致"}')
+    return same
+
+
+if __name__ == '__main__':
+    for market_type in ['swap', 'spot']:
+        print(f'\n{"="*80}')
+        print(f'检查 {market_type.upper()} 市场按日期范围重算')
+        print(f'{"="*80}\n')
+        for t0, t1 in [('2024-03-01', '2024-03-05'), ('2025-01-10', '2025-01-10')]:
+            check_window(market_type, t0, t1)
+            check_splice(f'/Users/houjl/Downloads/FLdata/{market_type}/altcoin_index30.csv', t0, t1)
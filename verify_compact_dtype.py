@@ -0,0 +1,87 @@
+"""
+验证紧凑表示（compact_market_frame）对指数计算的影响
+
+对比 float64 原始长表与紧凑表示（分类 symbol + 只保留四列 + 可选 float32 成交额）：
+    1. 内存占用
+    2. 涨跌幅：close 始终为 float64，应与原始路径完全一致（最大误差为 0）
+    3. 滚动成交额：float32 输入的相对误差，一般在 1e-7 量级
+    4. 前50筛选：山寨指数（365日均成交额）和全市场涨跌幅指数（7日成交额）每天的前50成员，
+       只有成交额几乎相同的币种才可能互换位置；前50成员完全一致的日期，指数结果也完全一致
+"""
+import pandas as pd
+import numpy as np
+import warnings
+warnings.filterwarnings("ignore")
+
+from Y_idx_newV2_spot import (build_index_features, compact_market_frame, ALCOIN_BLACKLIST, ALCOIN_VOLUME_COL,
+                              MARKET_VOLUME_COL)
+
+pd.set_option('display.unicode.ambiguous_as_wide', True)
+pd.set_option('display.unicode.east_asian_width', True)
+pd.set_option('display.width', 200)
+
+
+def _top_members(features, volume_col, top_n=50):
+    """
+    每行是否属于当天成交额前 top_n（与 alcoin_stat / market_zdf_stat 相同的 rank(method='first') 口径）
+    """
+    rank = features.groupby('candle_begin_time')[volume_col].rank(ascending=False, method='first')
+    return (rank <= top_n).to_numpy()
+
+
+def check_compact_accuracy(all_df, statdays=(7, 30, 90, 365), float32_volume=True):
+    """
+    对比 float64 路径与紧凑表示的派生列和前50筛选结果
+
+    Returns:
+        dict: 各项误差统计
+    """
+    compact_df = compact_market_frame(all_df, float32_volume=float32_volume)
+    print(f'内存占用: 原始 {all_df.memory_usage(deep=True).sum() / 1e6:.1f} MB, '
+          f'紧凑 {compact_df.memory_usage(deep=True).sum() / 1e6:.1f} MB')
+
+    base = build_index_features(all_df, statdays=statdays)
+    compact = build_index_features(compact_df, statdays=statdays)
+
+    result = {}
+
+    # 两者都按 symbol 稳定排序，行一一对应
+    assert (base['symbol'].astype(str).to_numpy() == compact['symbol'].astype(str).to_numpy()).all()
+
+    for statday in statdays:
+        col = f'涨跌幅{statday}d'
+        diff = np.nanmax(np.abs(base[col].to_numpy() - compact[col].to_numpy()), initial=0)
+        result[col] = diff
+        print(f'{col} 最大绝对误差: {diff}')
+
+    for volume_col in (ALCOIN_VOLUME_COL, MARKET_VOLUME_COL):
+        a = base[volume_col].to_numpy()
+        b = compact[volume_col].to_numpy()
+        rel = np.nanmax(np.abs(a - b) / np.where(a == 0, 1, np.abs(a)), initial=0)
+        result[f'{volume_col}相对误差'] = rel
+        print(f'{volume_col} 最大相对误差: {rel:.3e}')
+
+    # 山寨指数先排除黑名单再筛选
+    for volume_col, exclude in ((ALCOIN_VOLUME_COL, ALCOIN_BLACKLIST), (MARKET_VOLUME_COL, [])):
+        keep_base = ~base['symbol'].isin(exclude).to_numpy()
+        in_top_base = _top_members(base[keep_base], volume_col)
+        in_top_compact = _top_members(compact[keep_base], volume_col)
+        changed = base.loc[keep_base, 'candle_begin_time'].to_numpy()[in_top_base != in_top_compact]
+        n_days = len(np.unique(changed))
+        total_days = base['candle_begin_time'].nunique()
+        result[f'{volume_col}前50不一致天数'] = n_days
+        print(f'{volume_col} 前50成员不一致的天数: {n_days}/{total_days}')
+        if n_days > 0:
+            print(f'   涉及日期示例: {pd.to_datetime(np.unique(changed)[:5]).strftime("%Y-%m-%d").tolist()}')
+
+    return result
+
+
+if __name__ == '__main__':
+    for market_type in ['swap', 'spot']:
+        print(f'\n{"="*80}')
+        print(f'检查 {market_type.upper()} 市场紧凑表示的精度')
+        print(f'{"="*80}\n')
+        all_df = pd.read_csv(f'/Users/houjl/Downloads/FLdata/{market_type}/all_df_from_Y_idx_newV2.csv', encoding='gbk',
+                             parse_dates=['candle_begin_time'])
+        check_compact_accuracy(all_df)
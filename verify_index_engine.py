@@ -0,0 +1,211 @@
+"""
+验证数组引擎（yquant/common/index_engine.py）与原来逐时间点循环的结果一致
+
+原实现对每个时间点 groupby('candle_begin_time')，rank 成交额取前50、rank 涨跌幅找 BTC
+（或对前50的涨跌幅求平均），再逐行 pd.concat。这里保留原实现作为参照，在同一份派生列上分别计算，
+比较写出的 CSV 文本（包括 BTC排名 的 3 / 3.0 这类类型差异）是否逐字节相同。
+另外检查部分排序的前N筛选（top_n_mask）与完整排名（rank_desc_first）选出的成员相同，
+以及在内存映射读取的市场面板（market_panel）上计算的指数、成员索引与从长表计算的相同。
+"""
+import time
+import tempfile
+import pandas as pd
+import numpy as np
+import warnings
+warnings.filterwarnings("ignore")
+
+import yquant.common.index_engine as index_engine
+import yquant.common.universe_index as universe_index
+from yquant.common.market_panel import MarketPanel
+from Y_idx_newV2_spot import (build_index_features, panel_index_features, ALCOIN_BLACKLIST, ALCOIN_VOLUME_COL,
+                              MARKET_VOLUME_COL)
+
+pd.set_option('display.unicode.ambiguous_as_wide', True)
+pd.set_option('display.unicode.east_asian_width', True)
+pd.set_option('display.width', 200)
+
+
+def reference_altcoin_index(features, statdays):
+    """
+    原 alcoin_stat 的逐时间点实现（只保留计算部分）
+    """
+    alcoin_df = features[~features['symbol'].isin(ALCOIN_BLACKLIST)]
+    final_df = pd.DataFrame(columns=['candle_begin_time', 'BTC排名', '全币种数量', '山寨指数'])
+    for candle_begin_time, _df in alcoin_df.groupby('candle_begin_time'):
+        volume_rank = _df[ALCOIN_VOLUME_COL].rank(ascending=False, method='first')
+        _df = _df[volume_rank <= 50]
+
+        altcoin_index_sum = 0
+        for statday in statdays:
+            zdf_rank = _df[f'涨跌幅{statday}d'].rank(ascending=False, method='first')
+            btc_mask = (_df['symbol'] == 'BTCUSDT').to_numpy()
+            total_rank = len(_df)
+            if btc_mask.any():
+                btc_rank = zdf_rank[btc_mask].iloc[0]
+            else:
+                btc_rank = total_rank + 1
+                continue
+
+            if pd.isnull(btc_rank) or btc_rank > total_rank:
+                btc_rank = total_rank
+
+            altcoin_index = round(btc_rank / total_rank, 2)
+            altcoin_index_sum += altcoin_index
+        altcoin_index = altcoin_index_sum / len(statdays)
+        data = {'candle_begin_time': candle_begin_time, 'BTC排名': btc_rank, '全币种数量': total_rank,
+                '山寨指数': altcoin_index}
+        row_df = pd.DataFrame(data, columns=['candle_begin_time', 'BTC排名', '全币种数量', '山寨指数'], index=[0])
+        final_df = pd.concat([final_df, row_df], ignore_index=True)
+    return final_df
+
+
+def reference_market_index(features, statdays):
+    """
+    原 market_zdf_stat 的逐时间点实现（只保留计算部分）
+    """
+    dfs = []
+    for candle_begin_time, _df in features.groupby('candle_begin_time'):
+        volume_rank = _df[MARKET_VOLUME_COL].rank(ascending=False, method='first')
+        _df = _df[volume_rank <= 50]
+
+        marketdzf_index_sum = 0
+        row = {'candle_begin_time': candle_begin_time}
+        for statday in statdays:
+            marketzdf_index = _df[f'涨跌幅{statday}d'].sum() / len(_df)
+            marketdzf_index_sum += marketzdf_index
+            row[f'全市场涨跌幅指数{statday}d'] = marketzdf_index
+        marketzdf_index = marketdzf_index_sum / len(statdays)
+        row['全市场涨跌幅指数'] = marketzdf_index
+        dfs.append(pd.DataFrame([row]))
+    return pd.concat(dfs, ignore_index=True)
+
+
+def check_altcoin_engine(features, statdays_list=([30], [90], [365])):
+    """
+    逐个统计周期比较引擎和原实现写出的 CSV
+
+    Returns:
+        bool: 是否全部一致
+    """
+    all_same = True
+    for statdays in statdays_list:
+        start = time.time()
+        expected = reference_altcoin_index(features, statdays)
+        loop_seconds = time.time() - start
+
+        start = time.time()
+        actual = index_engine.altcoin_index_frame(features[~features['symbol'].isin(ALCOIN_BLACKLIST)], statdays,
+                                                  ALCOIN_VOLUME_COL, top_n=50)
+        engine_seconds = time.time() - start
+
+        same = expected.to_csv(index=False) == actual.to_csv(index=False)
+        all_same &= same
+        print(f'山寨指数 {statdays}: {"一致" if same else "不一致"}，'
+              f'逐时间点 {loop_seconds:.2f}s，数组引擎 {engine_seconds:.2f}s')
+        if not same:
+            diff = expected.astype(str).compare(actual.astype(str))
+            print(diff.head(10))
+    return all_same
+
+
+def check_market_engine(features, statdays_list=([7], [30], [90], [7, 30, 90])):
+    """
+    逐组统计周期比较引擎和原实现写出的 CSV
+
+    Returns:
+        bool: 是否全部一致
+    """
+    all_same = True
+    for statdays in statdays_list:
+        start = time.time()
+        expected = reference_market_index(features, statdays)
+        loop_seconds = time.time() - start
+
+        start = time.time()
+        actual = index_engine.market_index_frame(features, statdays, MARKET_VOLUME_COL, top_n=50)
+        engine_seconds = time.time() - start
+
+        same = expected.to_csv(index=False) == actual.to_csv(index=False)
+        all_same &= same
+        print(f'全市场涨跌幅指数 {statdays}: {"一致" if same else "不一致"}，'
+              f'逐时间点 {loop_seconds:.2f}s，数组引擎 {engine_seconds:.2f}s')
+        if not same:
+            diff = expected.astype(str).compare(actual.astype(str))
+            print(diff.head(10))
+    return all_same
+
+
+def check_top_n(features, top_n=50):
+    """
+    部分排序的前N筛选与完整排名的筛选结果是否相同
+    """
+    section = index_engine.CrossSection(features)
+    all_same = True
+    for volume_col in (ALCOIN_VOLUME_COL, MARKET_VOLUME_COL):
+        for _, _, matrices in section.blocks([volume_col]):
+            volume = matrices[volume_col]
+            all_same &= bool((index_engine.top_n_mask(volume, top_n) ==
+                              (index_engine.rank_desc_first(volume) <= top_n)).all())
+    print(f'前{top_n}筛选（部分排序 vs 完整排名）: {"一致" if all_same else "不一致"}')
+    return all_same
+
+
+def check_horizons(features, market_statdays=(7, 30, 90), altcoin_statdays=(30, 90, 365)):
+    """
+    一次遍历计算所有周期（index_frames）与逐个周期单独计算的结果是否相同
+    """
+    market_frames, altcoin_frames = index_engine.index_frames(
+        features, market_groups=[[statday] for statday in market_statdays],
+        altcoin_groups=[[statday] for statday in altcoin_statdays], market_volume_col=MARKET_VOLUME_COL,
+        altcoin_volume_col=ALCOIN_VOLUME_COL, top_n=50, blacklist=ALCOIN_BLACKLIST)
+    all_same = True
+    for statday, final_df in zip(market_statdays, market_frames):
+        single = index_engine.market_index_frame(features, [statday], MARKET_VOLUME_COL, top_n=50)
+        all_same &= final_df.to_csv(index=False) == single.to_csv(index=False)
+    for statday, final_df in zip(altcoin_statdays, altcoin_frames):
+        single = index_engine.altcoin_index_frame(features, [statday], ALCOIN_VOLUME_COL, top_n=50,
+                                                  blacklist=ALCOIN_BLACKLIST)
+        all_same &= final_df.to_csv(index=False) == single.to_csv(index=False)
+    print(f'多周期一次遍历 vs 逐周期计算: {"一致" if all_same else "不一致"}')
+    return all_same
+
+
+def check_panel(all_df, features, market_statdays=(7, 30, 90), altcoin_statdays=(30, 90, 365)):
+    """
+    在内存映射读取的市场面板上计算（panel_index_features）与从长表计算的指数、成员索引是否相同
+    """
+    with tempfile.TemporaryDirectory() as panel_dir:
+        MarketPanel.from_long(all_df).save(panel_dir)
+        section = panel_index_features(MarketPanel.load(panel_dir), statdays=[7, 30, 90, 365])
+
+        all_same = True
+        for volume_col, blacklist in ((MARKET_VOLUME_COL, ()), (ALCOIN_VOLUME_COL, ALCOIN_BLACKLIST)):
+            expected = universe_index.build_universe(features, volume_col, top_n=50, blacklist=blacklist)
+            actual = universe_index.build_universe(section, volume_col, top_n=50, blacklist=blacklist)
+            all_same &= bool((expected.dates == actual.dates).all() and list(expected.symbols) == list(actual.symbols)
+                             and (expected.members == actual.members).all())
+
+        kwargs = dict(market_groups=[[statday] for statday in market_statdays],
+                      altcoin_groups=[[statday] for statday in altcoin_statdays], market_volume_col=MARKET_VOLUME_COL,
+                      altcoin_volume_col=ALCOIN_VOLUME_COL, top_n=50, blacklist=ALCOIN_BLACKLIST)
+        expected_frames = index_engine.index_frames(features, **kwargs)
+        actual_frames = index_engine.index_frames(section, **kwargs)
+        for expected, actual in zip(sum(expected_frames, []), sum(actual_frames, [])):
+            all_same &= expected.to_csv(index=False) == actual.to_csv(index=False)
+    print(f'市场面板 vs 长表: {"一致" if all_same else "不一致"}')
+    return all_same
+
+
+if __name__ == '__main__':
+    for market_type in ['swap', 'spot']:
+        print(f'\n{"="*80}')
+        print(f'检查 {market_type.upper()} 市场数组引擎与逐时间点实现的一致性')
+        print(f'{"="*80}\n')
+        all_df = pd.read_csv(f'/Users/houjl/Downloads/FLdata/{market_type}/all_df_from_Y_idx_newV2.csv', encoding='gbk',
+                             parse_dates=['candle_begin_time'])
+        features = build_index_features(all_df, statdays=[7, 30, 90, 365])
+        check_top_n(features)
+        check_altcoin_engine(features)
+        check_market_engine(features)
+        check_horizons(features)
+        check_panel(all_df, features)
@@ -0,0 +1,110 @@
+"""
+验证 numba 内核（yquant/common/index_kernels.py）与 index_engine 的 NumPy 实现结果逐位相同
+
+分别在 index_kernels.ENABLED = True / False 下计算：
+    1. 逐币种滚动成交额（日线 365 日均值 / 7 日合计，小时 48h / 168h）
+    2. 成交额前50筛选、BTC 名次、前50涨跌幅合计（随机矩阵，包含大量并列值和 NaN）
+    3. 全部周期的山寨指数和全市场涨跌幅指数，比较写出的 CSV
+并输出两种实现的耗时。未安装 numba 时只提示并退出。
+"""
+import time
+import numpy as np
+import pandas as pd
+import warnings
+warnings.filterwarnings("ignore")
+
+import yquant.common.index_engine as index_engine
+import yquant.common.index_kernels as index_kernels
+from Y_idx_newV2_spot import build_index_features, ALCOIN_BLACKLIST, ALCOIN_VOLUME_COL, MARKET_VOLUME_COL
+
+
+def run_both(func, *args, **kwargs):
+    """
+    分别用内核和 NumPy 实现运行 func，返回 (内核结果, NumPy结果, 内核耗时, NumPy耗时)
+    """
+    func(*args, **kwargs)  # 预热，排除编译时间
+    results = []
+    seconds = []
+    for enabled in (True, False):
+        index_kernels.ENABLED = enabled
+        start = time.time()
+        results.append(func(*args, **kwargs))
+        seconds.append(time.time() - start)
+    index_kernels.ENABLED = True
+    return results[0], results[1], seconds[0], seconds[1]
+
+
+def same_array(a, b):
+    return a.dtype == b.dtype and a.shape == b.shape and np.array_equal(a, b, equal_nan=a.dtype.kind == 'f')
+
+
+def report(name, same, kernel_seconds, numpy_seconds):
+    print(f'{name}: {"一致" if same else "不一致"}，内核 {kernel_seconds:.3f}s，NumPy {numpy_seconds:.3f}s')
+    return same
+
+
+def check_rolling(features, windows=((365, 365, 'mean'), (7, 7, 'sum'), (48, 48, 'sum'), (168, 7, 'sum'))):
+    bounds = index_engine.group_bounds(pd.factorize(features['symbol'], sort=True)[0])
+    quote_volume = features['quote_volume'].to_numpy(dtype='float64')
+    all_same = True
+    for window, min_periods, how in windows:
+        kernel, numpy_result, kernel_seconds, numpy_seconds = run_both(
+            index_engine.rolling_rows, quote_volume, bounds, window, min_periods, how=how)
+        all_same &= report(f'滚动成交额 window={window} {how}', same_array(kernel, numpy_result), kernel_seconds,
+                           numpy_seconds)
+    return all_same
+
+
+def check_cross_section(n_rows=2000, n_cols=400, top_n=50, seed=0):
+    """
+    随机矩阵：数值取整制造并列，随机位置为 NaN
+    """
+    rng = np.random.default_rng(seed)
+    volume = np.round(rng.random((n_rows, n_cols)) * 100)
+    volume[rng.random((n_rows, n_cols)) < 0.3] = np.nan
+    zdf = np.round(rng.normal(size=(n_rows, n_cols)), 1)
+    zdf[rng.random((n_rows, n_cols)) < 0.1] = np.nan
+
+    all_same = True
+    kernel, numpy_result, kernel_seconds, numpy_seconds = run_both(index_engine.top_n_mask, volume, top_n)
+    all_same &= report('前N筛选', same_array(kernel, numpy_result), kernel_seconds, numpy_seconds)
+    members = numpy_result
+    for col in (0, n_cols // 2, n_cols - 1):
+        kernel, numpy_result, kernel_seconds, numpy_seconds = run_both(
+            index_engine.column_rank_desc_first, zdf, members, col)
+        all_same &= report(f'第{col}列名次', same_array(kernel, numpy_result), kernel_seconds, numpy_seconds)
+    for mask in (members, ~np.isnan(volume)):
+        kernel, numpy_result, kernel_seconds, numpy_seconds = run_both(index_engine.masked_row_sum, zdf * 1e3, mask)
+        same = same_array(kernel[0], numpy_result[0]) and np.array_equal(kernel[1], numpy_result[1])
+        all_same &= report(f'选中合计（最多 {mask.sum(axis=1).max()} 个）', same, kernel_seconds, numpy_seconds)
+    return all_same
+
+
+def check_index_frames(features, market_statdays=(7, 30, 90), altcoin_statdays=(30, 90, 365)):
+    def compute():
+        return index_engine.index_frames(
+            features, market_groups=[[statday] for statday in market_statdays],
+            altcoin_groups=[[statday] for statday in altcoin_statdays], market_volume_col=MARKET_VOLUME_COL,
+            altcoin_volume_col=ALCOIN_VOLUME_COL, top_n=50, blacklist=ALCOIN_BLACKLIST)
+
+    kernel, numpy_result, kernel_seconds, numpy_seconds = run_both(compute)
+    same = all(a.to_csv(index=False) == b.to_csv(index=False)
+               for frames_a, frames_b in zip(kernel, numpy_result) for a, b in zip(frames_a, frames_b))
+    return report('全部周期指数 CSV', same, kernel_seconds, numpy_seconds)
+
+
+if __name__ == '__main__':
+    if not index_kernels.AVAILABLE:
+        print('未安装 numba，index_engine 使用 NumPy 实现')
+        raise SystemExit(0)
+
+    check_cross_section()
+    for market_type in ['swap', 'spot']:
+        print(f'\n{"="*80}')
+        print(f'检查 {market_type.upper()} 市场 numba 内核与 NumPy 实现的一致性')
+        print(f'{"="*80}\n')
+        all_df = pd.read_csv(f'/Users/houjl/Downloads/FLdata/{market_type}/all_df_from_Y_idx_newV2.csv', encoding='gbk',
+                             parse_dates=['candle_begin_time'])
+        features = build_index_features(all_df, statdays=[7, 30, 90, 365])
+        check_rolling(features)
+        check_index_frames(features)
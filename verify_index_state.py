@@ -0,0 +1,84 @@
+"""
+验证指数增量更新（update_indices_incremental）与全量计算的结果一致
+
+用本地保存的日线模拟逐日到来的数据：先用前一段日线全量计算一次，之后每次多给一天（最后一天先给不完整的
+收盘价，下一次再给完整的，模拟未走完的当天），走增量路径追加CSV；最后与全量计算写出的CSV逐字节比较。
+成员索引（universe_index）同样比较拼接后的内容。
+结果写到 FLdata/{market_type}_verify_incremental 和 FLdata/{market_type}_verify_full，不影响正式输出。
+"""
+import os
+import time
+import pandas as pd
+import numpy as np
+import warnings
+warnings.filterwarnings("ignore")
+
+import yquant.common.universe_index as universe_index
+from Y_idx_newV2_spot import (update_indices_incremental, universe_files, MARKET_STATDAYS, ALCOIN_STATDAYS,
+                              Y_INDEX_FILES)
+
+
+def output_files():
+    return [f'marketzdf_index{statday}.csv' for statday in MARKET_STATDAYS] + \
+           [f'altcoin_index{statday}.csv' for statday in ALCOIN_STATDAYS] + \
+           [f'{filename}.csv' for _, filename, _ in Y_INDEX_FILES]
+
+
+def check_incremental(all_df, market_type='swap', start_time='2021-01-01', steps=10):
+    """
+    逐日增量更新最后 steps 天，与全量计算比较
+
+    Returns:
+        bool: 是否全部一致
+    """
+    incremental_type = f'{market_type}_verify_incremental'
+    full_type = f'{market_type}_verify_full'
+    dates = sorted(all_df['candle_begin_time'].unique())
+
+    # 先全量计算到倒数第 steps 天
+    update_indices_incremental(all_df[all_df['candle_begin_time'] < dates[-steps]], market_type=incremental_type,
+                               start_time=start_time, full=True, save_img=False)
+
+    start = time.time()
+    for date in dates[-steps:]:
+        # 当天先给一个不完整的收盘价，再给完整数据
+        partial = all_df[all_df['candle_begin_time'] <= date].copy()
+        today = partial['candle_begin_time'] == date
+        partial.loc[today, 'close'] = partial.loc[today, 'close'] * 1.01
+        update_indices_incremental(partial, market_type=incremental_type, start_time=start_time, save_img=False)
+        update_indices_incremental(all_df[all_df['candle_begin_time'] <= date], market_type=incremental_type,
+                                   start_time=start_time, save_img=False)
+    incremental_seconds = (time.time() - start) / (2 * steps)
+
+    start = time.time()
+    update_indices_incremental(all_df, market_type=full_type, start_time=start_time, full=True, save_img=False)
+    full_seconds = time.time() - start
+
+    all_same = True
+    for name in output_files():
+        with open(os.path.join('/Users/houjl/Downloads/FLdata', incremental_type, name), 'rb') as f:
+            incremental_bytes = f.read()
+        with open(os.path.join('/Users/houjl/Downloads/FLdata', full_type, name), 'rb') as f:
+            full_bytes = f.read()
+        same = incremental_bytes == full_bytes
+        all_same &= same
+        print(f'{name}: {"一致" if same else "不一致"}')
+    for name in universe_files():
+        incremental = universe_index.load_universe(os.path.join(universe_index.get_universe_dir(incremental_type), name))
+        full = universe_index.load_universe(os.path.join(universe_index.get_universe_dir(full_type), name))
+        same = (np.array_equal(incremental.dates, full.dates) and incremental.symbols == full.symbols
+                and np.array_equal(incremental.members, full.members))
+        all_same &= same
+        print(f'{name}: {"一致" if same else "不一致"}')
+    print(f'增量更新平均 {incremental_seconds:.2f}s/次，全量计算 {full_seconds:.2f}s')
+    return all_same
+
+
+if __name__ == '__main__':
+    for market_type in ['swap', 'spot']:
+        print(f'\n{"="*80}')
+        print(f'检查 {market_type.upper()} 市场指数增量更新与全量计算的一致性')
+        print(f'{"="*80}\n')
+        all_df = pd.read_csv(f'/Users/houjl/Downloads/FLdata/{market_type}/all_df_from_Y_idx_newV2.csv', encoding='gbk',
+                             parse_dates=['candle_begin_time'])
+        check_incremental(all_df, market_type=market_type)
@@ -0,0 +1,117 @@
+"""
+验证中间结果缓存（yquant/common/memo_cache.py）
+
+    1. 走缓存得到的派生列（首次计算 / 读取缓存）与 build_index_features 逐字节相同
+    2. 只改山寨指数黑名单时，只重新筛选山寨指数成员、重算山寨指数，其余步骤全部命中；
+       只改 top_n 时涨跌幅和成交额全部命中；结果与不走缓存直接计算相同
+    3. 总大小超过上限时淘汰最久未使用的条目，刚读取过的条目保留
+"""
+import os
+import time
+import shutil
+import numpy as np
+import pandas as pd
+import warnings
+warnings.filterwarnings("ignore")
+
+import yquant.common.index_engine as index_engine
+import yquant.common.memo_cache as memo_cache
+from Y_idx_newV2_spot import (build_index_features, memo_index_features, memo_index_frames, ALCOIN_BLACKLIST,
+                              ALCOIN_VOLUME_COL, MARKET_VOLUME_COL, MARKET_STATDAYS, ALCOIN_STATDAYS)
+
+# 验证使用的临时缓存目录，不影响 FLdata/memo_cache
+VERIFY_DIR = '/tmp/verify_memo_cache'
+
+
+def same_frames(expected, actual):
+    return all(a.to_csv(index=False) == b.to_csv(index=False)
+               for frames_a, frames_b in zip(expected, actual) for a, b in zip(frames_a, frames_b))
+
+
+def check_features(all_df, cache, statdays=(7, 30, 90, 365)):
+    """
+    首次计算和读取缓存的派生列都与 build_index_features 相同
+    """
+    expected = build_index_features(all_df, statdays=statdays)
+    results = []
+    for label in ['首次计算', '读取缓存']:
+        start = time.time()
+        features, _ = memo_index_features(all_df, statdays=statdays, cache=cache)
+        same = features.equals(expected) and features.to_csv(index=False) == expected.to_csv(index=False)
+        print(f'派生列（{label}，{time.time() - start:.2f}s）: {"一致" if same else "不一致"}')
+        results.append(same)
+    return all(results)
+
+
+def check_reuse(all_df, cache):
+    """
+    逐个改变参数，检查命中的步骤和结果
+    """
+    statdays = sorted(set(MARKET_STATDAYS) | set(ALCOIN_STATDAYS))
+    cases = [
+        ('默认参数', 50, ALCOIN_BLACKLIST, None),
+        ('只改黑名单', 50, ALCOIN_BLACKLIST + ['ETHUSDT'], 1 + len(ALCOIN_STATDAYS)),
+        ('只改top_n', 30, ALCOIN_BLACKLIST, 2 + len(MARKET_STATDAYS) + len(ALCOIN_STATDAYS)),
+        ('重复运行', 30, ALCOIN_BLACKLIST, 0),
+    ]
+    results = []
+    for label, top_n, blacklist, expected_misses in cases:
+        misses = cache.misses
+        start = time.time()
+        features, keys = memo_index_features(all_df, statdays=statdays, cache=cache)
+        actual = memo_index_frames(features, keys, cache, top_n=top_n, blacklist=blacklist)
+        seconds = time.time() - start
+        misses = cache.misses - misses
+
+        expected = index_engine.index_frames(
+            build_index_features(all_df, statdays=statdays),
+            market_groups=[[statday] for statday in MARKET_STATDAYS],
+            altcoin_groups=[[statday] for statday in ALCOIN_STATDAYS], market_volume_col=MARKET_VOLUME_COL,
+            altcoin_volume_col=ALCOIN_VOLUME_COL, top_n=top_n, blacklist=blacklist)
+        same = same_frames(expected, actual)
+        reused = expected_misses is None or misses == expected_misses
+        print(f'{label}: 未命中 {misses} 个步骤{"" if reused else f"（应为 {expected_misses} 个）"}，'
+              f'耗时 {seconds:.2f}s，结果{"一致" if same else "不一致"}')
+        results.append(same and reused)
+    return all(results)
+
+
+def check_lru(cache_dir=os.path.join(VERIFY_DIR, 'lru')):
+    """
+    写入超过上限时淘汰最久未使用的条目
+    """
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    value = np.zeros(1000)
+    cache = memo_cache.MemoCache(cache_dir, max_bytes=1 << 62)
+    keys = [cache.key('lru', [i]) for i in range(4)]
+    for key in keys:
+        cache.put(key, value)
+        time.sleep(0.01)
+    entry_bytes = cache.total_bytes() // len(keys)
+
+    # 读取第一个条目后，它成为最近使用的，上限只容纳3个条目时应淘汰第二个
+    cache.get(keys[0])
+    cache.max_bytes = entry_bytes * 3
+    cache.evict()
+    kept = [cache.get(key)[0] for key in keys]
+    ok = kept == [True, False, True, True] and cache.total_bytes() <= cache.max_bytes
+    print(f'LRU 淘汰: {"正确" if ok else "错误"}，保留 {kept}')
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    return ok
+
+
+if __name__ == '__main__':
+    check_lru()
+    for market_type in ['swap', 'spot']:
+        print(f'\n{"="*80}')
+        print(f'检查 {market_type.upper()} 市场中间结果缓存')
+        print(f'{"="*80}\n')
+        all_df = pd.read_csv(f'/Users/houjl/Downloads/FLdata/{market_type}/all_df_from_Y_idx_newV2.csv', encoding='gbk',
+                             parse_dates=['candle_begin_time'])
+        cache_dir = os.path.join(VERIFY_DIR, market_type)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        cache = memo_cache.MemoCache(cache_dir)
+        check_features(all_df, cache)
+        check_reuse(all_df, cache)
+        print(f'缓存大小 {cache.total_bytes() / 2**20:.1f}MB')
+        shutil.rmtree(cache_dir, ignore_errors=True)
@@ -0,0 +1,106 @@
+"""
+验证成交额前N成员索引（yquant/common/universe_index.py）
+
+    1. 成员和名次与 groupby('candle_begin_time') + rank(ascending=False, method='first') 的结果相同
+    2. 使用成员索引计算的指数与 index_frames 自己筛选的结果逐字节相同
+    3. 保存后读回的成员索引不变；按日期拆成两段分别筛选再拼接（增量更新），与一次筛选的结果相同
+最后打印最近一天的山寨指数成员，作为查询示例。
+"""
+import os
+import time
+import numpy as np
+import pandas as pd
+import warnings
+warnings.filterwarnings("ignore")
+
+import yquant.common.index_engine as index_engine
+import yquant.common.universe_index as universe_index
+from Y_idx_newV2_spot import build_index_features, ALCOIN_BLACKLIST, ALCOIN_VOLUME_COL, MARKET_VOLUME_COL
+
+pd.set_option('display.unicode.ambiguous_as_wide', True)
+pd.set_option('display.unicode.east_asian_width', True)
+pd.set_option('display.width', 200)
+
+
+def same_universe(a, b):
+    return (np.array_equal(a.dates, b.dates) and a.symbols == b.symbols and np.array_equal(a.members, b.members)
+            and a.same_definition(b.volume_col, b.top_n, b.blacklist))
+
+
+def check_members(features, universe):
+    """
+    与逐时间点 rank 的成员和名次比较
+    """
+    df = features[~features['symbol'].isin(universe.blacklist)]
+    rank = df.groupby('candle_begin_time')[universe.volume_col].rank(ascending=False, method='first')
+    expected = pd.DataFrame({'candle_begin_time': df['candle_begin_time'], '名次': rank,
+                             'symbol': df['symbol'].astype(str)})
+    expected = expected[expected['名次'] <= universe.top_n].astype({'名次': 'int64'})
+    expected = expected.sort_values(['candle_begin_time', '名次']).reset_index(drop=True)
+    actual = universe.to_frame().astype({'名次': 'int64'})
+    same = expected.to_csv(index=False) == actual.to_csv(index=False)
+    print(f'{universe.volume_col} 前{universe.top_n}成员和名次: {"一致" if same else "不一致"}')
+    return same
+
+
+def check_index_frames(features, market_universe, altcoin_universe, market_statdays=(7, 30, 90),
+                       altcoin_statdays=(30, 90, 365)):
+    """
+    使用成员索引与 index_frames 自己筛选的指数比较
+    """
+    kwargs = dict(market_groups=[[statday] for statday in market_statdays],
+                  altcoin_groups=[[statday] for statday in altcoin_statdays], market_volume_col=MARKET_VOLUME_COL,
+                  altcoin_volume_col=ALCOIN_VOLUME_COL, top_n=50, blacklist=ALCOIN_BLACKLIST)
+    start = time.time()
+    expected = index_engine.index_frames(features, **kwargs)
+    select_seconds = time.time() - start
+    start = time.time()
+    actual = index_engine.index_frames(features, market_universe=market_universe, altcoin_universe=altcoin_universe,
+                                       **kwargs)
+    universe_seconds = time.time() - start
+    same = all(a.to_csv(index=False) == b.to_csv(index=False)
+               for frames_a, frames_b in zip(expected, actual) for a, b in zip(frames_a, frames_b))
+    print(f'使用成员索引计算指数: {"一致" if same else "不一致"}，'
+          f'重新筛选 {select_seconds:.2f}s，使用成员索引 {universe_seconds:.2f}s')
+    return same
+
+
+def check_roundtrip(features, universe, path='/tmp/verify_universe_index.npz'):
+    """
+    保存/读取，以及按日期拆成两段后拼接
+    """
+    universe_index.save_universe(path, universe)
+    loaded = universe_index.load_universe(path)
+    os.remove(path)
+    same = same_universe(universe, loaded)
+    print(f'保存后读回: {"一致" if same else "不一致"}')
+
+    dates = np.unique(features['candle_begin_time'])
+    split = dates[len(dates) // 2]
+    head = universe_index.build_universe(features[features['candle_begin_time'] < split], universe.volume_col,
+                                         universe.top_n, universe.blacklist)
+    # 后一段带上之前的一部分日期，与增量更新时的窗口一样
+    tail = universe_index.build_universe(features[features['candle_begin_time'] >= dates[len(dates) // 3]],
+                                         universe.volume_col, universe.top_n, universe.blacklist)
+    spliced = same_universe(universe, head.splice(tail, split))
+    print(f'两段拼接: {"一致" if spliced else "不一致"}')
+    return same and spliced
+
+
+if __name__ == '__main__':
+    for market_type in ['swap', 'spot']:
+        print(f'\n{"="*80}')
+        print(f'检查 {market_type.upper()} 市场成员索引')
+        print(f'{"="*80}\n')
+        all_df = pd.read_csv(f'/Users/houjl/Downloads/FLdata/{market_type}/all_df_from_Y_idx_newV2.csv', encoding='gbk',
+                             parse_dates=['candle_begin_time'])
+        features = build_index_features(all_df, statdays=[7, 30, 90, 365])
+        market_universe = universe_index.build_universe(features, MARKET_VOLUME_COL, top_n=50)
+        altcoin_universe = universe_index.build_universe(features, ALCOIN_VOLUME_COL, top_n=50,
+                                                         blacklist=ALCOIN_BLACKLIST)
+        check_members(features, market_universe)
+        check_members(features, altcoin_universe)
+        check_index_frames(features, market_universe, altcoin_universe)
+        check_roundtrip(features, altcoin_universe)
+        last_date = altcoin_universe.dates[-1]
+        print(f'\n{pd.Timestamp(last_date).strftime("%Y-%m-%d")} 山寨指数成员: {altcoin_universe.members_on(last_date)}')
@@ -7,17 +7,14 @@ from datetime import datetime, timedelta
 import traceback
 from joblib import Parallel, delayed
 
+from yquant.common import rate_limit
+from yquant.common import retry_policy
+
 def robust_(func, params=None, func_name=''):
     """
-    健壮的API调用函数
+    健壮的API调用函数（重试策略见 retry_policy）
     """
-    for i in range(5):
-        try:
-            return func() if params is None else func(params)
-        except Exception as e:
-            print(f'{func_name} 第{i+1}次调用失败: {str(e)}')
-            time.sleep(2)
-    raise Exception(f'{func_name} 调用失败')
+    return retry_policy.call(func, params=params, func_name=func_name)
 
 def u_furture_get_exchangeinfo(exchange):
     """
@@ -44,14 +41,17 @@ def u_furture_get_exchangeinfo(exchange):
 def process_single_symbol(args):
     """
     处理单个交易对的K线数据获取
-    用于多进程调用
+    用于多进程调用，本进程的限频器只使用总权重额度的 share
     """
     import ccxt
     from yquant.config.config import cfg  # 导入配置
-    
+
+    symbol, run_time, limit, interval, share = args
+    rate_limit.configure(share=share)
+
     # 创建新的exchange实例并设置完整配置
     exchange = ccxt.binance({
-        'enableRateLimit': True,
+        'enableRateLimit': cfg.binance.enableRateLimit,
         'timeout': cfg.binance.timeout,
         'rateLimit': cfg.binance.rateLimit,
         'verbose': cfg.binance.verbose,
@@ -60,7 +60,6 @@ def process_single_symbol(args):
 
     })
 
-    symbol, run_time, limit, interval = args  # 解包时添加interval
     return fetch_binance_swap_candle_data(exchange, symbol, run_time, limit, interval)
 
 def u_furture_fetch_all_swap_candle_data(exchange, symbol_list, interval, run_time, limit, include_now=True, is_swap=True, njobs=8):
@@ -91,14 +90,15 @@ def u_furture_fetch_all_swap_candle_data(exchange, symbol_list, interval, run_ti
 
     else:
         # 使用joblib进行多进程处理
-        arg_list = [(symbol, run_time, limit, interval) for symbol in symbol_list]
+        arg_list = [(symbol, run_time, limit, interval, 1 / njobs) for symbol in symbol_list]
         result = Parallel(n_jobs=njobs, verbose=10)(
             delayed(process_single_symbol)(args) for args in arg_list
         )
         # 过滤掉失败的结果
         result = [r for r in result if r[1] is not None]
 
-    
+    # 本进程各接口的调用、重试、失败次数（进程池下载时统计在各子进程中）
+    retry_policy.print_retry_stats()
     return dict(result)
 
 def fetch_binance_swap_candle_data(exchange, symbol, run_time, limit, interval='1h'):
@@ -1,28 +1,50 @@
 '''
 币安工具函数
+
+K线批量下载支持两种方式（见 u_furture_fetch_all_candle_data）：
+    进程池：每个进程创建自己的 ccxt.binance，逐个交易对分页请求
+    asyncio：单进程内用 ccxt 的异步客户端，所有交易对的分页请求同时进行，
+             共用一个 aiohttp 连接池（少量 keep-alive 连接），省去进程启动和序列化的开销
 '''
 import time
+import asyncio
 import pandas as pd
 from datetime import datetime, timedelta
 import traceback
 from joblib import Parallel, delayed
 
+from yquant.common import rate_limit
+from yquant.common import retry_policy
+from yquant.common import candle_store
+
+
+# asyncio 模式下同时进行请求的交易对数量
+ASYNC_CONCURRENCY = 200
+# asyncio 模式下连接池的连接数（每个连接 keep-alive 复用）
+ASYNC_CONNECTIONS = 8
+# asyncio 模式下 ccxt 自带限频的间隔（毫秒 / 单位 cost）：ccxt 按币安的权重计算每个请求的 cost
+# （合约 cost = 权重，现货 cost = 0.2 * 权重），该间隔对应交易所每分钟的全部额度，
+# 作为权重限频器（rate_limit）之外的兜底，即使请求没有经过 rate_limit 也不会超过交易所的上限
+ASYNC_RATE_LIMIT = {'swap': 25, 'spot': 50}
+
+# 每页K线数量上限（合约 continuousKlines 1500，现货 klines 1000）
+KLINE_PAGE_LIMIT = {'swap': 1500, 'spot': 1000}
+
 
 def robust_(func, params=None, func_name=''):
     """
     健壮的API调用函数，支持无参数和有参数调用
+
+    按接口权重限频（见 rate_limit），失败时按重试策略退避、熔断或直接失败（见 retry_policy）
+    """
+    return retry_policy.call(func, params=params, func_name=func_name)
+
+
+async def robust_async(func, params=None, func_name=''):
     """
-    for i in range(5):  # 最多重试5次
-        try:
-            if params is None:
-                result = func()
-            else:
-                result = func(params)
-            return result
-        except Exception as e:
-            print(f'{func_name} 第{i+1}次调用失败: {str(e)}')
-            time.sleep(2)  # 失败后等待2秒
-    raise Exception(f'{func_name} 调用失败')
+    robust_ 的异步版本，func 为 ccxt 异步客户端的方法
+    """
+    return await retry_policy.call_async(func, params=params, func_name=func_name)
 
 
 
@@ -55,7 +77,7 @@ def get_exchangeinfo(exchange, market_type='swap'):
 
 
 
-def get_symbol_list(exchange, quote_asset='USDT', market_type='swap'):
+def get_symbol_list(exchange, quote_asset='USDT', market_type='swap', exchange_info=None):
     """
     获取指定市场类型的交易对列表
 
@@ -63,11 +85,13 @@ def get_symbol_list(exchange, quote_asset='USDT', market_type='swap'):
         exchange: ccxt交易所实例
         quote_asset: 计价货币，默认 USDT
         market_type: 市场类型 ('spot' 现货 / 'swap' 合约)
+        exchange_info: 已获取的交易规则（get_exchangeinfo 的结果），None 时重新请求
 
     Returns:
         List[str]: 符合条件的 symbol 列表
     """
-    exchange_info = get_exchangeinfo(exchange, market_type)
+    if exchange_info is None:
+        exchange_info = get_exchangeinfo(exchange, market_type)
 
     if exchange_info is None:
         print(f"无法获取{market_type}市场的交易规则")
@@ -94,17 +118,42 @@ def get_symbol_list(exchange, quote_asset='USDT', market_type='swap'):
     return [s['symbol'] for s in symbols]
 
 
+def get_onboard_dates(exchange, market_type='swap', exchange_info=None):
+    """
+    合约交易对的上线时间，用于规划K线分页（见 kline_pages）
+
+    现货的交易规则中没有上线时间，返回空字典，下载时改为查询第一根K线
+
+    Args:
+        exchange_info: 已获取的交易规则（与 get_symbol_list 共用），None 时重新请求
+
+    Returns:
+        dict: {symbol: 上线时间（毫秒）}
+    """
+    if market_type != 'swap':
+        return {}
+    if exchange_info is None:
+        exchange_info = get_exchangeinfo(exchange, market_type)
+    if exchange_info is None:
+        return {}
+    return {s['symbol']: int(s['onboardDate']) for s in exchange_info['symbols'] if s.get('onboardDate')}
+
+
 def process_single_symbol(args):
     """
     处理单个交易对的K线数据获取
-    用于多进程调用
+    用于多进程调用，exchange 在子进程中创建，不从主进程传入，
+    本进程的限频器只使用总权重额度的 share
     """
     import ccxt
     from yquant.config.config import cfg  # 导入配置
 
+    symbol, run_time, limit, interval, market_type, share, store, listed = args
+    rate_limit.configure(share=share)
+
     # 创建新的exchange实例并设置完整配置
     exchange = ccxt.binance({
-        'enableRateLimit': True,
+        'enableRateLimit': cfg.binance.enableRateLimit,
         'timeout': cfg.binance.timeout,
         'rateLimit': cfg.binance.rateLimit,
         'verbose': cfg.binance.verbose,
@@ -113,12 +162,14 @@ def process_single_symbol(args):
 
     })
 
-    exchange, symbol, run_time, limit, interval, market_type = args  # 解包时添加interval
-    return fetch_binance_market_candle_data(*args)
+    return fetch_binance_market_candle_data(exchange, symbol, run_time, limit, interval, market_type, store=store,
+                                            listed=listed)
 
 
 
-def u_furture_fetch_all_candle_data(exchange, symbol_list, interval, run_time, limit, market_type='', njobs=8):
+def u_furture_fetch_all_candle_data(exchange, symbol_list, interval, run_time, limit, market_type='', njobs=8,
+                                    use_async=False, concurrency=ASYNC_CONCURRENCY, connections=ASYNC_CONNECTIONS,
+                                    store=None, listing=None):
     """
     批量获取K线数据（支持U本位合约、现货）
 
@@ -131,36 +182,276 @@ def u_furture_fetch_all_candle_data(exchange, symbol_list, interval, run_time, l
         include_now: 是否包含当前K线
         market_type: 市场类型 ('spot' 或 'swap')
         njobs: 进程数
+        use_async: 是否在当前进程中用 asyncio 下载（见 async_fetch_all_candle_data），此时忽略 njobs
+        concurrency / connections: asyncio 模式下同时请求的交易对数量 / 连接池的连接数
+        store: 本地K线存储（candle_store.CandleStore），只下载存储中最后一根已收盘K线之后的数据
+        listing: {symbol: 上线时间（毫秒）}，见 get_onboard_dates，没有的交易对查询第一根K线
 
     Returns:
         dict: {symbol: DataFrame}
     """
     result = []
+    listing = listing or {}
 
-    if njobs == 1:
+    if use_async:
+        result = asyncio.run(async_fetch_all_candle_data(symbol_list, interval, run_time, limit, market_type,
+                                                         concurrency=concurrency, connections=connections,
+                                                         store=store, listing=listing))
+        result = [r for r in result if r[1] is not None]
+    elif njobs == 1:
         # 单进程获取数据
         for symbol in symbol_list:
-            res = fetch_binance_market_candle_data(exchange, symbol, run_time, limit, interval, market_type)
+            res = fetch_binance_market_candle_data(exchange, symbol, run_time, limit, interval, market_type,
+                                                   store=store, listed=listing.get(symbol))
             if res[1] is not None:  # 只添加成功获取的数据
                 result.append(res)
     else:
         # 使用joblib进行多进程处理
-        arg_list = [(exchange, symbol, run_time, limit, interval, market_type) for symbol in symbol_list]
+        arg_list = [(symbol, run_time, limit, interval, market_type, 1 / njobs, store, listing.get(symbol)) for symbol in symbol_list]
         result = Parallel(n_jobs=njobs, verbose=10)(
             delayed(process_single_symbol)(args) for args in arg_list
         )
         # 过滤掉失败的结果
         result = [r for r in result if r[1] is not None]
 
+    # 本进程各接口的调用、重试、失败次数（进程池下载时统计在各子进程中）
+    retry_policy.print_retry_stats()
     return dict(result)
 
 
-# def process_single_symbol(args):
-#     symbol, run_time, limit, interval, market_type = args
-#     return fetch_binance_market_candle_data(*args)
+async def async_fetch_all_candle_data(symbol_list, interval, run_time, limit, market_type='swap',
+                                      concurrency=ASYNC_CONCURRENCY, connections=ASYNC_CONNECTIONS, store=None,
+                                      listing=None):
+    """
+    在一个事件循环中下载所有交易对的K线
 
+    使用 ccxt 的异步客户端，所有请求共用一个连接数为 connections 的 aiohttp 连接池（keep-alive），
+    最多 concurrency 个交易对同时下载，每个交易对的各页（见 kline_pages）也同时请求。
+    请求速度由本进程的权重限频器控制（见 rate_limit），ccxt 自带的限频作为兜底（见 ASYNC_RATE_LIMIT）
 
-def fetch_binance_market_candle_data(exchange, symbol, run_time, limit, interval='1h', market_type='swap'):
+    Returns:
+        list: [(symbol, DataFrame 或 None)]，与 symbol_list 顺序相同
+    """
+    import aiohttp
+    import ccxt.async_support as ccxt_async
+    from yquant.config.config import cfg  # 导入配置
+
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=connections, ttl_dns_cache=300),
+                                    trust_env=True)
+    # ccxt 的限频按权重计算且间隔很短，不会使所有请求串行，始终开启（同步客户端的 rateLimit 是固定间隔，不使用）
+    config = {
+        'enableRateLimit': True,
+        'timeout': cfg.binance.timeout,
+        'rateLimit': ASYNC_RATE_LIMIT[market_type],
+        'verbose': cfg.binance.verbose,
+        'hostname': cfg.binance.hostname,
+        'session': session,
+    }
+    proxy = cfg.binance.proxies.get('https') or cfg.binance.proxies.get('http')
+    if proxy:
+        config['aiohttp_proxy'] = proxy
+    exchange = ccxt_async.binance(config)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(symbol):
+        async with semaphore:
+            return await async_fetch_binance_market_candle_data(exchange, symbol, run_time, limit, interval,
+                                                                market_type, store=store,
+                                                                listed=(listing or {}).get(symbol))
+
+    start = time.time()
+    try:
+        result = await asyncio.gather(*[fetch_one(symbol) for symbol in symbol_list])
+    finally:
+        await exchange.close()
+        await session.close()
+    print(f'asyncio 下载 {len(symbol_list)} 个交易对的K线完成，耗时 {time.time() - start:.1f}s')
+    return result
+
+
+def kline_request(exchange, interval, market_type):
+    """
+    K线请求的方法名、交易对参数名和固定参数
+
+    Returns:
+        tuple: (method_name, params_key, extra_params)
+    """
+    if market_type == 'swap':
+        klines_methods = [
+            'fapiPublic_get_continuousklines',
+            'fapiPublicGetContinuousKlines',
+            'fapiPublic_getContinuousKlines'
+        ]
+        params_key = 'pair'
+        extra_params = {'contractType': 'PERPETUAL'}
+    elif market_type == 'spot':
+        klines_methods = ['public_get_klines']
+        params_key = 'symbol'
+        extra_params = {}
+    else:
+        raise ValueError("market_type 必须是 'spot' 或 'swap'")
+
+    for method_name in klines_methods:
+        if hasattr(exchange, method_name):
+            return method_name, params_key, extra_params
+    raise ValueError("找不到合适的K线数据获取方法")
+
+
+def kline_start_time(limit, interval):
+    """
+    从当前时间往前 limit 根K线的起始时间戳（毫秒）
+    """
+    current_time = datetime.now()
+    if interval == '1h':
+        return int((current_time - timedelta(hours=limit)).timestamp() * 1000)
+    elif interval == '1d':
+        return int((current_time - timedelta(days=limit)).timestamp() * 1000)
+    raise ValueError(f"不支持的时间间隔: {interval}")
+
+
+def kline_pages(cur_start_time, remain_limit, interval, market_type):
+    """
+    从 cur_start_time 到当前的分页，每页取该接口允许的最大数量
+
+    各页的起点由K线周期直接算出，不依赖上一页的结果，可以同时请求；
+    K线有缺失时相邻两页的结果会重叠，合并时按开盘时间去重（见 candle_store.merge_candles）
+
+    Returns:
+        list: [(startTime, limit)]
+    """
+    step = candle_store.interval_ms(interval)
+    page_limit = KLINE_PAGE_LIMIT[market_type]
+    first_open = -(-cur_start_time // step) * step
+    # 到当前为止（含未收盘的K线）的根数，多算一根以免本地时钟偏慢时遗漏
+    total = min(remain_limit, (int(time.time() * 1000) - first_open) // step + 2)
+    return [(first_open + i * step, min(page_limit, total - i)) for i in range(0, max(total, 0), page_limit)]
+
+
+def kline_params(params_key, symbol, interval, start, limit, extra_params):
+    return {
+        params_key: symbol,
+        'interval': interval,
+        'limit': limit,
+        'startTime': start,
+        **extra_params,
+    }
+
+
+def kline_frame(kline, symbol):
+    """
+    K线接口返回的数组转为 DataFrame
+    """
+    columns = [
+        'timestamp',
+        'open',
+        'high',
+        'low',
+        'close',
+        'volume',
+        'close_time',
+        'quote_volume',
+        'trades',
+        'taker_buy_volume',
+        'taker_buy_quote_volume',
+        'ignore'
+    ]
+    df = pd.DataFrame(kline, columns=columns, dtype='float')
+
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df['close_time'] = pd.to_datetime(df['close_time'], unit='ms')
+
+    df = df.rename(columns={'timestamp': 'candle_begin_time'})
+    df['symbol'] = symbol
+    df = df[[
+        'candle_begin_time',
+        'open',
+        'high',
+        'low',
+        'close',
+        'volume',
+        'quote_volume',
+        'symbol'
+    ]]
+    return df
+
+
+def kline_plan(store, symbol, limit, interval, market_type):
+    """
+    本次下载的起点和K线数量
+
+    没有存储或存储中没有该交易对（新上线）时，从当前时间往前 limit 根开始下载 limit 根；
+    否则从最后一根已收盘K线之后开始，只下载到当前为止的几根
+
+    Returns:
+        tuple: (entry, window_start, cur_start_time, remain_limit)，entry 为存储中的K线（见 candle_store），没有时为 None
+    """
+    window_start = kline_start_time(limit, interval)
+    entry = store.load(market_type, symbol, interval, window_start) if store is not None else None
+    if entry is None:
+        return None, window_start, window_start, limit
+    cur_start_time = max(window_start, entry['last_closed'] + 1)
+    # 起点到当前（含未收盘的K线）的根数，多请求一根以免边界处遗漏
+    step = candle_store.interval_ms(interval)
+    remain_limit = min(limit, (int(time.time() * 1000) - cur_start_time) // step + 2)
+    return entry, window_start, cur_start_time, remain_limit
+
+
+def kline_result(store, entry, kline, symbol, window_start, limit, interval, market_type):
+    """
+    下载结果与存储中的K线合并，保存已收盘的部分
+
+    Returns:
+        DataFrame: 与全量下载 limit 根相同的K线，没有数据时为 None
+    """
+    fetched = kline_frame(kline, symbol) if kline else None
+    all_df, window = candle_store.merge_candles(entry['df'] if entry else None, fetched, window_start, limit)
+    if store is not None and fetched is not None:
+        store.save(market_type, symbol, interval, all_df, entry['since'] if entry else window_start)
+    return window
+
+
+async def async_fetch_binance_market_candle_data(exchange, symbol, run_time, limit, interval='1h', market_type='swap',
+                                                 store=None, listed=None):
+    """
+    fetch_binance_market_candle_data 的异步版本，exchange 为 ccxt 异步客户端，各页同时请求
+
+    Returns:
+        tuple: (symbol, DataFrame)，获取失败时 DataFrame 为 None
+    """
+    try:
+        entry, window_start, cur_start_time, remain_limit = kline_plan(store, symbol, limit, interval, market_type)
+        method_found, params_key, extra_params = kline_request(exchange, interval, market_type)
+
+        async def fetch_page(start, page_limit):
+            params = kline_params(params_key, symbol, interval, start, page_limit, extra_params)
+            return await robust_async(getattr(exchange, method_found), params=params, func_name=method_found)
+
+        pages = kline_pages(cur_start_time, remain_limit, interval, market_type)
+        if len(pages) > 1:
+            # 多页时先确定上线时间，跳过上线前的空页
+            if listed is None:
+                first = await fetch_page(0, 1)
+                listed = int(first[0][0]) if first else None
+            pages = [] if listed is None else kline_pages(max(cur_start_time, listed), remain_limit, interval,
+                                                          market_type)
+
+        kline = []
+        for cur_kline in await asyncio.gather(*[fetch_page(start, page_limit) for start, page_limit in pages]):
+            kline.extend(cur_kline or [])
+
+        df = kline_result(store, entry, kline, symbol, window_start, limit, interval, market_type)
+        if df is None or len(df) == 0:
+            print(f"获取{symbol}的K线数据为空")
+            return symbol, None
+        return symbol, df
+
+    except Exception as e:
+        print(f"获取{symbol}的K线数据失败: {str(e)}")
+        return symbol, None
+
+
+def fetch_binance_market_candle_data(exchange, symbol, run_time, limit, interval='1h', market_type='swap', store=None,
+                                     listed=None):
     """
     获取币安市场K线数据（支持U本位合约、现货）
 
@@ -170,6 +461,8 @@ def fetch_binance_market_candle_data(exchange, symbol, run_time, limit, interval
         run_time: 截止时间
         limit: K线数量限制
         market_type: 市场类型 ('spot' 或 'swap')
+        store: 本地K线存储，存储中有该交易对时只请求最后一根已收盘K线之后的数据（见 kline_plan）
+        listed: 上线时间（毫秒），需要多页时从上线时间开始分页，为 None 时查询第一根K线
 
     Returns:
         tuple: (symbol, DataFrame)
@@ -177,102 +470,33 @@ def fetch_binance_market_candle_data(exchange, symbol, run_time, limit, interval
             - DataFrame: K线数据，如果获取失败则为None
     """
     try:
-        kline = []
-        remain_limit = limit
-
-        current_time = datetime.now()
-        if interval == '1h':
-            start_time = int((current_time - timedelta(hours=limit)).timestamp() * 1000)
-        elif interval == '1d':
-            start_time = int((current_time - timedelta(days=limit)).timestamp() * 1000)
-        else:
-            raise ValueError(f"不支持的时间间隔: {interval}")
-
-        cur_start_time = start_time
+        entry, window_start, cur_start_time, remain_limit = kline_plan(store, symbol, limit, interval, market_type)
 
         # 根据market_type选择API方法
-        if market_type == 'swap':
-            klines_methods = [
-                'fapiPublic_get_continuousklines',
-                'fapiPublicGetContinuousKlines',
-                'fapiPublic_getContinuousKlines'
-            ]
-            params_key = 'pair'
-            contract_type = 'PERPETUAL'
-        elif market_type == 'spot':
-            klines_methods = ['public_get_klines']
-            params_key = 'symbol'
-            contract_type = None
-        else:
-            raise ValueError("market_type 必须是 'spot' 或 'swap'")
-
-        method_found = None
-        for method_name in klines_methods:
-            if hasattr(exchange, method_name):
-                method_found = method_name
-                break
+        method_found, params_key, extra_params = kline_request(exchange, interval, market_type)
 
-        if method_found is None:
-            raise ValueError("找不到合适的K线数据获取方法")
+        def fetch_page(start, page_limit):
+            params = kline_params(params_key, symbol, interval, start, page_limit, extra_params)
+            return robust_(getattr(exchange, method_found), params=params, func_name=method_found)
 
-        while remain_limit > 0:
-            cur_limit = min(remain_limit, 499)
+        # 分页的起点事先算好（见 kline_pages），多页时先确定上线时间，跳过上线前的空页
+        pages = kline_pages(cur_start_time, remain_limit, interval, market_type)
+        if len(pages) > 1:
+            if listed is None:
+                first = fetch_page(0, 1)
+                listed = int(first[0][0]) if first else None
+            pages = [] if listed is None else kline_pages(max(cur_start_time, listed), remain_limit, interval,
+                                                          market_type)
 
-            params = {
-                params_key: symbol,
-                'interval': interval,
-                'limit': cur_limit,
-                'startTime': cur_start_time,
-            }
-
-            if market_type == 'swap':
-                params['contractType'] = contract_type
-
-            cur_kline = robust_(getattr(exchange, method_found), params=params, func_name=method_found)
-
-            if cur_kline:
-                kline.extend(cur_kline)
-                remain_limit -= cur_limit
-                cur_start_time = int(cur_kline[-1][0]) + 1
-            else:
-                break
+        kline = []
+        for start, page_limit in pages:
+            kline.extend(fetch_page(start, page_limit) or [])
 
-        if not kline:
+        df = kline_result(store, entry, kline, symbol, window_start, limit, interval, market_type)
+        if df is None or len(df) == 0:
             print(f"获取{symbol}的K线数据为空")
             return symbol, None
 
-        columns = [
-            'timestamp',
-            'open',
-            'high',
-            'low',
-            'close',
-            'volume',
-            'close_time',
-            'quote_volume',
-            'trades',
-            'taker_buy_volume',
-            'taker_buy_quote_volume',
-            'ignore'
-        ]
-        df = pd.DataFrame(kline, columns=columns, dtype='float')
-
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        df['close_time'] = pd.to_datetime(df['close_time'], unit='ms')
-
-        df = df.rename(columns={'timestamp': 'candle_begin_time'})
-        df['symbol'] = symbol
-        df = df[[
-            'candle_begin_time',
-            'open',
-            'high',
-            'low',
-            'close',
-            'volume',
-            'quote_volume',
-            'symbol'
-        ]]
-
         return symbol, df
 
     except Exception as e:
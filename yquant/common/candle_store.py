@@ -0,0 +1,120 @@
+'''
+交易所K线的本地存储
+
+按 (market_type, symbol, interval) 保存已收盘的K线，并记录最后一根已收盘K线的开盘时间。
+下载时（见 binance_utils_spot.fetch_binance_market_candle_data）只请求这根K线之后的数据，
+每日运行通常一页即可；存储中没有的交易对（新上线）或存储的历史不够长时才按 limit 下载全部。
+
+每个交易对一个文件 {store_dir}/{market_type}/{interval}/{symbol}.pkl，内容为
+    {'since': 全量下载时的起始时间, 'last_closed': 最后一根已收盘K线的开盘时间, 'df': 已收盘的K线}
+各交易对的文件互不相关，进程池 / asyncio 下载时可以同时写入。
+未收盘的K线（例如当天的日线）每次都重新下载，不写入存储。
+'''
+import os
+import time
+import pandas as pd
+
+
+# 存储格式变化时加一，旧文件视为不存在
+STORE_VERSION = 1
+
+INTERVAL_MS = {'1h': 3600 * 1000, '1d': 24 * 3600 * 1000}
+
+
+def get_store_dir():
+    """
+    存储目录
+    """
+    return os.path.join('/Users/houjl/Downloads/FLdata', 'candle_store')
+
+
+def interval_ms(interval):
+    if interval not in INTERVAL_MS:
+        raise ValueError(f"不支持的时间间隔: {interval}")
+    return INTERVAL_MS[interval]
+
+
+def to_ms(ts):
+    """
+    K线开盘时间（UTC，不带时区）转为毫秒时间戳
+    """
+    return int(pd.Timestamp(ts).value // 10**6)
+
+
+class CandleStore:
+    """
+    已收盘K线的本地存储
+
+    Attributes:
+        store_dir: 存储目录
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir or get_store_dir()
+
+    def path(self, market_type, symbol, interval):
+        return os.path.join(self.store_dir, market_type, interval, f'{symbol}.pkl')
+
+    def load(self, market_type, symbol, interval, window_start):
+        """
+        读取交易对的已收盘K线
+
+        Args:
+            window_start: 本次需要的起始时间（毫秒），存储的全量下载晚于该时间时视为不可用
+
+        Returns:
+            dict: {'since', 'last_closed', 'df'}，不存在或不可用时为 None
+        """
+        path = self.path(market_type, symbol, interval)
+        if not os.path.exists(path):
+            return None
+        try:
+            entry = pd.read_pickle(path)
+        except Exception as e:
+            print(f'读取{symbol}的本地K线失败，重新下载: {e}')
+            return None
+        if entry.get('version') != STORE_VERSION or entry['since'] > window_start or len(entry['df']) == 0:
+            return None
+        return entry
+
+    def save(self, market_type, symbol, interval, df, since, now_ms=None):
+        """
+        保存已收盘的K线（先写临时文件再原子替换）
+
+        Args:
+            df: 该交易对的全部K线，未收盘的部分不保存
+            since: 全量下载的起始时间（毫秒）
+        """
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        opens = df['candle_begin_time'].map(to_ms) if len(df) > 0 else pd.Series(dtype='int64')
+        closed = df[(opens + interval_ms(interval) <= now_ms).to_numpy()]
+        if len(closed) == 0:
+            return
+        entry = {
+            'version': STORE_VERSION,
+            'since': since,
+            'last_closed': to_ms(closed['candle_begin_time'].iloc[-1]),
+            'df': closed.reset_index(drop=True),
+        }
+        path = self.path(market_type, symbol, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_file = f'{path}.{os.getpid()}.tmp'
+        pd.to_pickle(entry, tmp_file)
+        os.replace(tmp_file, path)
+
+
+def merge_candles(stored, fetched, window_start, limit):
+    """
+    合并存储中的K线和新下载的K线，按开盘时间去重（以新下载的为准）
+
+    Returns:
+        tuple: (全部K线, 本次需要的K线)，后者为 window_start 之后的前 limit 根，与全量下载的结果相同
+    """
+    parts = [_df for _df in (stored, fetched) if _df is not None and len(_df) > 0]
+    if not parts:
+        return None, None
+    all_df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    all_df = all_df.drop_duplicates('candle_begin_time', keep='last').sort_values('candle_begin_time')
+    all_df = all_df.reset_index(drop=True)
+    window = all_df[all_df['candle_begin_time'] >= pd.to_datetime(window_start, unit='ms')]
+    return all_df, window.iloc[:limit].reset_index(drop=True)
@@ -0,0 +1,276 @@
+'''
+日线增量聚合存储
+
+为每个市场持久化一张日线长表，并为每个币种记录水位线（已完整聚合的最后一天）。
+每次运行只读取小时CSV中水位线之后的行，重新 resample 后覆盖写入日线表，
+过滤条件（是否交易 == 1）和 resample('D') 口径与全量读取完全一致。
+
+小时CSV只在文件尾部追加，因此除了水位线，还记录水位线之后第一行在文件中的字节偏移，
+下次运行直接从该偏移开始读取。偏移之前的内容（表头、偏移前最后一段字节）发生变化时，
+说明文件被整体重写，对该币种退回全量聚合。
+
+每个币种的状态中还保存上次聚合时文件的指纹（与 ingest_manifest 的条目相同：大小、mtime、尾部哈希），
+是否跳过、是否只在尾部追加都与这份指纹比对，而不是与共用的数据清单比对：
+清单在每种读取方式（全量、流式、缓存、重算）后都会保存，其中的"未变化"不代表自上次更新日线存储以来未变化。
+'''
+import io
+import os
+import json
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from yquant.common.kline_cache import HOURLY_COLUMNS
+from yquant.common.local_ingest import DAILY_COLUMNS, resample_daily, symbol_of
+from yquant.common import ingest_manifest
+
+
+# 偏移校验时比对的字节数
+_ANCHOR_BYTES = 64
+
+
+def get_store_dir(local_data_path):
+    """
+    根据小时CSV目录得到日线存储目录
+
+    例如 .../coin-binance-spot-swap-preprocess-pkl-1h/split/swap/
+    对应 .../coin-binance-spot-swap-preprocess-pkl-1h/daily_store/swap/
+    """
+    local_data_path = os.path.normpath(local_data_path)
+    market_type = os.path.basename(local_data_path)
+    root = os.path.dirname(os.path.dirname(local_data_path))
+    return os.path.join(root, 'daily_store', market_type)
+
+
+def _row_starts(buf):
+    """
+    buf 中每个非空行的起始字节偏移（与 pd.read_csv 跳过空行的行为对应）
+    """
+    data = np.frombuffer(buf, dtype=np.uint8)
+    starts = np.concatenate([[0], np.flatnonzero(data == 10) + 1])
+    starts = starts[starts < len(buf)]
+    return starts[(data[starts] != 10) & (data[starts] != 13)]
+
+
+def _tail_is_valid(f, state, header, size):
+    """
+    检查上次记录的偏移在当前文件中是否仍然有效
+    """
+    if not state or state.get('header') != header.decode('utf-8', errors='replace'):
+        return False
+    offset = state['offset']
+    if offset > size:
+        return False
+    anchor = bytes.fromhex(state['anchor'])
+    f.seek(offset - len(anchor))
+    return f.read(len(anchor)) == anchor
+
+
+def update_symbol(csv_file, state=None):
+    """
+    增量聚合单个币种
+
+    Args:
+        csv_file: 小时CSV文件路径
+        state: 上次运行记录的状态，None 表示全量聚合
+
+    Returns:
+        tuple: (symbol, df_daily, new_state, full, error)
+            - df_daily: 水位线之后的日线（全量时为全部日线），没有有效数据时为 None
+            - full: 是否为全量聚合
+            - error: 失败原因，成功时为 None
+    """
+    symbol = symbol_of(csv_file)
+    try:
+        size = os.path.getsize(csv_file)
+        with open(csv_file, 'rb') as f:
+            header = f.readline()
+            full = not _tail_is_valid(f, state, header, size)
+            start = len(header) if full else state['offset']
+            f.seek(start)
+            buf = f.read()
+
+        # 只处理完整的行，最后一行可能还在写入
+        buf = buf[:buf.rfind(b'\n') + 1]
+        columns = header.decode('utf-8-sig').strip().split(',')
+        if buf:
+            df = pd.read_csv(io.BytesIO(buf), header=None, names=columns, usecols=HOURLY_COLUMNS,
+                             parse_dates=['candle_begin_time'])
+        else:
+            df = pd.DataFrame(columns=HOURLY_COLUMNS)
+
+        watermark = None if full else state['watermark']
+        offset = start
+        times = df['candle_begin_time']
+        if not full and len(df) > 0 and watermark is not None and (
+                not times.is_monotonic_increasing or times.iloc[0] < pd.Timestamp(watermark) + pd.Timedelta(days=1)):
+            # 追加的数据早于水位线或乱序，退回全量聚合
+            return update_symbol(csv_file, None)
+
+        starts = _row_starts(buf)
+        if len(df) > 0 and len(starts) == len(df) and times.is_monotonic_increasing:
+            # 最后一根小时K线所在日之前的日期都已完整
+            last_complete = (times.iloc[-1] + pd.Timedelta(hours=1)).floor('D') - pd.Timedelta(days=1)
+            if watermark is None or last_complete > pd.Timestamp(watermark):
+                watermark = last_complete.strftime('%Y-%m-%d')
+            # 下次从水位线之后的第一行开始读
+            if watermark is not None:
+                first_row = times.searchsorted(pd.Timestamp(watermark) + pd.Timedelta(days=1))
+                offset = start + (int(starts[first_row]) if first_row < len(starts) else len(buf))
+
+        with open(csv_file, 'rb') as f:
+            anchor_len = min(_ANCHOR_BYTES, offset)
+            f.seek(offset - anchor_len)
+            anchor = f.read(anchor_len)
+
+        new_state = {
+            'header': header.decode('utf-8', errors='replace'),
+            'offset': offset,
+            'anchor': anchor.hex(),
+            'watermark': watermark,
+        }
+        df_daily = resample_daily(df, symbol) if len(df) > 0 else None
+        return symbol, df_daily, new_state, full, None
+    except Exception as e:
+        return symbol, None, None, True, str(e)
+
+
+def _load_store(store_dir):
+    daily_file = os.path.join(store_dir, 'daily.pkl')
+    state_file = os.path.join(store_dir, 'state.json')
+    if not (os.path.exists(daily_file) and os.path.exists(state_file)):
+        return pd.DataFrame(columns=DAILY_COLUMNS), {}
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            states = json.load(f)
+        return pd.read_pickle(daily_file), states
+    except Exception as e:
+        print(f'读取日线存储失败，全量重建: {e}')
+        return pd.DataFrame(columns=DAILY_COLUMNS), {}
+
+
+def _save_store(store_dir, all_df, states):
+    os.makedirs(store_dir, exist_ok=True)
+    daily_file = os.path.join(store_dir, 'daily.pkl')
+    state_file = os.path.join(store_dir, 'state.json')
+    all_df.to_pickle(daily_file + '.tmp')
+    with open(state_file + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(states, f, ensure_ascii=False)
+    os.replace(daily_file + '.tmp', daily_file)
+    os.replace(state_file + '.tmp', state_file)
+
+
+def invalidate_symbols(store_dir, symbols):
+    """
+    删除币种的聚合状态，下次更新时这些币种全量聚合（上游修正历史数据后由重算调用）
+
+    Args:
+        store_dir: 日线存储目录
+        symbols: 币种列表
+    """
+    store, states = _load_store(store_dir)
+    dropped = [symbol for symbol in symbols if states.pop(symbol, None) is not None]
+    if dropped:
+        _save_store(store_dir, store, states)
+        print(f'日线存储中 {len(dropped)} 个币种的状态已删除，下次更新时全量聚合')
+
+
+def update_daily_store(csv_files, store_dir, njobs=1, rewritten=None):
+    """
+    增量更新日线存储并返回全部日线
+
+    每个文件与状态中记录的指纹比对（见 ingest_manifest.fingerprint_file）：
+    没有变化的不再读取，只在尾部追加的从偏移处增量聚合，被重写的全量聚合
+
+    Args:
+        csv_files: 小时CSV文件列表
+        store_dir: 日线存储目录
+        njobs: 进程数，1 表示串行
+        rewritten: 数据清单判断为重写的文件名集合，这些文件同样全量聚合
+
+    Returns:
+        DataFrame: 所有币种的日线长表，列为 DAILY_COLUMNS，读取失败的文件记录在 attrs['ingest_errors']
+    """
+    store, states = _load_store(store_dir)
+    existing = {symbol: _df for symbol, _df in store.groupby('symbol', sort=False)}
+
+    rewritten = rewritten or set()
+    skipped = []
+    to_read = []
+    fingerprints = {}
+    for csv_file in csv_files:
+        state = states.get(symbol_of(csv_file))
+        try:
+            entry, status, _ = ingest_manifest.fingerprint_file(csv_file, state.get('file') if state else None)
+        except Exception:
+            entry, status = None, 'rewritten'
+        if state is not None and status == 'unchanged' and os.path.basename(csv_file) not in rewritten:
+            skipped.append(csv_file)
+            continue
+        if status != 'appended' or os.path.basename(csv_file) in rewritten:
+            # 新文件或被重写：不使用偏移，全量聚合
+            states.pop(symbol_of(csv_file), None)
+        fingerprints[csv_file] = entry
+        to_read.append(csv_file)
+    skipped_set = set(skipped)
+
+    if njobs == 1:
+        outputs = [update_symbol(csv_file, states.get(symbol_of(csv_file))) for csv_file in to_read]
+    else:
+        outputs = Parallel(n_jobs=njobs, verbose=5)(
+            delayed(update_symbol)(csv_file, states.get(symbol_of(csv_file))) for csv_file in to_read
+        )
+    outputs = dict(zip(to_read, outputs))
+
+    new_states = {}
+    symbols = []
+    errors = {}
+    n_full = 0
+    for csv_file in csv_files:
+        if csv_file in skipped_set:
+            # 文件没有变化，沿用上次的日线和状态
+            symbol = symbol_of(csv_file)
+            symbols.append(symbol)
+            new_states[symbol] = states[symbol]
+            continue
+
+        symbol, df_daily, state, full, error = outputs[csv_file]
+        symbols.append(symbol)
+        if error is not None:
+            print(f'读取文件 {os.path.basename(csv_file)} 失败: {error}')
+            errors[os.path.basename(csv_file)] = error
+            existing.pop(symbol, None)
+            continue
+        # 记录读取前的文件指纹，读取过程中追加的数据在下次运行时按追加处理
+        state['file'] = fingerprints[csv_file]
+        new_states[symbol] = state
+
+        if full:
+            n_full += 1
+            old = None
+        else:
+            # 水位线之后的日线全部用本次结果覆盖
+            old = existing.get(symbol)
+            watermark = states[symbol]['watermark']
+            if watermark is None:
+                old = None
+            elif old is not None:
+                old = old[old['candle_begin_time'] <= pd.Timestamp(watermark)]
+
+        parts = [_df for _df in (old, df_daily) if _df is not None and len(_df) > 0]
+        if parts:
+            existing[symbol] = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        else:
+            existing.pop(symbol, None)
+
+    print(f'日线增量更新完成：{len(skipped)} 个币种无变化，{len(to_read) - n_full} 个币种增量，{n_full} 个币种全量')
+
+    # 已下架（文件不存在）的币种不再保留
+    frames = [existing[symbol] for symbol in symbols if symbol in existing]
+    all_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=DAILY_COLUMNS)
+    all_df = all_df[DAILY_COLUMNS]
+
+    _save_store(store_dir, all_df, new_states)
+    print(f'成功读取 {len(frames)} 个币种的数据')
+    all_df.attrs['ingest_errors'] = errors
+    return all_df
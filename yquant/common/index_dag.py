@@ -0,0 +1,141 @@
+'''
+指数依赖图
+
+每个指数（某市场的山寨指数N、全市场涨跌幅指数N、Y指数N、合约现货比N）是一个节点，声明自己依赖的节点，
+按拓扑顺序执行，每个节点每次运行只计算一次，结果传给所有依赖它的节点。
+
+max_workers > 1 时互不依赖的节点在独立进程中并行执行（matplotlib 的 pyplot 不是线程安全的，因此用进程），
+标记为 inline 的轻量节点（例如从结果中取出某个周期）始终在主进程中执行。
+'''
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from joblib.externals.loky import get_reusable_executor
+
+
+class IndexDAG:
+    """
+    指数依赖图
+
+    Attributes:
+        nodes: {节点名: (func, 依赖的节点名列表, kwargs, inline)}，
+               节点的结果为 func(*依赖节点的结果, **kwargs)
+    """
+
+    def __init__(self):
+        self.nodes = {}
+
+    def __contains__(self, name):
+        return name in self.nodes
+
+    def add(self, name, func, inputs=(), kwargs=None, inline=False):
+        """
+        添加节点
+
+        Args:
+            name: 节点名
+            func: 计算函数，并行执行时必须是模块级函数（需要传给子进程）
+            inputs: 依赖的节点名，结果按顺序作为 func 的位置参数
+            kwargs: func 的其他参数
+            inline: 是否总在主进程中执行
+
+        Returns:
+            str: 节点名
+        """
+        if name in self.nodes:
+            raise ValueError(f'节点重复: {name}')
+        self.nodes[name] = (func, list(inputs), dict(kwargs or {}), inline)
+        return name
+
+    def order(self, targets=None):
+        """
+        计算 targets（默认为全部节点）需要执行的节点，按拓扑顺序排列（同一层按添加顺序）
+
+        Raises:
+            ValueError: 依赖的节点不存在或存在环
+        """
+        needed = []
+        state = {}
+
+        def visit(name, path):
+            if name not in self.nodes:
+                raise ValueError(f'节点 {path[-1] if path else name} 依赖的节点不存在: {name}')
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f'依赖存在环: {" -> ".join(path + [name])}')
+            state[name] = 'visiting'
+            for dep in self.nodes[name][1]:
+                visit(dep, path + [name])
+            state[name] = 'done'
+            needed.append(name)
+
+        for name in (self.nodes if targets is None else targets):
+            visit(name, [])
+        return needed
+
+    def run(self, targets=None, max_workers=1, results=None):
+        """
+        执行节点
+
+        Args:
+            targets: 需要的节点，默认为全部
+            max_workers: 并行进程数，1 为在主进程中依次执行
+            results: 已有的节点结果，其中的节点不再计算
+
+        Returns:
+            dict: {节点名: 结果}，包含所有执行过的节点
+        """
+        results = dict(results or {})
+        pending = [name for name in self.order(targets) if name not in results]
+        if max_workers <= 1:
+            for name in pending:
+                results[name] = self._call(name, results)
+            return results
+
+        # spawn 启动干净的子进程，不继承主进程的线程和 joblib 状态
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            running = {}
+            while pending or running:
+                ran_inline = False
+                for name in [name for name in pending if all(dep in results for dep in self.nodes[name][1])]:
+                    pending.remove(name)
+                    func, inputs, kwargs, inline = self.nodes[name]
+                    if inline:
+                        results[name] = self._call(name, results)
+                        ran_inline = True
+                    else:
+                        print(f'开始计算节点: {name}')
+                        running[executor.submit(_call_in_worker, func, [results[dep] for dep in inputs], kwargs)] = name
+                if ran_inline or not running:
+                    # inline 节点的结果可能让更多节点可以开始
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        print(f'节点计算失败: {name}')
+                        raise
+                    print(f'节点计算完成: {name}')
+        return results
+
+    def _call(self, name, results):
+        func, inputs, kwargs, _ = self.nodes[name]
+        return func(*[results[dep] for dep in inputs], **kwargs)
+
+
+def _call_in_worker(func, args, kwargs):
+    """
+    子进程中执行节点
+
+    节点内 joblib 的进程池（njobs > 1 时）会保留空闲的 worker 复用，子进程退出时要等它们超时，
+    因此计算完成后主动关闭
+    """
+    try:
+        return func(*args, **kwargs)
+    finally:
+        get_reusable_executor().shutdown(wait=True)
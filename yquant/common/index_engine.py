@@ -0,0 +1,487 @@
+'''
+指数计算的数组引擎
+
+两部分：
+    1. 按 symbol 排序的长表上逐币种按行运算：N期涨跌幅、滚动成交额（前缀和相减，每步 O(1)）
+    2. 把每个时间点的截面转为 时间 × 币种 矩阵，向量化地完成成交额前N筛选和排名，
+       替代 groupby('candle_begin_time') 的逐时间点循环
+
+口径与 alcoin_stat / market_zdf_stat 的逐时间点实现一致：
+    - 涨跌幅、滚动窗口按每个币种自己的行计算（不是按日历对齐）
+    - 排名相当于 rank(ascending=False, method='first')：数值相同时按币种（列）顺序，NaN 不参与排名
+矩阵按时间分块构建，内存占用与 block_rows × 币种数 成正比，小时级别的长历史也可以计算。
+日线也可以直接从持久化的市场面板（market_panel）分块切片（PanelSection），不再从长表重建矩阵。
+安装了 numba 时，滚动窗口和截面运算使用编译后的内核（见 index_kernels），结果逐位相同。
+'''
+import numpy as np
+import pandas as pd
+
+from yquant.common import index_kernels
+
+
+# 每块矩阵包含的时间点数
+BLOCK_ROWS = 4096
+
+
+# ===== 按行运算（长表按 symbol 排序，每个币种的行连续且按时间升序） =====
+
+def group_bounds(symbol_codes):
+    """
+    每个币种在长表中的起止位置
+
+    Args:
+        symbol_codes: 按币种排序后的整数编码
+
+    Returns:
+        np.ndarray: 长度为 币种数+1，第 i 个币种占 [bounds[i], bounds[i+1])
+    """
+    symbol_codes = np.asarray(symbol_codes)
+    is_start = np.ones(len(symbol_codes), dtype=bool)
+    is_start[1:] = symbol_codes[1:] != symbol_codes[:-1]
+    return np.append(np.flatnonzero(is_start), len(symbol_codes))
+
+
+def pct_change_rows(values, bounds, periods):
+    """
+    每个币种按行计算的 periods 期涨跌幅，与 groupby('symbol')['close'].pct_change(periods) 相同
+    """
+    values = np.asarray(values, dtype='float64')
+    starts = np.repeat(bounds[:-1], np.diff(bounds))
+    out = np.full(len(values), np.nan)
+    idx = np.arange(periods, len(values))
+    idx = idx[idx - periods >= starts[idx]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[idx] = values[idx] / values[idx - periods] - 1
+    return out
+
+
+def rolling_rows(values, bounds, window, min_periods, how='sum'):
+    """
+    每个币种按行的滚动合计/均值
+
+    每个币种内做一次前缀和，窗口值 = 两个前缀和相减，每步 O(1)，与窗口长度无关。
+    min_periods 按窗口内非 NaN 的行数判断，与 rolling(window, min_periods) 一致；
+    前缀和相减与 pandas 的在线算法只在最后几位有效数字上可能不同。
+
+    Args:
+        values: 按币种排序的长表数值列
+        bounds: group_bounds 的结果
+        window: 窗口行数
+        min_periods: 窗口内至少需要的有效行数
+        how: 'sum' 或 'mean'
+
+    Returns:
+        np.ndarray: 与 values 等长
+    """
+    if how not in ('sum', 'mean'):
+        raise ValueError(f'不支持的滚动方式: {how}')
+    values = np.asarray(values, dtype='float64')
+    if index_kernels.enabled():
+        return index_kernels.rolling_rows(values, np.asarray(bounds, dtype='int64'), window, min_periods, how == 'mean')
+
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    out = np.full(len(values), np.nan)
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        # 每个币种单独求前缀和，数值量级只取决于该币种自身的历史
+        csum = np.concatenate(([0.0], np.cumsum(filled[lo:hi])))
+        ccount = np.concatenate(([0], np.cumsum(valid[lo:hi])))
+        end = np.arange(1, hi - lo + 1)
+        begin = np.maximum(end - window, 0)
+        total = csum[end] - csum[begin]
+        count = ccount[end] - ccount[begin]
+        if how == 'mean':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                total = total / count
+        out[lo:hi] = np.where(count >= min_periods, total, np.nan)
+    return out
+
+
+# ===== 截面运算（时间 × 币种 矩阵） =====
+
+class CrossSection:
+    """
+    长表的 时间 × 币种 分块视图
+
+    Attributes:
+        dates: 时间轴，datetime64[ns]，只包含长表中出现过的时间点
+        symbols: 币种列表（排序后），矩阵的列顺序；
+                 长表按 symbol 稳定排序时，与每个时间点内的行顺序一致
+    """
+
+    def __init__(self, features, block_rows=BLOCK_ROWS):
+        times = pd.to_datetime(features['candle_begin_time']).to_numpy(dtype='datetime64[ns]')
+        self.features = features
+        self.block_rows = block_rows
+        self.dates = np.unique(times)
+        date_codes = np.searchsorted(self.dates, times)
+        self.symbol_codes, symbols = pd.factorize(features['symbol'], sort=True)
+        self.symbols = [str(symbol) for symbol in symbols]
+
+        # 按时间排序的行号，以及每个时间点在其中的起始位置
+        self.order = np.argsort(date_codes, kind='stable')
+        self.date_codes = date_codes[self.order]
+        self.date_bounds = np.searchsorted(self.date_codes, np.arange(len(self.dates) + 1))
+
+    def symbol_id(self, symbol):
+        """
+        币种对应的列号，不存在时返回 None
+        """
+        return self.symbols.index(symbol) if symbol in self.symbols else None
+
+    def blocks(self, columns, present=False):
+        """
+        按时间分块产出矩阵
+
+        Args:
+            columns: 需要转为矩阵的数值列
+            present: 是否额外产出 matrices['present']（币种在该时间点是否有数据的布尔矩阵）
+
+        Yields:
+            tuple: (start, stop, matrices)，对应 dates[start:stop]，
+                   matrices 为 {列名: (stop-start, 币种数) 矩阵}，币种在该时间点没有数据的位置为 NaN
+        """
+        values = {col: self.features[col].to_numpy(dtype='float64') for col in columns}
+        for start in range(0, len(self.dates), self.block_rows):
+            stop = min(start + self.block_rows, len(self.dates))
+            rows = self.order[self.date_bounds[start]:self.date_bounds[stop]]
+            date_idx = self.date_codes[self.date_bounds[start]:self.date_bounds[stop]] - start
+            symbol_idx = self.symbol_codes[rows]
+            matrices = {}
+            for col in columns:
+                matrix = np.full((stop - start, len(self.symbols)), np.nan)
+                matrix[date_idx, symbol_idx] = values[col][rows]
+                matrices[col] = matrix
+            if present:
+                matrices['present'] = np.zeros((stop - start, len(self.symbols)), dtype=bool)
+                matrices['present'][date_idx, symbol_idx] = True
+            yield start, stop, matrices
+
+
+class PanelSection:
+    """
+    市场面板（market_panel.MarketPanel）的 时间 × 币种 分块视图，接口与 CrossSection 相同
+
+    面板已经按日期、币种对齐（可以是内存映射读取的），分块时直接切片，不再从长表重建矩阵。
+    派生列（涨跌幅、滚动成交额）以与面板同形状的矩阵提供，见 Y_idx_newV2_spot.panel_index_features。
+    日线中每个 币种×日期 最多一行且收盘价不为空，因此币种在某日有数据等价于该位置的收盘价不为 NaN。
+
+    Attributes:
+        panel: MarketPanel
+        dates / symbols: 面板的日期轴和币种轴
+        columns: {列名: (日期数, 币种数) 矩阵}，包含面板的 close/quote_volume 和派生列
+    """
+
+    def __init__(self, panel, columns=None, block_rows=BLOCK_ROWS):
+        self.panel = panel
+        self.block_rows = block_rows
+        self.dates = panel.dates
+        self.symbols = panel.symbols
+        self.columns = {'close': panel.close, 'quote_volume': panel.quote_volume}
+        self.columns.update(columns or {})
+
+    def symbol_id(self, symbol):
+        """
+        币种对应的列号，不存在时返回 None
+        """
+        return self.panel.symbol_id(symbol)
+
+    def blocks(self, columns, present=False):
+        """
+        按时间分块产出矩阵，与 CrossSection.blocks 相同
+        """
+        for start in range(0, len(self.dates), self.block_rows):
+            stop = min(start + self.block_rows, len(self.dates))
+            matrices = {col: np.asarray(self.columns[col][start:stop], dtype='float64') for col in columns}
+            if present:
+                matrices['present'] = ~np.isnan(self.panel.close[start:stop])
+            yield start, stop, matrices
+
+
+def cross_section(features, block_rows=BLOCK_ROWS):
+    """
+    features 已经是 CrossSection / PanelSection 时直接返回，否则从长表构建 CrossSection
+    """
+    if isinstance(features, (CrossSection, PanelSection)):
+        return features
+    return CrossSection(features, block_rows=block_rows)
+
+
+def rank_desc_first(values):
+    """
+    逐行降序排名，相当于每行 rank(ascending=False, method='first')
+
+    数值相同的按列顺序排名，NaN 的排名为 NaN
+    """
+    n_rows, n_cols = values.shape
+    # NaN 取负后仍是 NaN，稳定排序时排在最后
+    order = np.argsort(-values, axis=1, kind='stable')
+    ranks = np.empty((n_rows, n_cols))
+    np.put_along_axis(ranks, order, np.broadcast_to(np.arange(1.0, n_cols + 1), (n_rows, n_cols)), axis=1)
+    ranks[np.isnan(values)] = np.nan
+    return ranks
+
+
+def top_n_mask(values, top_n):
+    """
+    每行数值最大的 top_n 个位置（NaN 不入选），并列时按列顺序取前面的，
+    与 rank_desc_first(values) <= top_n 相同
+
+    用 np.partition 找到每行第 top_n 大的值（部分排序，O(列数)），
+    严格大于它的全部入选，等于它的按列顺序补足 top_n 个，相当于 method='first' 的并列处理
+    """
+    if index_kernels.enabled():
+        return index_kernels.top_n_mask(values, top_n)
+    valid = ~np.isnan(values)
+    n_cols = values.shape[1]
+    if n_cols <= top_n:
+        return valid
+
+    filled = np.where(valid, values, -np.inf)
+    kth = np.partition(filled, n_cols - top_n, axis=1)[:, n_cols - top_n:n_cols - top_n + 1]
+    above = filled > kth
+    tied = (filled == kth) & valid
+    need = top_n - above.sum(axis=1, keepdims=True)
+    return above | (tied & (np.cumsum(tied, axis=1) <= need))
+
+
+def column_rank_desc_first(values, mask, col):
+    """
+    第 col 列在每行 mask 选中的值中的降序名次，相当于对选中的值 rank(ascending=False, method='first') 后取该列
+
+    名次 = 1 + 比它大的个数 + 在它左边且与它相等的个数，只需一次比较，不必对整行排序；
+    该列未选中或数值为 NaN 时为 NaN，其他 NaN 不参与比较
+
+    Args:
+        values: (行数, 列数) 矩阵
+        mask: 参与排名的位置
+        col: 列号
+
+    Returns:
+        np.ndarray: 每行的名次（浮点数）
+    """
+    if index_kernels.enabled():
+        return index_kernels.column_rank_desc_first(values, mask, col)
+    target = values[:, col:col + 1]
+    greater = (mask & (values > target)).sum(axis=1)
+    tied_before = (mask[:, :col] & (values[:, :col] == target)).sum(axis=1)
+    rank = (1 + greater + tied_before).astype('float64')
+    rank[~mask[:, col] | np.isnan(values[:, col])] = np.nan
+    return rank
+
+
+def masked_row_sum(values, mask):
+    """
+    每行 mask 选中位置的和（NaN 按 0 计），与对选中的值做 Series.sum() 逐位相同
+
+    numpy 的求和对不同长度的数组分组方式不同，因此按选中个数分组，
+    每组在 (行数, 选中个数) 的连续矩阵上按行求和，与逐行取出后求和的舍入完全一致
+    """
+    if index_kernels.enabled():
+        return index_kernels.masked_row_sum(values, mask)
+    counts = mask.sum(axis=1)
+    out = np.zeros(len(values))
+    for count in np.unique(counts):
+        if count == 0:
+            continue
+        rows = np.flatnonzero(counts == count)
+        selected = values[rows][mask[rows]].reshape(len(rows), count)
+        out[rows] = np.where(np.isnan(selected), 0.0, selected).sum(axis=1)
+    return out, counts
+
+
+# 山寨指数输出列
+ALTCOIN_COLUMNS = ['candle_begin_time', 'BTC排名', '全币种数量', '山寨指数']
+
+
+def _market_columns(statdays):
+    return ['candle_begin_time'] + [f'全市场涨跌幅指数{statday}d' for statday in statdays] + ['全市场涨跌幅指数']
+
+
+def _unique_days(groups):
+    days = []
+    for group in groups:
+        days.extend(statday for statday in group if statday not in days)
+    return days
+
+
+def index_frames(features, market_groups=(), altcoin_groups=(), market_volume_col=None, altcoin_volume_col=None,
+                 top_n=50, blacklist=(), btc_symbol='BTCUSDT', block_rows=BLOCK_ROWS, market_universe=None,
+                 altcoin_universe=None):
+    """
+    一次遍历计算多组统计周期的全市场涨跌幅指数和山寨指数
+
+    两种指数共用同一份 时间 × 币种 分块矩阵；每块内两个前 top_n 成员集合
+    （全市场 / 排除黑名单）各只筛选一次，每个统计周期的截面结果（前 top_n 涨跌幅合计、BTC 名次）
+    也只计算一次，最后按组组合。每组的输出与单独用该组 statdays 调用
+    market_index_frame / altcoin_index_frame 完全相同。
+
+    Args:
+        features: 包含 candle_begin_time/symbol/成交额列/涨跌幅{N}d 的长表，按 symbol 稳定排序；
+            也可以是包含这些列的 PanelSection（在市场面板上计算，结果相同）
+        market_groups: 全市场涨跌幅指数的输出组，例如 [[7], [30], [90]]，每组对应一个输出
+        altcoin_groups: 山寨指数的输出组
+        market_volume_col: 全市场涨跌幅指数筛选前 top_n 使用的成交额列
+        altcoin_volume_col: 山寨指数筛选前 top_n 使用的成交额列
+        top_n: 入选数量
+        blacklist: 山寨指数排除的币种
+        btc_symbol: 山寨指数对比的基准币种
+        market_universe / altcoin_universe: 已经筛选好的前 top_n 成员（universe_index.Universe），
+            提供时直接使用，不再按成交额筛选；口径必须与 volume_col/top_n/blacklist 相同
+
+    Returns:
+        tuple: (market_frames, altcoin_frames)，与 market_groups / altcoin_groups 一一对应的 DataFrame 列表
+    """
+    market_groups = [list(group) for group in market_groups]
+    altcoin_groups = [list(group) for group in altcoin_groups]
+    empty = isinstance(features, pd.DataFrame) and len(features) == 0
+    section = None if empty else cross_section(features, block_rows=block_rows)
+    if section is None or len(section.dates) == 0:
+        return ([pd.DataFrame(columns=_market_columns(group)) for group in market_groups],
+                [pd.DataFrame(columns=ALTCOIN_COLUMNS) for _ in altcoin_groups])
+
+    n_dates = len(section.dates)
+    market_days = _unique_days(market_groups)
+    altcoin_days = _unique_days(altcoin_groups)
+
+    excluded = np.isin(section.symbols, list(blacklist))
+    btc_col = section.symbol_id(btc_symbol)
+    if btc_col is not None and excluded[btc_col]:
+        btc_col = None
+
+    for universe, volume_col, universe_blacklist in ((market_universe, market_volume_col, ()),
+                                                      (altcoin_universe, altcoin_volume_col, blacklist)):
+        if universe is not None and not universe.same_definition(volume_col, top_n, universe_blacklist):
+            raise ValueError(f'成员索引的筛选口径与参数不同: {universe.volume_col} 前{universe.top_n}')
+
+    columns = [f'涨跌幅{statday}d' for statday in _unique_days([market_days, altcoin_days])]
+    if market_groups and market_universe is None:
+        columns.append(market_volume_col)
+    if altcoin_groups and altcoin_universe is None and altcoin_volume_col not in columns:
+        columns.append(altcoin_volume_col)
+
+    # 全市场涨跌幅指数：每个周期前 top_n 的涨跌幅合计，以及入选数量
+    market_sum = {statday: np.zeros(n_dates) for statday in market_days}
+    market_count = np.zeros(n_dates, dtype='int64')
+    # 山寨指数：排除黑名单后是否有数据、入选数量、BTC 是否入选，以及每个周期的 BTC 名次
+    altcoin_dates = np.zeros(n_dates, dtype=bool)
+    altcoin_total = np.zeros(n_dates, dtype='int64')
+    btc_in = np.zeros(n_dates, dtype=bool)
+    btc_rank = {statday: np.zeros(n_dates) for statday in altcoin_days}
+    btc_from_rank = {statday: np.zeros(n_dates, dtype=bool) for statday in altcoin_days}
+    altcoin_index = {statday: np.zeros(n_dates) for statday in altcoin_days}
+
+    for start, stop, matrices in section.blocks(columns, present=bool(altcoin_groups)):
+        if market_groups:
+            if market_universe is not None:
+                members = market_universe.mask(section.dates[start:stop], section.symbols)
+            else:
+                members = top_n_mask(matrices[market_volume_col], top_n)
+            market_count[start:stop] = members.sum(axis=1)
+            for statday in market_days:
+                market_sum[statday][start:stop] = masked_row_sum(matrices[f'涨跌幅{statday}d'], members)[0]
+
+        if altcoin_groups:
+            if altcoin_universe is not None:
+                members = altcoin_universe.mask(section.dates[start:stop], section.symbols)
+            else:
+                members = top_n_mask(np.where(excluded, np.nan, matrices[altcoin_volume_col]), top_n)
+            total = members.sum(axis=1)
+            altcoin_dates[start:stop] = matrices['present'][:, ~excluded].any(axis=1)
+            altcoin_total[start:stop] = total
+            if btc_col is None:
+                continue
+            btc_in[start:stop] = members[:, btc_col]
+            for statday in altcoin_days:
+                zdf_rank = column_rank_desc_first(matrices[f'涨跌幅{statday}d'], members, btc_col)
+                # 涨跌幅缺失时记为最后一名
+                valid = ~np.isnan(zdf_rank) & (zdf_rank <= total)
+                rank = np.where(valid, zdf_rank, total)
+                btc_rank[statday][start:stop] = rank
+                btc_from_rank[statday][start:stop] = valid
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    altcoin_index[statday][start:stop] = np.round(rank / total, 2)
+
+    market_frames = []
+    for group in market_groups:
+        result = {}
+        index_sum = np.zeros(n_dates)
+        for statday in group:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                marketzdf_index = market_sum[statday] / market_count
+            index_sum = index_sum + marketzdf_index
+            result[f'全市场涨跌幅指数{statday}d'] = marketzdf_index
+        result['全市场涨跌幅指数'] = index_sum / len(group)
+        final_df = pd.DataFrame(result, columns=_market_columns(group)[1:])
+        final_df.insert(0, 'candle_begin_time', section.dates)
+        market_frames.append(final_df)
+
+    altcoin_frames = []
+    for group in altcoin_groups:
+        # BTC 不在前 top_n：排最后一名，不参与山寨指数；否则按周期顺序累加，名次取最后一个周期
+        rank = (altcoin_total + 1).astype('float64')
+        index_sum = np.zeros(n_dates)
+        from_rank = np.zeros(n_dates, dtype=bool)
+        for statday in group:
+            index_sum = np.where(btc_in, index_sum + altcoin_index[statday], index_sum)
+            rank = np.where(btc_in, btc_rank[statday], rank)
+            from_rank = np.where(btc_in, btc_from_rank[statday], from_rank)
+        index = index_sum / len(group)
+
+        # 与逐行拼接到空 DataFrame 的结果一致：BTC排名/全币种数量 为 object 列，
+        # BTC排名 取自涨跌幅排名时是浮点数，BTC 缺失或涨跌幅缺失时是整数（写出CSV时分别为 3.0 / 3）
+        keep = np.flatnonzero(altcoin_dates)
+        rank_obj = np.array([value if is_float else int(value) for value, is_float in zip(rank[keep], from_rank[keep])],
+                            dtype=object)
+        altcoin_frames.append(pd.DataFrame({
+            'candle_begin_time': section.dates[keep],
+            'BTC排名': rank_obj,
+            '全币种数量': np.array(altcoin_total[keep].tolist(), dtype=object),
+            '山寨指数': index[keep],
+        }, columns=ALTCOIN_COLUMNS))
+
+    return market_frames, altcoin_frames
+
+
+def altcoin_index_frame(features, statdays, volume_col, top_n=50, blacklist=(), btc_symbol='BTCUSDT',
+                        block_rows=BLOCK_ROWS):
+    """
+    山寨指数（口径同 alcoin_stat 的逐时间点循环）
+
+    每个时间点：排除黑名单后按 volume_col 取前 top_n，BTC 在其中按涨跌幅的排名 / 入选数量，
+    保留两位小数后对 statdays 取平均；BTC 不在前 top_n 时 BTC排名 记为 入选数量+1、山寨指数为 0
+
+    Args:
+        features: 包含 candle_begin_time/symbol/volume_col/涨跌幅{N}d 的长表，按 symbol 稳定排序
+        statdays: 统计周期列表
+        volume_col: 筛选前 top_n 使用的成交额列
+        top_n: 入选数量
+        blacklist: 排除的币种
+        btc_symbol: 对比的基准币种
+
+    Returns:
+        DataFrame: candle_begin_time/BTC排名/全币种数量/山寨指数
+    """
+    _, altcoin_frames = index_frames(features, altcoin_groups=[statdays], altcoin_volume_col=volume_col, top_n=top_n,
+                                     blacklist=blacklist, btc_symbol=btc_symbol, block_rows=block_rows)
+    return altcoin_frames[0]
+
+
+def market_index_frame(features, statdays, volume_col, top_n=50, block_rows=BLOCK_ROWS):
+    """
+    全市场涨跌幅指数（口径同 market_zdf_stat 的逐时间点循环）
+
+    每个时间点按 volume_col 取前 top_n，各周期涨跌幅的合计 / 入选数量，再对 statdays 取平均
+
+    Args:
+        features: 包含 candle_begin_time/symbol/volume_col/涨跌幅{N}d 的长表，按 symbol 稳定排序
+        statdays: 统计周期列表
+        volume_col: 筛选前 top_n 使用的成交额列
+        top_n: 入选数量
+
+    Returns:
+        DataFrame: candle_begin_time/全市场涨跌幅指数{N}d.../全市场涨跌幅指数
+    """
+    market_frames, _ = index_frames(features, market_groups=[statdays], market_volume_col=volume_col, top_n=top_n,
+                                    block_rows=block_rows)
+    return market_frames[0]
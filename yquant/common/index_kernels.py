@@ -0,0 +1,232 @@
+'''
+指数计算的 numba 内核
+
+index_engine 中最耗时的几个运算（逐币种滚动成交额、每个时间点的成交额前N筛选、BTC 名次、
+前N涨跌幅合计）都是紧凑的数值循环，用 numba 编译后逐行/逐币种直接循环，
+省去 NumPy 实现中的临时矩阵（排序下标、布尔矩阵、按入选数量分组的拷贝）。
+
+依赖 numba；未安装时 AVAILABLE 为 False，index_engine 使用原来的 NumPy 实现。
+每个内核的结果与对应的 NumPy 实现逐位相同（见 verify_index_kernels.py），
+其中求和按 NumPy 的成对求和（pairwise summation）顺序进行，保证舍入一致。
+'''
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # 未安装 numba 时使用 NumPy 实现
+    numba = None
+
+
+AVAILABLE = numba is not None
+
+# 设为 False 时 index_engine 不使用内核（用于对比两种实现）
+ENABLED = True
+
+
+def _jit(func):
+    if numba is None:
+        return func
+    return numba.njit(cache=True, nogil=True)(func)
+
+
+def enabled():
+    """
+    index_engine 是否使用内核
+    """
+    return AVAILABLE and ENABLED
+
+
+@_jit
+def rolling_rows(values, bounds, window, min_periods, mean):
+    """
+    每个币种按行的滚动合计/均值，口径同 index_engine.rolling_rows（前缀和相减）
+
+    Args:
+        values: 按币种排序的长表数值列（float64）
+        bounds: index_engine.group_bounds 的结果
+        window: 窗口行数
+        min_periods: 窗口内至少需要的有效行数
+        mean: True 为均值，False 为合计
+    """
+    n = len(values)
+    out = np.full(n, np.nan)
+    for g in range(len(bounds) - 1):
+        lo = bounds[g]
+        hi = bounds[g + 1]
+        csum = np.zeros(hi - lo + 1)
+        ccount = np.zeros(hi - lo + 1, dtype=np.int64)
+        for i in range(hi - lo):
+            value = values[lo + i]
+            if np.isnan(value):
+                csum[i + 1] = csum[i] + 0.0
+                ccount[i + 1] = ccount[i]
+            else:
+                csum[i + 1] = csum[i] + value
+                ccount[i + 1] = ccount[i] + 1
+        for i in range(hi - lo):
+            end = i + 1
+            begin = max(end - window, 0)
+            count = ccount[end] - ccount[begin]
+            if count >= min_periods:
+                total = csum[end] - csum[begin]
+                if mean:
+                    total = total / count
+                out[lo + i] = total
+    return out
+
+
+@_jit
+def top_n_mask(values, top_n):
+    """
+    每行数值最大的 top_n 个位置（NaN 不入选），并列时按列顺序取前面的，口径同 index_engine.top_n_mask
+    """
+    n_rows, n_cols = values.shape
+    mask = np.zeros((n_rows, n_cols), dtype=np.bool_)
+    cols = np.empty(n_cols, dtype=np.int64)
+    keys = np.empty(n_cols)
+    for r in range(n_rows):
+        n_valid = 0
+        for c in range(n_cols):
+            if not np.isnan(values[r, c]):
+                cols[n_valid] = c
+                keys[n_valid] = -values[r, c]
+                n_valid += 1
+        if n_valid <= top_n:
+            for k in range(n_valid):
+                mask[r, cols[k]] = True
+            continue
+        # 部分排序找到第 top_n 大的值，大于它的全部入选，等于它的按列顺序补足
+        kth = np.partition(keys[:n_valid], top_n - 1)[top_n - 1]
+        need = top_n
+        for k in range(n_valid):
+            if keys[k] < kth:
+                need -= 1
+        for k in range(n_valid):
+            if keys[k] < kth:
+                mask[r, cols[k]] = True
+            elif keys[k] == kth and need > 0:
+                mask[r, cols[k]] = True
+                need -= 1
+    return mask
+
+
+@_jit
+def column_rank_desc_first(values, mask, col):
+    """
+    第 col 列在每行 mask 选中的值中的降序名次，口径同 index_engine.column_rank_desc_first
+    """
+    n_rows, n_cols = values.shape
+    rank = np.full(n_rows, np.nan)
+    for r in range(n_rows):
+        target = values[r, col]
+        if not mask[r, col] or np.isnan(target):
+            continue
+        position = 1
+        for c in range(n_cols):
+            if mask[r, c] and (values[r, c] > target or (c < col and values[r, c] == target)):
+                position += 1
+        rank[r] = position
+    return rank
+
+
+@_jit
+def _block_sum(a, lo, n):
+    # 不超过 128 个数时 NumPy 的求和顺序：少于 8 个顺序相加，否则 8 路展开
+    if n < 8:
+        res = -0.0
+        for i in range(lo, lo + n):
+            res += a[i]
+        return res
+    r0 = a[lo]
+    r1 = a[lo + 1]
+    r2 = a[lo + 2]
+    r3 = a[lo + 3]
+    r4 = a[lo + 4]
+    r5 = a[lo + 5]
+    r6 = a[lo + 6]
+    r7 = a[lo + 7]
+    i = 8
+    while i < n - n % 8:
+        r0 += a[lo + i]
+        r1 += a[lo + i + 1]
+        r2 += a[lo + i + 2]
+        r3 += a[lo + i + 3]
+        r4 += a[lo + i + 4]
+        r5 += a[lo + i + 5]
+        r6 += a[lo + i + 6]
+        r7 += a[lo + i + 7]
+        i += 8
+    res = ((r0 + r1) + (r2 + r3)) + ((r4 + r5) + (r6 + r7))
+    while i < n:
+        res += a[lo + i]
+        i += 1
+    return res
+
+
+@_jit
+def _pairwise_sum(a, lo, n):
+    """
+    与 NumPy 对连续数组求和的成对求和顺序相同：超过 128 个时二分（左半为 8 的倍数），分别求和后相加
+
+    用显式栈代替递归（numba 缓存递归函数会出错）
+    """
+    if n <= 128:
+        return _block_sum(a, lo, n)
+    stack_lo = np.empty(64, dtype=np.int64)
+    stack_n = np.empty(64, dtype=np.int64)
+    stack_stage = np.empty(64, dtype=np.int64)
+    partial = np.empty(64)
+    n_partial = 0
+    stack_lo[0] = lo
+    stack_n[0] = n
+    stack_stage[0] = 0
+    top = 1
+    while top > 0:
+        cur_lo = stack_lo[top - 1]
+        cur_n = stack_n[top - 1]
+        if cur_n <= 128:
+            partial[n_partial] = _block_sum(a, cur_lo, cur_n)
+            n_partial += 1
+            top -= 1
+            continue
+        n2 = cur_n // 2
+        n2 -= n2 % 8
+        stage = stack_stage[top - 1]
+        stack_stage[top - 1] = stage + 1
+        if stage == 0:
+            stack_lo[top] = cur_lo
+            stack_n[top] = n2
+            stack_stage[top] = 0
+            top += 1
+        elif stage == 1:
+            stack_lo[top] = cur_lo + n2
+            stack_n[top] = cur_n - n2
+            stack_stage[top] = 0
+            top += 1
+        else:
+            partial[n_partial - 2] = partial[n_partial - 2] + partial[n_partial - 1]
+            n_partial -= 1
+            top -= 1
+    return partial[0]
+
+
+@_jit
+def masked_row_sum(values, mask):
+    """
+    每行 mask 选中位置的和（NaN 按 0 计）及选中个数，口径同 index_engine.masked_row_sum
+    """
+    n_rows, n_cols = values.shape
+    sums = np.zeros(n_rows)
+    counts = np.zeros(n_rows, dtype=np.int64)
+    selected = np.empty(n_cols)
+    for r in range(n_rows):
+        count = 0
+        for c in range(n_cols):
+            if mask[r, c]:
+                value = values[r, c]
+                selected[count] = 0.0 if np.isnan(value) else value
+                count += 1
+        counts[r] = count
+        if count > 0:
+            sums[r] = 0.0 + _pairwise_sum(selected, 0, count)
+    return sums, counts
@@ -0,0 +1,228 @@
+'''
+指数增量状态
+
+每个市场保存计算最新日期指数所需的最小状态：
+    window.pkl: 每个币种最近 WINDOW_ROWS 行日线（candle_begin_time/symbol/close/quote_volume），
+                足够计算 365 期涨跌幅和 365 日均成交额（涨跌幅、滚动窗口都是按币种的行计算）
+    state.json: 状态覆盖的最后一个日期、统计周期
+
+新的日线到来时，最后一个日期（可能是尚未走完的当天）先回退，与新日线拼接后只计算该日期及之后的指数，
+替换/追加到已有指数CSV的末尾，已有的行保持原样不重写。
+窗口与新日线中重叠部分的数据不一致（历史被改写、新币种带着历史上架）时需要全量重算。
+上游修正了一段历史日线时，只重算该时间段的指数（见 splice_csv_rows），窗口中对应的数值用 patch_window 修补。
+'''
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+# 每个币种保留的日线行数：365期涨跌幅 / 365日均成交额需要当前行之前的365行，回退最后一天后仍然足够
+WINDOW_ROWS = 366
+
+# 状态保存的列
+WINDOW_COLUMNS = ['candle_begin_time', 'symbol', 'close', 'quote_volume']
+
+
+def get_state_dir(market_type):
+    """
+    指数增量状态目录
+    """
+    return os.path.join('/Users/houjl/Downloads/FLdata', market_type, 'index_state')
+
+
+def load_state(state_dir):
+    """
+    读取状态，不存在或损坏时返回 (None, None)
+
+    Returns:
+        tuple: (window, meta)
+    """
+    window_file = os.path.join(state_dir, 'window.pkl')
+    state_file = os.path.join(state_dir, 'state.json')
+    if not (os.path.exists(window_file) and os.path.exists(state_file)):
+        return None, None
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return pd.read_pickle(window_file), meta
+    except Exception as e:
+        print(f'读取指数增量状态失败，全量重算: {e}')
+        return None, None
+
+
+def save_state(state_dir, window, meta):
+    os.makedirs(state_dir, exist_ok=True)
+    window_file = os.path.join(state_dir, 'window.pkl')
+    state_file = os.path.join(state_dir, 'state.json')
+    window.to_pickle(window_file + '.tmp')
+    with open(state_file + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(window_file + '.tmp', window_file)
+    os.replace(state_file + '.tmp', state_file)
+
+
+def tail_window(df, rows=WINDOW_ROWS):
+    """
+    每个币种最后 rows 行，保持原有的行顺序
+
+    Args:
+        df: 日线长表，每个币种内按时间升序
+    """
+    window = df[WINDOW_COLUMNS]
+    window = window[window.groupby('symbol', sort=False, observed=True).cumcount(ascending=False) < rows]
+    window = window.reset_index(drop=True)
+    window['symbol'] = window['symbol'].astype(str)
+    return window
+
+
+def is_consistent(window, all_df, last_date):
+    """
+    检查新日线在窗口覆盖的时间段内（最后一个日期之前）与窗口完全一致
+
+    新日线在该时间段内多出、缺少或改变了任何一行（历史被改写、新币种带着历史上架、币种被删除），
+    增量结果都会与全量重算不同，此时返回 False
+
+    Args:
+        window: 上次保存的窗口
+        all_df: 本次的全部日线
+        last_date: 窗口覆盖的最后一个日期（会被回退重算）
+    """
+    first_date = window['candle_begin_time'].min()
+    old = window[window['candle_begin_time'] < last_date]
+    new = all_df[(all_df['candle_begin_time'] >= first_date) & (all_df['candle_begin_time'] < last_date)]
+
+    # 每个币种窗口起点之前的行不属于比较范围（窗口按行数截断，币种有缺失日期时起点各不相同）
+    symbol_start = old.groupby('symbol')['candle_begin_time'].min()
+    new_symbols = new['symbol'].astype(str)
+    new_start = new_symbols.map(symbol_start)
+    new = new[new_start.isna() | (new['candle_begin_time'] >= new_start)]
+    if len(new) != len(old):
+        return False
+
+    key = ['symbol', 'candle_begin_time']
+    old = old.assign(symbol=old['symbol'].astype(str)).sort_values(key)
+    new = new[WINDOW_COLUMNS].assign(symbol=new['symbol'].astype(str)).sort_values(key)
+    return all(np.array_equal(old[col].to_numpy(), new[col].to_numpy()) for col in key) and \
+        all(np.array_equal(old[col].to_numpy(dtype='float64'), new[col].to_numpy(dtype='float64'), equal_nan=True)
+            for col in ['close', 'quote_volume'])
+
+
+def append_csv_rows(path, rows, from_time, encoding='utf-8'):
+    """
+    用 rows 替换CSV中 candle_begin_time >= from_time 的行，之前的行按原文保留
+
+    Args:
+        path: 指数CSV路径（第一列为 candle_begin_time，按时间升序）
+        rows: 新计算的行，列与CSV相同
+        from_time: 被替换的起始时间
+        encoding: CSV编码
+    """
+    if not os.path.exists(path):
+        rows.to_csv(path, index=False, encoding=encoding)
+        return
+
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        lines = f.readlines()
+    from_time = pd.Timestamp(from_time)
+    keep = len(lines)
+    # 新日期只在文件末尾，从后往前找
+    while keep > 1 and pd.Timestamp(lines[keep - 1].split(',', 1)[0]) >= from_time:
+        keep -= 1
+    if keep > 0 and not lines[keep - 1].endswith('\n'):
+        lines[keep - 1] += '\n'
+
+    with open(path + '.tmp', 'w', encoding=encoding, newline='') as f:
+        f.writelines(lines[:keep])
+    rows.to_csv(path + '.tmp', mode='a', header=False, index=False, encoding=encoding)
+    os.replace(path + '.tmp', path)
+
+
+def splice_csv_rows(path, rows, from_time, to_time, encoding='utf-8'):
+    """
+    用 rows 替换CSV中 from_time <= candle_begin_time <= to_time 的行（重算一段日期时使用），其余行按原文保留
+
+    Args:
+        path: 指数CSV路径（第一列为 candle_begin_time，按时间升序）
+        rows: 新计算的行，列与CSV相同，时间都在 [from_time, to_time] 内
+        from_time / to_time: 被替换的时间范围
+        encoding: CSV编码
+    """
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        lines = f.readlines()
+    if lines and not lines[-1].endswith('\n'):
+        lines[-1] += '\n'
+    times = [pd.Timestamp(line.split(',', 1)[0]) for line in lines[1:]]
+    from_time, to_time = pd.Timestamp(from_time), pd.Timestamp(to_time)
+    head = 1 + sum(t < from_time for t in times)
+    tail = 1 + len(times) - sum(t > to_time for t in times)
+
+    with open(path + '.tmp', 'w', encoding=encoding, newline='') as f:
+        f.writelines(lines[:head])
+    rows.to_csv(path + '.tmp', mode='a', header=False, index=False, encoding=encoding)
+    with open(path + '.tmp', 'a', encoding=encoding, newline='') as f:
+        f.writelines(lines[tail:])
+    os.replace(path + '.tmp', path)
+
+
+def patch_window(window, daily, from_time, to_time):
+    """
+    用修正后的日线替换窗口中 [from_time, to_time] 的 close/quote_volume
+
+    只处理数值被修正的情况：窗口在该时间段内的行（币种 + 日期）与修正后的日线不同时
+    （增加/删除了行），窗口无法局部修补，返回 None，下次增量更新时会发现不一致并全量计算
+
+    Args:
+        window: load_state 读取的窗口
+        daily: 修正后的日线，覆盖 [from_time, to_time] 以及窗口内各币种的起点
+        from_time / to_time: 被修正的时间范围
+
+    Returns:
+        DataFrame: 修补后的窗口，或 None
+    """
+    from_time, to_time = pd.Timestamp(from_time), pd.Timestamp(to_time)
+    in_range = (window['candle_begin_time'] >= from_time) & (window['candle_begin_time'] <= to_time)
+    old = window[in_range]
+    new = daily[(daily['candle_begin_time'] >= from_time) & (daily['candle_begin_time'] <= to_time)
+                & (daily['candle_begin_time'] <= window['candle_begin_time'].max())]
+
+    # 与 is_consistent 相同，每个币种窗口起点之前的行不属于窗口
+    symbol_start = window.groupby('symbol')['candle_begin_time'].min()
+    new_symbols = new['symbol'].astype(str)
+    new_start = new_symbols.map(symbol_start)
+    new = new[new_start.isna() | (new['candle_begin_time'] >= new_start)]
+
+    key = ['symbol', 'candle_begin_time']
+    merged = old[key].assign(symbol=old['symbol'].astype(str)).reset_index().merge(
+        new[WINDOW_COLUMNS].assign(symbol=new['symbol'].astype(str)), on=key, how='outer', indicator=True)
+    if len(merged) != len(old) or (merged['_merge'] != 'both').any():
+        return None
+
+    window = window.copy()
+    for col in ['close', 'quote_volume']:
+        window.loc[merged['index'].to_numpy(dtype='int64'), col] = merged[col].to_numpy(dtype=window[col].dtype)
+    return window
+
+
+def affected_until(daily, from_time, to_time, rows=WINDOW_ROWS - 1):
+    """
+    [from_time, to_time] 的日线被修正后，受影响的指数最晚到哪一天
+
+    涨跌幅、滚动成交额都按币种的行计算，一行日线最多影响该币种之后 rows 行的结果，
+    因此每个币种 to_time 之前最后一行往后数 rows 行以内都需要重算
+
+    Args:
+        daily: 日线长表，每个币种内按时间升序，至少包含 to_time 之后需要的行
+        from_time / to_time: 被修正的时间范围
+        rows: 一行日线最多影响之后的行数（最长涨跌幅周期与滚动窗口长度减一中的较大者）
+
+    Returns:
+        Timestamp: 需要重算的最后一天，不晚于 daily 中的最后一天
+    """
+    from_time, to_time = pd.Timestamp(from_time), pd.Timestamp(to_time)
+    times = daily['candle_begin_time']
+    symbols = daily['symbol'].astype(str)
+    position = daily.groupby(symbols, sort=False).cumcount()
+    last_row = position.where(times <= to_time).groupby(symbols, sort=False).transform('max')
+    affected = times[(position <= last_row + rows) & (times >= from_time)]
+    return max(affected.max(), to_time) if len(affected) else to_time
@@ -0,0 +1,234 @@
+'''
+本地数据读取清单（manifest）
+
+记录上一次成功读取时每个小时CSV的状态：大小、mtime、行数、candle_begin_time 的最小/最大值、
+文件尾部内容的哈希，以及读取失败的原因。下一次运行先扫描文件并与清单比对：
+    unchanged: 大小和 mtime 都没变，可以跳过读取
+    appended:  只在尾部追加了数据（原尾部内容不变），只需读取新增部分
+    rewritten: 文件被整体重写，需要全量读取
+    new / removed: 新上架 / 已下架（文件消失）的币种
+并检查上游同步是否异常（文件变小、时间倒退、最后一行不完整、大量文件消失），
+在花费完整计算之前发现不完整或损坏的同步。
+'''
+import os
+import json
+import hashlib
+from datetime import datetime
+import pandas as pd
+
+from yquant.common.local_ingest import symbol_of
+
+
+# 参与尾部哈希的字节数
+TAIL_BYTES = 4096
+# 分块统计行数时每次读取的字节数
+_READ_BYTES = 1 << 22
+
+
+def get_manifest_path(local_data_path):
+    """
+    根据小时CSV目录得到清单文件路径
+
+    例如 .../coin-binance-spot-swap-preprocess-pkl-1h/split/swap/
+    对应 .../coin-binance-spot-swap-preprocess-pkl-1h/manifest/swap.json
+    """
+    local_data_path = os.path.normpath(local_data_path)
+    market_type = os.path.basename(local_data_path)
+    root = os.path.dirname(os.path.dirname(local_data_path))
+    return os.path.join(root, 'manifest', f'{market_type}.json')
+
+
+def load_manifest(manifest_path):
+    """
+    读取清单，不存在或损坏时返回空清单
+    """
+    if not os.path.exists(manifest_path):
+        return {'files': {}}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f'读取清单 {manifest_path} 失败，按首次运行处理: {e}')
+        return {'files': {}}
+
+
+def save_manifest(manifest_path, manifest):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    manifest['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def _count_lines(f, start, end):
+    """
+    统计 [start, end) 之间的换行数
+    """
+    f.seek(start)
+    count = 0
+    remain = end - start
+    while remain > 0:
+        buf = f.read(min(_READ_BYTES, remain))
+        if not buf:
+            break
+        count += buf.count(b'\n')
+        remain -= len(buf)
+    return count
+
+
+def _time_of(line, time_col):
+    if time_col is None or not line:
+        return None
+    try:
+        value = line.decode('utf-8').split(',')[time_col].strip()
+        return str(pd.Timestamp(value))
+    except Exception:
+        return None
+
+
+def fingerprint_file(csv_file, previous=None):
+    """
+    计算单个文件的清单条目，并与上一次的条目比对
+
+    Args:
+        csv_file: 小时CSV文件路径
+        previous: 上一次的清单条目，None 表示新文件
+
+    Returns:
+        tuple: (entry, status, problems)
+            - status: 'new' / 'unchanged' / 'appended' / 'rewritten'
+            - problems: 同步异常描述列表
+    """
+    st = os.stat(csv_file)
+    if previous and previous['size'] == st.st_size and previous['mtime_ns'] == st.st_mtime_ns:
+        return dict(previous), 'unchanged', []
+
+    size = st.st_size
+    problems = []
+    with open(csv_file, 'rb') as f:
+        header = f.readline()
+        first_line = f.readline()
+        tail_start = max(len(header), size - TAIL_BYTES)
+        f.seek(tail_start)
+        tail = f.read()
+
+        columns = header.decode('utf-8-sig').strip().split(',')
+        time_col = columns.index('candle_begin_time') if 'candle_begin_time' in columns else None
+        header_text = header.decode('utf-8', errors='replace')
+
+        # 判断是否只在尾部追加：文件变大且原文件尾部的内容不变（大小不变而 mtime 变化说明内容被改写）
+        status = 'new' if previous is None else 'rewritten'
+        if previous is not None and size > previous['size'] and previous.get('header') == header_text:
+            f.seek(previous['tail_start'])
+            old_tail = f.read(previous['size'] - previous['tail_start'])
+            if hashlib.sha1(old_tail).hexdigest() == previous['tail_hash']:
+                status = 'appended'
+
+        if status == 'appended':
+            rows = previous['rows'] + _count_lines(f, previous['size'], size)
+        else:
+            rows = _count_lines(f, len(header), size)
+
+    complete_lines = tail[:tail.rfind(b'\n') + 1].splitlines()
+    last_line = complete_lines[-1] if complete_lines else b''
+    if tail and not tail.endswith(b'\n'):
+        problems.append('最后一行不完整')
+
+    entry = {
+        'symbol': symbol_of(csv_file),
+        'size': size,
+        'mtime_ns': st.st_mtime_ns,
+        'header': header_text,
+        'rows': rows,
+        'min_time': _time_of(first_line, time_col),
+        'max_time': _time_of(last_line, time_col),
+        'tail_start': tail_start,
+        'tail_hash': hashlib.sha1(tail).hexdigest(),
+        'error': None,
+    }
+
+    if previous is not None:
+        if size < previous['size']:
+            problems.append(f'文件变小 {previous["size"]} -> {size}')
+        if previous.get('max_time') and entry['max_time'] and entry['max_time'] < previous['max_time']:
+            problems.append(f'最新时间倒退 {previous["max_time"]} -> {entry["max_time"]}')
+    return entry, status, problems
+
+
+def scan(csv_files, manifest):
+    """
+    扫描所有文件并与清单比对
+
+    Args:
+        csv_files: 小时CSV文件列表
+        manifest: 上一次的清单
+
+    Returns:
+        tuple: (new_manifest, report)
+            report 包含 new/removed/unchanged/appended/rewritten 的文件名列表，
+            以及 problems: {文件名: [异常描述]}
+    """
+    previous_files = manifest.get('files', {})
+    files = {}
+    report = {'new': [], 'removed': [], 'unchanged': [], 'appended': [], 'rewritten': [], 'problems': {}}
+    for csv_file in csv_files:
+        name = os.path.basename(csv_file)
+        try:
+            entry, status, problems = fingerprint_file(csv_file, previous_files.get(name))
+        except Exception as e:
+            report['problems'][name] = [f'扫描失败: {e}']
+            continue
+        files[name] = entry
+        report[status].append(name)
+        if problems:
+            report['problems'][name] = problems
+
+    report['removed'] = sorted(set(previous_files) - set(files))
+    return {'files': files}, report
+
+
+def record_errors(manifest, errors):
+    """
+    把本次读取失败的文件及原因写入清单
+
+    Args:
+        manifest: scan 返回的清单
+        errors: {文件名: 失败原因}
+    """
+    for name, entry in manifest['files'].items():
+        entry['error'] = errors.get(name)
+
+
+def print_report(report, market_type=''):
+    print(f'{market_type}数据清单比对：新增 {len(report["new"])}，下架 {len(report["removed"])}，'
+          f'未变化 {len(report["unchanged"])}，尾部追加 {len(report["appended"])}，重写 {len(report["rewritten"])}')
+    if report['new']:
+        print(f'新增币种: {[symbol_of(name) for name in report["new"]]}')
+    if report['removed']:
+        print(f'下架币种: {[symbol_of(name) for name in report["removed"]]}')
+    for name, problems in report['problems'].items():
+        print(f'数据异常 {name}: {"；".join(problems)}')
+
+
+def check_sync(report, previous_count, max_problem_ratio=0.05, max_removed_ratio=0.1):
+    """
+    判断上游同步是否异常
+
+    Args:
+        report: scan 返回的比对结果
+        previous_count: 上一次清单中的文件数
+        max_problem_ratio: 允许出现异常的文件比例
+        max_removed_ratio: 允许一次消失的文件比例
+
+    Returns:
+        List[str]: 异常描述，为空表示同步正常
+    """
+    issues = []
+    total = sum(len(report[key]) for key in ('new', 'unchanged', 'appended', 'rewritten'))
+    if previous_count > 0 and len(report['removed']) > previous_count * max_removed_ratio:
+        issues.append(f'{len(report["removed"])}/{previous_count} 个文件消失')
+    if total > 0 and len(report['problems']) > total * max_problem_ratio:
+        issues.append(f'{len(report["problems"])}/{total} 个文件异常')
+    if previous_count > 0 and total == 0:
+        issues.append('没有找到任何文件')
+    return issues
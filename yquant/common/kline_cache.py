@@ -0,0 +1,125 @@
+'''
+小时K线列式缓存
+
+把 split/{market_type}/ 下每个币种的小时CSV转存为 Parquet 文件，
+后续运行直接读取已解析好类型的列，省去 CSV 解析和日期解析的开销。
+缓存按源文件的 mtime/size 逐文件失效，源文件一旦变化就重新解析。
+
+依赖 pyarrow；未安装时自动退回为直接读取 CSV。
+'''
+import os
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装 pyarrow 时不使用缓存
+    pa = None
+    pq = None
+
+
+# 小时K线需要读取的列
+HOURLY_COLUMNS = ['candle_begin_time', 'open', 'high', 'low', 'close', 'volume', 'quote_volume', '是否交易']
+
+# 写在 Parquet schema metadata 中的源文件指纹
+_FINGERPRINT_KEY = b'yquant_source_fingerprint'
+
+
+def get_cache_dir(local_data_path):
+    """
+    根据小时CSV目录得到对应的缓存目录
+
+    例如 .../coin-binance-spot-swap-preprocess-pkl-1h/split/swap/
+    对应 .../coin-binance-spot-swap-preprocess-pkl-1h/parquet_cache/swap/
+
+    Args:
+        local_data_path: 小时CSV所在目录
+
+    Returns:
+        str: 缓存目录
+    """
+    local_data_path = os.path.normpath(local_data_path)
+    market_type = os.path.basename(local_data_path)
+    root = os.path.dirname(os.path.dirname(local_data_path))
+    return os.path.join(root, 'parquet_cache', market_type)
+
+
+def source_fingerprint(csv_file):
+    """
+    源文件指纹：mtime(纳秒) + 文件大小
+    """
+    st = os.stat(csv_file)
+    return f'{st.st_mtime_ns}:{st.st_size}'
+
+
+def read_hourly_csv_raw(csv_file):
+    """
+    直接解析小时CSV（不经过缓存）
+    """
+    return pd.read_csv(csv_file, usecols=HOURLY_COLUMNS, parse_dates=['candle_begin_time'])
+
+
+def _cache_file_of(csv_file, cache_dir):
+    return os.path.join(cache_dir, os.path.basename(csv_file)[:-len('.csv')] + '.parquet')
+
+
+def _load_cache(cache_file, fingerprint):
+    """
+    读取缓存，指纹不一致或读取失败时返回 None
+    """
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        metadata = pq.read_schema(cache_file).metadata or {}
+        if metadata.get(_FINGERPRINT_KEY) != fingerprint.encode():
+            return None
+        return pq.read_table(cache_file).to_pandas()
+    except Exception as e:
+        print(f'读取缓存 {os.path.basename(cache_file)} 失败，重新解析CSV: {e}')
+        return None
+
+
+def _save_cache(df, cache_file, fingerprint):
+    """
+    写入缓存，先写临时文件再原子替换，避免并发读到半个文件
+    """
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_FINGERPRINT_KEY] = fingerprint.encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    try:
+        pq.write_table(table, tmp_file)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        print(f'写入缓存 {os.path.basename(cache_file)} 失败: {e}')
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+def read_hourly_csv(csv_file, cache_dir=None):
+    """
+    读取单个币种的小时K线，优先使用列式缓存
+
+    Args:
+        csv_file: 小时CSV文件路径
+        cache_dir: 缓存目录，None 表示不使用缓存
+
+    Returns:
+        DataFrame: 包含 HOURLY_COLUMNS 的小时K线，candle_begin_time 为 datetime 类型
+    """
+    if cache_dir is None or pq is None:
+        return read_hourly_csv_raw(csv_file)
+
+    fingerprint = source_fingerprint(csv_file)
+    cache_file = _cache_file_of(csv_file, cache_dir)
+
+    df = _load_cache(cache_file, fingerprint)
+    if df is not None:
+        return df
+
+    df = read_hourly_csv_raw(csv_file)
+    _save_cache(df, cache_file, fingerprint)
+    return df
@@ -0,0 +1,357 @@
+'''
+本地小时K线读取与日线聚合
+
+load_local_data 的逐文件工作（读取 → 过滤 是否交易 == 1 → resample('D')）放在这里，
+既可以串行执行，也可以通过进程池并行执行。
+子进程只返回紧凑的 numpy 数组而不是 DataFrame，主进程一次性合并为长表。
+'''
+import os
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+import yquant.common.kline_cache as kline_cache
+
+
+# 日线聚合规则，与原 load_local_data 保持一致
+DAILY_AGG = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+    'quote_volume': 'sum',
+    'symbol': 'first'
+}
+
+# 日线长表的列顺序
+DAILY_COLUMNS = ['candle_begin_time', 'open', 'high', 'low', 'close', 'volume', 'quote_volume', 'symbol']
+
+# 跨进程传输的数值列
+_ARRAY_COLUMNS = DAILY_COLUMNS[:-1]
+
+
+def symbol_of(csv_file):
+    """
+    从文件名提取 symbol，例如 BTC-USDT.csv -> BTCUSDT
+    """
+    return os.path.basename(csv_file).replace('.csv', '').replace('-', '')
+
+
+def resample_daily(df, symbol):
+    """
+    单币种小时K线聚合为日线
+
+    Args:
+        df: 小时K线，包含 candle_begin_time/OHLCV/quote_volume/是否交易
+        symbol: 币种名称
+
+    Returns:
+        DataFrame: 日线数据，没有有效交易数据时返回 None
+    """
+    # 过滤有效数据
+    df = df[df['是否交易'] == 1].copy()
+    if len(df) == 0:
+        return None
+
+    df['symbol'] = symbol
+
+    # 聚合为日线数据
+    df.set_index('candle_begin_time', inplace=True)
+    df_daily = df.resample('D').agg(DAILY_AGG).dropna()
+    df_daily.reset_index(inplace=True)
+    return df_daily
+
+
+def resample_daily_all(hourly_df):
+    """
+    多币种小时K线在一次分组聚合中转为日线
+
+    按 (symbol, 当日0点) 分组聚合 open/high/low/close/volume/quote_volume，
+    结果与逐币种调用 resample_daily 后按币种首次出现顺序拼接完全一致（包括 dropna 的行为）
+
+    Args:
+        hourly_df: 多币种堆叠的小时K线，包含 symbol 列
+
+    Returns:
+        DataFrame: 日线长表，列为 DAILY_COLUMNS
+    """
+    # 过滤有效数据
+    df = hourly_df[hourly_df['是否交易'] == 1]
+
+    # 币种按首次出现顺序编码，与逐文件拼接的顺序一致
+    codes, symbols = pd.factorize(df['symbol'])
+    day = df['candle_begin_time'].dt.floor('D').to_numpy()
+
+    agg = {col: how for col, how in DAILY_AGG.items() if col != 'symbol'}
+    df_daily = df[list(agg)].groupby([codes, day], sort=True).agg(agg).dropna()
+
+    df_daily.index.names = ['symbol', 'candle_begin_time']
+    df_daily.reset_index(inplace=True)
+    df_daily['symbol'] = np.asarray(symbols, dtype=object)[df_daily['symbol'].to_numpy()]
+    return df_daily[DAILY_COLUMNS]
+
+
+def aggregate_daily_file(csv_file, cache_dir=None):
+    """
+    读取单个币种文件并聚合为日线，结果以紧凑数组返回
+
+    Args:
+        csv_file: 小时CSV文件路径
+        cache_dir: 列式缓存目录，None 表示不使用缓存
+
+    Returns:
+        tuple: (symbol, arrays, error)
+            - arrays: {列名: numpy数组}，没有有效数据或失败时为 None
+            - error: 失败原因，成功时为 None
+    """
+    symbol = symbol_of(csv_file)
+    try:
+        df = kline_cache.read_hourly_csv(csv_file, cache_dir=cache_dir)
+        df_daily = resample_daily(df, symbol)
+    except Exception as e:
+        return symbol, None, str(e)
+
+    if df_daily is None:
+        return symbol, None, None
+
+    arrays = {col: df_daily[col].to_numpy() for col in _ARRAY_COLUMNS}
+    return symbol, arrays, None
+
+
+def frame_from_arrays(results):
+    """
+    把多个币种的紧凑数组一次性合并为日线长表
+
+    Args:
+        results: [(symbol, arrays), ...]
+
+    Returns:
+        DataFrame: 列为 DAILY_COLUMNS
+    """
+    if not results:
+        return pd.DataFrame(columns=DAILY_COLUMNS)
+
+    data = {col: np.concatenate([arrays[col] for _, arrays in results]) for col in _ARRAY_COLUMNS}
+    lengths = [len(arrays['close']) for _, arrays in results]
+    data['symbol'] = np.repeat(np.array([symbol for symbol, _ in results], dtype=object), lengths)
+    return pd.DataFrame(data, columns=DAILY_COLUMNS)
+
+
+def ingest_daily_grouped(csv_files, cache_dir=None):
+    """
+    读取全部小时K线后堆叠，用 resample_daily_all 一次聚合为日线
+
+    Args:
+        csv_files: 小时CSV文件列表
+        cache_dir: 列式缓存目录，None 表示不使用缓存
+
+    Returns:
+        DataFrame: 所有币种的日线长表
+    """
+    total_files = len(csv_files)
+    hourly_list = []
+    symbols = []
+    errors = {}
+    for idx, csv_file in enumerate(csv_files, 1):
+        # 每处理50个文件显示一次进度
+        if idx % 50 == 0 or idx == total_files:
+            print(f'进度: {idx}/{total_files} ({idx*100//total_files}%)')
+        try:
+            df = kline_cache.read_hourly_csv(csv_file, cache_dir=cache_dir)
+        except Exception as e:
+            print(f'读取文件 {os.path.basename(csv_file)} 失败: {e}')
+            errors[os.path.basename(csv_file)] = str(e)
+            continue
+        # 先用文件序号占位，堆叠后再转为分类类型，避免每行保存一份字符串
+        df['symbol'] = len(symbols)
+        symbols.append(symbol_of(csv_file))
+        hourly_list.append(df)
+
+    if not hourly_list:
+        all_df = pd.DataFrame(columns=DAILY_COLUMNS)
+        all_df.attrs['ingest_errors'] = errors
+        return all_df
+
+    hourly_df = pd.concat(hourly_list, ignore_index=True)
+    hourly_df['symbol'] = pd.Categorical.from_codes(hourly_df['symbol'].to_numpy(), categories=symbols)
+    del hourly_list
+
+    print('正在聚合日线数据...')
+    all_df = resample_daily_all(hourly_df)
+    print(f'成功读取 {all_df["symbol"].nunique()} 个币种的数据')
+    all_df.attrs['ingest_errors'] = errors
+    return all_df
+
+
+def ingest_daily(csv_files, cache_dir=None, njobs=1, grouped=False):
+    """
+    批量读取小时K线并聚合为日线
+
+    Args:
+        csv_files: 小时CSV文件列表
+        cache_dir: 列式缓存目录，None 表示不使用缓存
+        njobs: 进程数，1 表示串行
+        grouped: 是否堆叠全部币种后一次分组聚合（见 resample_daily_all），此时忽略 njobs
+
+    Returns:
+        DataFrame: 所有币种的日线长表，读取失败的文件记录在 attrs['ingest_errors']（{文件名: 原因}）
+    """
+    if grouped:
+        return ingest_daily_grouped(csv_files, cache_dir=cache_dir)
+
+    total_files = len(csv_files)
+
+    if njobs == 1:
+        outputs = []
+        for idx, csv_file in enumerate(csv_files, 1):
+            # 每处理50个文件显示一次进度
+            if idx % 50 == 0 or idx == total_files:
+                print(f'进度: {idx}/{total_files} ({idx*100//total_files}%)')
+            outputs.append(aggregate_daily_file(csv_file, cache_dir))
+    else:
+        # 使用joblib进行多进程处理
+        outputs = Parallel(n_jobs=njobs, verbose=5)(
+            delayed(aggregate_daily_file)(csv_file, cache_dir) for csv_file in csv_files
+        )
+
+    return _merge_outputs(csv_files, outputs)
+
+
+def _merge_outputs(csv_files, outputs):
+    """
+    合并逐文件的 (symbol, arrays, error)，失败的文件记录在 attrs['ingest_errors']
+    """
+    results = []
+    errors = {}
+    for csv_file, (symbol, arrays, error) in zip(csv_files, outputs):
+        if error is not None:
+            print(f'读取文件 {os.path.basename(csv_file)} 失败: {error}')
+            errors[os.path.basename(csv_file)] = error
+            continue
+        if arrays is not None:
+            results.append((symbol, arrays))
+
+    print(f'成功读取 {len(results)} 个币种的数据')
+
+    # 合并所有数据
+    print('正在合并数据...')
+    all_df = frame_from_arrays(results)
+    all_df.attrs['ingest_errors'] = errors
+    return all_df
+
+
+def aggregate_daily_window(csv_file, load_start, end, target_start, min_rows, history_start=None, cache_dir=None):
+    """
+    只聚合 [load_start, end) 的小时K线（重算一段日期的指数时使用），end 为 None 时读到最后
+
+    target_start 之前的日线不足 min_rows 行（窗口内有长时间缺失），而文件中还有更早的数据时，
+    该币种退回聚合全部历史，保证按行计算的涨跌幅、滚动成交额与全量读取相同
+
+    Args:
+        csv_file: 小时CSV文件路径
+        load_start: 读取的起始时间（当天0点）
+        end: 读取的结束时间（不含），None 表示不限
+        target_start: 需要重算的第一天
+        min_rows: target_start 之前至少需要的日线行数
+        history_start: 全量读取时的起始时间（load_local_data 的 start_time），更早的日线不保留
+        cache_dir: 列式缓存目录，None 表示不使用缓存
+
+    Returns:
+        tuple: (symbol, arrays, error)，同 aggregate_daily_file
+    """
+    symbol = symbol_of(csv_file)
+    try:
+        df = kline_cache.read_hourly_csv(csv_file, cache_dir=cache_dir)
+        if end is not None:
+            df = df[df['candle_begin_time'] < end]
+        df_daily = resample_daily(df[df['candle_begin_time'] >= load_start], symbol)
+        rows = 0 if df_daily is None else (df_daily['candle_begin_time'] < target_start).sum()
+        if rows < min_rows and (df['candle_begin_time'] < load_start).any():
+            df_daily = resample_daily(df, symbol)
+        if df_daily is not None and history_start is not None:
+            df_daily = df_daily[df_daily['candle_begin_time'] >= history_start]
+    except Exception as e:
+        return symbol, None, str(e)
+
+    if df_daily is None or len(df_daily) == 0:
+        return symbol, None, None
+
+    arrays = {col: df_daily[col].to_numpy() for col in _ARRAY_COLUMNS}
+    return symbol, arrays, None
+
+
+def ingest_daily_window(csv_files, load_start, end, target_start, min_rows, history_start=None, cache_dir=None,
+                        njobs=1):
+    """
+    批量读取 [load_start, end) 的小时K线并聚合为日线，参数见 aggregate_daily_window
+
+    Returns:
+        DataFrame: 日线长表，列为 DAILY_COLUMNS
+    """
+    if njobs == 1:
+        outputs = [aggregate_daily_window(csv_file, load_start, end, target_start, min_rows, history_start, cache_dir)
+                   for csv_file in csv_files]
+    else:
+        outputs = Parallel(n_jobs=njobs, verbose=5)(
+            delayed(aggregate_daily_window)(csv_file, load_start, end, target_start, min_rows, history_start,
+                                            cache_dir)
+            for csv_file in csv_files
+        )
+    return _merge_outputs(csv_files, outputs)
+
+
+# 小时指数使用的列
+HOURLY_INDEX_COLUMNS = ['candle_begin_time', 'symbol', 'close', 'quote_volume']
+
+
+def ingest_hourly(csv_files, cache_dir=None):
+    """
+    读取所有币种的小时K线，不聚合为日线，直接堆叠为小时长表（供小时级指数使用）
+
+    只保留 是否交易 == 1 的行和 HOURLY_INDEX_COLUMNS 四列，symbol 为分类类型（类别按字母排序），
+    每个币种的行保持文件中的时间顺序
+
+    Args:
+        csv_files: 小时CSV文件列表
+        cache_dir: 列式缓存目录，None 表示不使用缓存
+
+    Returns:
+        DataFrame: 小时长表，读取失败的文件记录在 attrs['ingest_errors']（{文件名: 原因}）
+    """
+    total_files = len(csv_files)
+    hourly_list = []
+    symbols = []
+    errors = {}
+    for idx, csv_file in enumerate(csv_files, 1):
+        # 每处理50个文件显示一次进度
+        if idx % 50 == 0 or idx == total_files:
+            print(f'进度: {idx}/{total_files} ({idx*100//total_files}%)')
+        try:
+            df = kline_cache.read_hourly_csv(csv_file, cache_dir=cache_dir)
+        except Exception as e:
+            print(f'读取文件 {os.path.basename(csv_file)} 失败: {e}')
+            errors[os.path.basename(csv_file)] = str(e)
+            continue
+        df = df.loc[df['是否交易'] == 1, ['candle_begin_time', 'close', 'quote_volume']]
+        if len(df) == 0:
+            continue
+        df['symbol'] = len(symbols)
+        symbols.append(symbol_of(csv_file))
+        hourly_list.append(df)
+
+    if not hourly_list:
+        hourly_df = pd.DataFrame(columns=HOURLY_INDEX_COLUMNS)
+        hourly_df.attrs['ingest_errors'] = errors
+        return hourly_df
+
+    hourly_df = pd.concat(hourly_list, ignore_index=True)
+    del hourly_list
+    # 文件序号 -> 按字母排序的分类编码
+    categories = sorted(set(symbols))
+    remap = np.array([categories.index(symbol) for symbol in symbols])
+    hourly_df['symbol'] = pd.Categorical.from_codes(remap[hourly_df['symbol'].to_numpy()], categories=categories)
+    hourly_df = hourly_df[HOURLY_INDEX_COLUMNS]
+    print(f'成功读取 {len(symbols)} 个币种的数据，共 {len(hourly_df)} 条小时记录')
+    hourly_df.attrs['ingest_errors'] = errors
+    return hourly_df
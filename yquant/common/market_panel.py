@@ -0,0 +1,128 @@
+'''
+市场面板：日期 × 币种 稠密矩阵
+
+把长表 all_df（每行一个 symbol + candle_begin_time）转为按日期、币种对齐的 numpy 矩阵，
+close / quote_volume 各一个矩阵，币种缺失的位置为 NaN。
+面板以 .npy 文件持久化，读取时使用内存映射（只读、不复制），
+两个市场、所有统计周期都可以共享同一份数据。
+local_indices 保存面板后以内存映射方式读取，指数和成员索引在面板上分块计算（index_engine.PanelSection）。
+'''
+import os
+import json
+import numpy as np
+import pandas as pd
+
+
+# 面板保存的数值字段
+PANEL_FIELDS = ['close', 'quote_volume']
+
+
+def get_panel_dir(market_type):
+    """
+    面板保存目录
+    """
+    return os.path.join('/Users/houjl/Downloads/FLdata', market_type, 'panel')
+
+
+class MarketPanel:
+    """
+    日期 × 币种 稠密矩阵
+
+    Attributes:
+        dates: 日期轴，datetime64[ns] 数组，升序
+        symbols: 币种列表，矩阵的列顺序
+        symbol_ids: {symbol: 列号}
+        close: 收盘价矩阵 (日期数, 币种数)
+        quote_volume: 成交额矩阵 (日期数, 币种数)
+    """
+
+    def __init__(self, dates, symbols, close, quote_volume):
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.symbols = list(symbols)
+        self.symbol_ids = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.close = close
+        self.quote_volume = quote_volume
+
+        shape = (len(self.dates), len(self.symbols))
+        for field in PANEL_FIELDS:
+            if getattr(self, field).shape != shape:
+                raise ValueError(f'{field} 矩阵形状 {getattr(self, field).shape} 与日期/币种数 {shape} 不一致')
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.symbols)
+
+    def symbol_id(self, symbol):
+        """
+        币种对应的列号，不存在时返回 None
+        """
+        return self.symbol_ids.get(symbol)
+
+    def frame(self, field):
+        """
+        把某个字段转为 DataFrame（index 为日期，columns 为币种），便于研究和看板使用
+        """
+        return pd.DataFrame(getattr(self, field), index=pd.DatetimeIndex(self.dates, name='candle_begin_time'),
+                            columns=self.symbols)
+
+    @classmethod
+    def from_long(cls, all_df):
+        """
+        从长表构建面板
+
+        Args:
+            all_df: 包含 candle_begin_time/symbol/close/quote_volume 的长表
+
+        Returns:
+            MarketPanel
+        """
+        times = pd.to_datetime(all_df['candle_begin_time']).to_numpy(dtype='datetime64[ns]')
+        dates = np.unique(times)
+        symbol_codes, symbols = pd.factorize(all_df['symbol'], sort=True)
+        date_codes = np.searchsorted(dates, times)
+
+        matrices = {}
+        for field in PANEL_FIELDS:
+            matrix = np.full((len(dates), len(symbols)), np.nan)
+            matrix[date_codes, symbol_codes] = all_df[field].to_numpy(dtype='float64')
+            matrices[field] = matrix
+
+        return cls(dates, list(symbols), **matrices)
+
+    def save(self, panel_dir):
+        """
+        保存为 .npy 文件，每个文件先写临时文件再原子替换
+        """
+        os.makedirs(panel_dir, exist_ok=True)
+        arrays = {'dates': self.dates}
+        arrays.update({field: np.ascontiguousarray(getattr(self, field)) for field in PANEL_FIELDS})
+        for name, array in arrays.items():
+            path = os.path.join(panel_dir, f'{name}.npy')
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, array)
+            os.replace(path + '.tmp', path)
+
+        meta_path = os.path.join(panel_dir, 'meta.json')
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'symbols': self.symbols, 'shape': list(self.shape)}, f, ensure_ascii=False)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    @classmethod
+    def load(cls, panel_dir, mmap=True):
+        """
+        读取面板
+
+        Args:
+            panel_dir: 面板目录
+            mmap: 是否以只读内存映射方式读取矩阵
+
+        Returns:
+            MarketPanel
+        """
+        with open(os.path.join(panel_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        mmap_mode = 'r' if mmap else None
+        dates = np.load(os.path.join(panel_dir, 'dates.npy'))
+        matrices = {field: np.load(os.path.join(panel_dir, f'{field}.npy'), mmap_mode=mmap_mode)
+                    for field in PANEL_FIELDS}
+        return cls(dates, meta['symbols'], **matrices)
@@ -0,0 +1,223 @@
+'''
+中间结果的内容寻址缓存
+
+指数计算链上的中间结果（日线长表、每个周期的涨跌幅、滚动成交额、前N成员索引、各周期指数）
+以"输入数据的指纹 + 参数"为键保存在磁盘上。每一步的键由上游结果的键和本步的参数组成：
+    日线长表      <- 数据清单中小时CSV的 文件名/大小/mtime/尾部哈希 + 起始时间
+    涨跌幅{N}d    <- 日线长表的键 + N
+    滚动成交额    <- 日线长表的键
+    前N成员索引   <- 滚动成交额的键 + 成交额列/top_n/黑名单
+    指数{N}       <- 涨跌幅{N}d 的键 + 成员索引的键
+只改变某个参数（例如山寨指数的黑名单或 top_n）时，它上游各步的键不变，直接读取缓存，
+只重算依赖该参数的部分。
+
+每个条目是 {cache_dir}/{键}.pkl，命中时刷新文件 mtime，
+总大小超过 max_bytes 时按 mtime 淘汰最久未使用的条目（LRU）。
+'''
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+# 缓存总大小上限
+DEFAULT_MAX_BYTES = 4 << 30
+
+# 计算口径变化（派生列、筛选规则）时加一，使旧条目全部失效
+CACHE_VERSION = 1
+
+
+def get_memo_dir():
+    """
+    缓存目录
+    """
+    return os.path.join('/Users/houjl/Downloads/FLdata', 'memo_cache')
+
+
+def fingerprint(*parts):
+    """
+    数据和参数的指纹（sha256 的前32位十六进制）
+
+    DataFrame / Series 按内容哈希（包含列名和类型，不含 index），numpy 数组按字节，
+    list / tuple 逐项，其余按 JSON（键排序）
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        _update(h, part)
+    return h.hexdigest()[:32]
+
+
+def _feed(h, tag, data):
+    # 每段都带类型和长度，避免不同的拼接方式得到相同的字节
+    h.update(f'{tag}:{len(data)}:'.encode())
+    h.update(data)
+
+
+def _update(h, part):
+    if isinstance(part, pd.DataFrame):
+        _feed(h, 'frame', json.dumps([[str(col), str(dtype)] for col, dtype in part.dtypes.items()],
+                                     ensure_ascii=False).encode())
+        _feed(h, 'rows', pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+    elif isinstance(part, pd.Series):
+        _feed(h, 'series', str(part.dtype).encode())
+        _feed(h, 'rows', pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+    elif isinstance(part, np.ndarray):
+        if part.dtype == object:
+            _update(h, pd.Series(part))
+        else:
+            _feed(h, 'array', f'{part.dtype.str}{part.shape}'.encode())
+            _feed(h, 'data', np.ascontiguousarray(part).tobytes())
+    elif isinstance(part, (list, tuple)):
+        _feed(h, 'seq', str(len(part)).encode())
+        for item in part:
+            _update(h, item)
+    else:
+        _feed(h, 'value', json.dumps(part, ensure_ascii=False, sort_keys=True, default=str).encode())
+
+
+def manifest_fingerprint(manifest):
+    """
+    数据清单（见 ingest_manifest.scan）中所有文件的指纹：文件名 + 大小 + mtime(纳秒) + 尾部哈希，与文件顺序无关
+    """
+    stats = [[name, entry['size'], entry['mtime_ns'], entry['tail_hash']]
+             for name, entry in sorted(manifest['files'].items())]
+    return fingerprint('manifest', stats)
+
+
+class MemoCache:
+    """
+    磁盘上的中间结果缓存
+
+    Attributes:
+        cache_dir: 缓存目录
+        max_bytes: 总大小上限，超过时淘汰最久未使用的条目
+        hits / misses: 本对象的命中 / 未命中次数
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or get_memo_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, name, parts=()):
+        """
+        步骤名 + 参数（可以包含上游的键）对应的缓存键
+        """
+        return fingerprint(CACHE_VERSION, name, list(parts))
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def get(self, key):
+        """
+        读取条目并刷新其最近使用时间
+
+        Returns:
+            tuple: (是否命中, 值)
+        """
+        path = self.path(key)
+        if not os.path.exists(path):
+            return False, None
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except Exception as e:
+            print(f'读取缓存 {key} 失败，重新计算: {e}')
+            return False, None
+        return True, value
+
+    def put(self, key, value):
+        """
+        写入条目（先写临时文件再原子替换），然后按大小上限淘汰
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        tmp_file = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, path)
+        except Exception as e:
+            print(f'写入缓存 {key} 失败: {e}')
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return
+        self.evict()
+
+    def memoize(self, name, parts, func, *args, **kwargs):
+        """
+        命中时直接返回缓存，否则计算 func(*args, **kwargs) 并写入缓存
+
+        Args:
+            name: 步骤名，参与键的计算
+            parts: 决定结果的数据指纹 / 上游的键 / 参数，func 的参数中不在 parts 里的部分不能影响结果
+
+        Returns:
+            tuple: (值, 键)，键用于组成下游步骤的键
+        """
+        key = self.key(name, parts)
+        hit, value = self.get(key)
+        if hit:
+            self.hits += 1
+            print(f'缓存命中: {name}')
+            return value, key
+        self.misses += 1
+        print(f'缓存未命中，开始计算: {name}')
+        value = func(*args, **kwargs)
+        self.put(key, value)
+        return value, key
+
+    def entries(self):
+        """
+        所有条目，按最近使用时间升序
+
+        Returns:
+            list: [(mtime, 大小, 路径)]
+        """
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:  # 被其他进程淘汰
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+        return sorted(entries)
+
+    def total_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes=None):
+        """
+        淘汰最久未使用的条目，直到总大小不超过 max_bytes（默认为 self.max_bytes）
+
+        Returns:
+            int: 淘汰的条目数
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        if removed:
+            print(f'缓存超过上限，淘汰 {removed} 个条目')
+        return removed
+
+    def clear(self):
+        return self.evict(max_bytes=0)
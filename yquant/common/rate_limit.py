@@ -0,0 +1,211 @@
+'''
+币安 REST 接口的按权重限频
+
+币安按 IP 统计每分钟的请求权重（合约 fapi 2400，现货 api 6000），不同接口权重不同：
+    K线        合约按 limit 分档（<100: 1, <500: 2, <=1000: 5, 其余 10），现货固定 2
+    exchangeInfo  合约 1，现货 20
+每个进程为合约、现货各维护一个令牌桶（get_limiter），进程内所有请求（包括 asyncio 的并发请求）共用；
+进程池下载时每个进程只分到总额度的 share（1/进程数）。
+每次请求前按权重取令牌，响应后读取 X-MBX-USED-WEIGHT-1M 响应头（本分钟该 IP 已用的权重），
+当其他进程或程序也在使用额度时收紧令牌，本分钟额度用完时等到下一分钟。
+响应头来自 ccxt 实例，并发时可能属于其他请求，因此每分钟只采用见到的最大值（见 WeightLimiter.observe）。
+'''
+import time
+import asyncio
+import threading
+
+
+# 每分钟权重上限
+WEIGHT_PER_MINUTE = {'swap': 2400, 'spot': 6000}
+
+# 令牌桶最多积累多少秒的额度（突发请求的上限）
+BURST_SECONDS = 10
+
+# 已用权重的响应头（不区分大小写）
+USED_WEIGHT_HEADER = 'x-mbx-used-weight-1m'
+
+
+def endpoint_market(func_name):
+    """
+    ccxt 方法名对应的市场：fapi 开头为合约，其余为现货
+    """
+    return 'swap' if func_name.replace('_', '').lower().startswith('fapi') else 'spot'
+
+
+def request_weight(func_name, params=None):
+    """
+    请求的权重
+
+    Args:
+        func_name: ccxt 方法名，例如 fapiPublic_get_continuousklines / publicGetExchangeInfo
+        params: 请求参数，K线按其中的 limit 计算（默认 500）
+    """
+    name = func_name.replace('_', '').lower()
+    limit = int((params or {}).get('limit', 500))
+    if endpoint_market(func_name) == 'swap':
+        if name.endswith('klines'):
+            if limit < 100:
+                return 1
+            if limit < 500:
+                return 2
+            return 5 if limit <= 1000 else 10
+        if name.endswith('exchangeinfo'):
+            return 1
+    else:
+        if name.endswith('klines'):
+            return 2
+        if name.endswith('exchangeinfo'):
+            return 20
+    return 1
+
+
+def used_weight(headers):
+    """
+    从响应头中读取本分钟已用的权重，没有该响应头时返回 None
+    """
+    for key, value in (headers or {}).items():
+        if key.lower() == USED_WEIGHT_HEADER:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+class WeightLimiter:
+    """
+    按权重取令牌的令牌桶，线程安全，同步和异步请求都可以使用
+
+    取令牌时先扣除再计算需要等待的时间（令牌可以为负，表示已预约的额度），
+    因此并发请求按到达顺序依次等待，不会同时醒来
+
+    Attributes:
+        budget: 每分钟可用的权重（上限 * safety）
+        share: 本进程分到的比例
+        rate: 每秒补充的令牌
+        capacity: 令牌桶容量
+        used: 本分钟响应头中见到的最大已用权重
+        minute: used 所属的自然分钟
+        waited: 累计等待的秒数
+    """
+
+    def __init__(self, weight_per_minute, safety=0.8, share=1.0, burst_seconds=BURST_SECONDS):
+        self.budget = weight_per_minute * safety
+        self.share = share
+        self.rate = self.budget * share / 60
+        self.capacity = self.rate * burst_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self.used = None
+        self.minute = None
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, weight):
+        """
+        扣除 weight 个令牌
+
+        Returns:
+            float: 发出请求前需要等待的秒数
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= weight
+            wait = max(-self.tokens / self.rate, self.resume_at - now, 0.0)
+            self.waited += wait
+            return wait
+
+    def acquire(self, weight):
+        wait = self.reserve(weight)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, weight):
+        wait = self.reserve(weight)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def observe(self, headers):
+        """
+        根据响应头中本分钟已用的权重收紧令牌
+
+        响应头读取自 ccxt 实例（last_response_headers），并发请求时可能是其他请求的响应，先后顺序也不确定。
+        已用权重在一分钟内只增不减，因此只采用本分钟见到的最大值，不大于它的值直接忽略，结果与更新顺序无关
+        """
+        used = used_weight(headers)
+        if used is None:
+            return
+        with self.lock:
+            minute = int(time.time() // 60)
+            if minute == self.minute and used <= self.used:
+                return
+            self.minute = minute
+            self.used = used
+            now = time.monotonic()
+            self._refill(now)
+            if used >= self.budget:
+                # 本分钟的额度已用完，等到下一分钟（币安按自然分钟统计）
+                self.tokens = min(self.tokens, 0.0)
+                self.resume_at = max(self.resume_at, now + 60 - time.time() % 60)
+            else:
+                self.tokens = min(self.tokens, (self.budget - used) * self.share)
+
+
+_limiters = {}
+_limiters_lock = threading.RLock()
+
+
+def get_limiter(market_type):
+    """
+    本进程中合约 / 现货共用的限频器
+    """
+    with _limiters_lock:
+        if market_type not in _limiters:
+            configure()
+        return _limiters[market_type]
+
+
+def configure(share=1.0, safety=None):
+    """
+    按本进程分到的比例重新创建限频器（进程池中每个进程调用一次，share = 1 / 进程数）
+    """
+    from yquant.config.config import cfg  # 导入配置
+
+    safety = cfg.binance.weightSafety if safety is None else safety
+    with _limiters_lock:
+        for market_type, weight_per_minute in WEIGHT_PER_MINUTE.items():
+            limiter = _limiters.get(market_type)
+            if limiter is None or limiter.share != share or limiter.budget != weight_per_minute * safety:
+                _limiters[market_type] = WeightLimiter(weight_per_minute, safety=safety, share=share)
+
+
+def limit_call(func, params, func_name):
+    """
+    按权重取令牌后调用 ccxt 方法，并用响应头更新限频器（并发时可能是其他请求的响应头，见 WeightLimiter.observe）
+    """
+    limiter = get_limiter(endpoint_market(func_name))
+    limiter.acquire(request_weight(func_name, params))
+    try:
+        return func() if params is None else func(params)
+    finally:
+        limiter.observe(getattr(getattr(func, '__self__', None), 'last_response_headers', None))
+
+
+async def limit_call_async(func, params, func_name):
+    """
+    limit_call 的异步版本
+    """
+    limiter = get_limiter(endpoint_market(func_name))
+    await limiter.acquire_async(request_weight(func_name, params))
+    try:
+        return await (func() if params is None else func(params))
+    finally:
+        limiter.observe(getattr(getattr(func, '__self__', None), 'last_response_headers', None))
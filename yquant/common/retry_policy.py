@@ -0,0 +1,321 @@
+'''
+币安 REST 接口的重试策略
+
+替代原先 robust_ 的"失败后等2秒，最多5次"：
+    可重试的错误（网络错误、超时、5xx）  指数退避加随机抖动（full jitter），最多 MAX_ATTEMPTS 次
+    429（请求过多）                    按 Retry-After 响应头等待（没有时等到下一分钟，权重按分钟计算），
+                                        并暂停该市场的所有请求（频率超限按 IP 计算）
+    418 / IP 被封禁                     打开熔断器，所有进程、所有协程对该市场的请求暂停到封禁结束
+                                        （Retry-After 或错误信息中的 banned until），封禁超过 MAX_BAN_WAIT 时直接失败
+    其他 4xx（参数错误、交易对不存在等）  不重试，直接抛出
+错误类型按 ccxt 的异常类型和异常信息中本次请求的响应体（币安的错误为 {"code", "msg"}）判断：
+币安的 418 和 429 在 ccxt 中都是 DDoSProtection，封禁时错误信息中带有 banned until。
+不读取 ccxt 实例的 last_http_response / last_response_headers，数百个协程并发时它们属于其他请求。
+合约、现货各一个熔断器（get_breaker），恢复时间同时记录在进程内和 FLdata/binance_breaker/{market_type} 中，
+进程池下载时各进程都能看到。
+每个接口分别统计调用、重试、失败次数（retry_stats），统计只在本进程内。
+'''
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+
+from yquant.common import rate_limit
+
+
+# 每次调用最多尝试的次数
+MAX_ATTEMPTS = 5
+
+# 退避时间的基数和上限（秒），第 n 次重试等待 [0, min(MAX_DELAY, BASE_DELAY * 2**n)) 内的随机时间
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+# 418 没有给出封禁时间时的暂停时间（秒）
+DEFAULT_BAN_PAUSE = 120
+
+# 封禁时间超过该值（秒）时不再等待，直接失败
+MAX_BAN_WAIT = 600
+
+# 可以重试的币安错误码：未知错误、断开连接、请求过多、响应异常、后端超时、服务繁忙
+RETRYABLE_CODES = {-1000, -1001, -1003, -1006, -1007, -1008}
+
+_BANNED_UNTIL_RE = re.compile(r'banned until (\d{13})')
+
+# ccxt 由响应内容抛出的异常信息为 "binance {...}" 或 "binance 429 Too Many Requests {...}"
+_ERROR_BODY_RE = re.compile(r'\{.*\}', re.S)
+
+
+def get_breaker_dir():
+    """
+    熔断器状态文件的目录
+    """
+    return os.path.join('/Users/houjl/Downloads/FLdata', 'binance_breaker')
+
+
+class RetryError(Exception):
+    """
+    重试次数用完或封禁时间过长
+    """
+
+
+def api_error(e):
+    """
+    异常信息中币安返回的错误（ccxt 把本次请求的响应体放在异常信息末尾）
+
+    Returns:
+        dict: {'code': 负数错误码, 'msg': 错误信息}，异常不是由币安的错误响应抛出时返回 None
+    """
+    match = _ERROR_BODY_RE.search(str(e))
+    if match is None:
+        return None
+    try:
+        error = json.loads(match.group(0))
+    except ValueError:
+        return None
+    if isinstance(error, dict) and isinstance(error.get('code'), int) and error['code'] < 0:
+        return error
+    return None
+
+
+def banned_until(e):
+    """
+    IP 被封禁时的恢复时间（毫秒），没有被封禁时返回 None
+    """
+    match = _BANNED_UNTIL_RE.search(str(e))
+    return int(match.group(1)) if match else None
+
+
+def response_headers(e):
+    """
+    本次请求的响应头
+
+    同步 ccxt 在处理 requests 的 HTTPError 时抛出错误，异常链中带有本次的响应；
+    异步 ccxt 不保留每次请求的响应头，返回空 dict
+    """
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        headers = getattr(getattr(e, 'response', None), 'headers', None)
+        if headers is not None:
+            return headers
+        e = e.__cause__ or e.__context__
+    return {}
+
+
+def classify(e):
+    """
+    错误类型
+
+    Args:
+        e: 调用抛出的异常
+
+    Returns:
+        str: 'ban'（418 / IP 被封禁）、'rate_limit'（429）、'fatal'（不可重试的 4xx）、'retry'（其他）
+    """
+    import ccxt
+
+    if isinstance(e, (ccxt.DDoSProtection, ccxt.RateLimitExceeded)):
+        return 'ban' if banned_until(e) is not None else 'rate_limit'
+    if isinstance(e, (ccxt.BadRequest, ccxt.AuthenticationError, ccxt.PermissionDenied, ccxt.NotSupported)):
+        # 交易所明确拒绝（参数错误、交易对不存在、鉴权失败等），重试不会成功
+        return 'fatal'
+    if isinstance(e, ccxt.BaseError) and e.__cause__ is None:
+        # 由响应内容抛出的异常（网络错误由底层异常转换，带有 __cause__）：币安给出了不可重试的错误码
+        error = api_error(e)
+        if error is not None and error['code'] not in RETRYABLE_CODES:
+            return 'fatal'
+    return 'retry'
+
+
+def retry_after(e):
+    """
+    服务器要求等待的秒数：错误信息中的 banned until 或本次响应的 Retry-After 响应头，没有时返回 None
+    """
+    until = banned_until(e)
+    if until is not None:
+        return max(until / 1000 - time.time(), 0)
+    for key, value in response_headers(e).items():
+        if key.lower() == 'retry-after':
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def backoff(attempt):
+    """
+    第 attempt 次重试前等待的秒数（指数退避加随机抖动）
+    """
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    熔断器：打开后所有请求暂停到恢复时间
+
+    Attributes:
+        path: 状态文件，供其他进程读取
+        open_until: 本进程已知的恢复时间（秒）
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    def trip(self, seconds):
+        """
+        打开熔断器 seconds 秒
+        """
+        until = time.time() + seconds
+        with self.lock:
+            if until <= self.open_until:
+                return
+            self.open_until = until
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_file = f'{self.path}.{os.getpid()}.tmp'
+                with open(tmp_file, 'w') as f:
+                    f.write(str(int(until * 1000)))
+                os.replace(tmp_file, self.path)
+            except OSError as e:
+                print(f'写入熔断器状态失败: {e}')
+        print(f'熔断器打开，暂停{os.path.basename(self.path)}的所有请求 {seconds:.0f}s')
+
+    def remaining(self):
+        """
+        距离恢复请求还有多少秒（包括其他进程打开的熔断器）
+        """
+        until = self.open_until
+        try:
+            with open(self.path) as f:
+                until = max(until, int(f.read().strip() or 0) / 1000)
+        except (OSError, ValueError):
+            pass
+        return max(until - time.time(), 0.0)
+
+    def _check(self, func_name):
+        seconds = self.remaining()
+        if seconds > MAX_BAN_WAIT:
+            raise RetryError(f'{func_name} IP 被封禁，{seconds:.0f}s 后才能恢复请求')
+        return seconds
+
+    def wait(self, func_name=''):
+        seconds = self._check(func_name)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    async def wait_async(self, func_name=''):
+        seconds = self._check(func_name)
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(market_type):
+    """
+    本进程中合约 / 现货各自的熔断器（状态文件 {get_breaker_dir()}/{market_type}）
+    """
+    with _breakers_lock:
+        if market_type not in _breakers:
+            _breakers[market_type] = CircuitBreaker(os.path.join(get_breaker_dir(), market_type))
+        return _breakers[market_type]
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _count(func_name, field):
+    with _stats_lock:
+        stats = _stats.setdefault(func_name, {'calls': 0, 'retries': 0, 'failures': 0, 'fatal': 0, 'bans': 0})
+        stats[field] += 1
+
+
+def retry_stats():
+    """
+    本进程各接口的调用统计
+
+    Returns:
+        dict: {接口名: {'calls', 'retries', 'failures', 'fatal', 'bans'}}
+    """
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def print_retry_stats():
+    for name, stats in retry_stats().items():
+        print(f'{name}: 调用 {stats["calls"]} 次，重试 {stats["retries"]} 次，失败 {stats["failures"]} 次，'
+              f'不可重试 {stats["fatal"]} 次，封禁 {stats["bans"]} 次')
+
+
+def _next_wait(e, func_name, attempt, breaker):
+    """
+    处理一次失败：不可重试时抛出，否则返回重试前等待的秒数（418 / 429 时打开熔断器，等待由熔断器完成）
+    """
+    kind = classify(e)
+    print(f'{func_name} 第{attempt + 1}次调用失败（{kind}）: {str(e)}')
+    if kind == 'fatal':
+        _count(func_name, 'fatal')
+        raise e
+    if kind == 'ban':
+        _count(func_name, 'bans')
+        seconds = retry_after(e)
+        seconds = DEFAULT_BAN_PAUSE if seconds is None else seconds
+        if seconds > MAX_BAN_WAIT:
+            _count(func_name, 'failures')
+            breaker.trip(seconds)
+            raise RetryError(f'{func_name} IP 被封禁 {seconds:.0f}s，停止请求') from e
+        breaker.trip(seconds)
+        return 0.0
+    if kind == 'rate_limit':
+        seconds = retry_after(e)
+        # 没有本次的 Retry-After（异步 ccxt）时等到下一分钟，币安的请求权重按分钟重置
+        breaker.trip(60 - time.time() % 60 if seconds is None else seconds)
+        return 0.0
+    return backoff(attempt)
+
+
+def call(func, params=None, func_name=''):
+    """
+    按重试策略调用 ccxt 方法（经过权重限频，见 rate_limit）
+    """
+    _count(func_name, 'calls')
+    breaker = get_breaker(rate_limit.endpoint_market(func_name))
+    for attempt in range(MAX_ATTEMPTS):
+        breaker.wait(func_name)
+        try:
+            return rate_limit.limit_call(func, params, func_name)
+        except Exception as e:
+            wait = _next_wait(e, func_name, attempt, breaker)
+            if attempt == MAX_ATTEMPTS - 1:
+                _count(func_name, 'failures')
+                raise RetryError(f'{func_name} 调用失败') from e
+            _count(func_name, 'retries')
+            time.sleep(wait)
+
+
+async def call_async(func, params=None, func_name=''):
+    """
+    call 的异步版本
+    """
+    _count(func_name, 'calls')
+    breaker = get_breaker(rate_limit.endpoint_market(func_name))
+    for attempt in range(MAX_ATTEMPTS):
+        await breaker.wait_async(func_name)
+        try:
+            return await rate_limit.limit_call_async(func, params, func_name)
+        except Exception as e:
+            wait = _next_wait(e, func_name, attempt, breaker)
+            if attempt == MAX_ATTEMPTS - 1:
+                _count(func_name, 'failures')
+                raise RetryError(f'{func_name} 调用失败') from e
+            _count(func_name, 'retries')
+            await asyncio.sleep(wait)
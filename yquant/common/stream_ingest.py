@@ -0,0 +1,216 @@
+'''
+流式日线聚合
+
+按块读取小时CSV，把每块数据折叠进逐日的聚合结果，已经结束的日线写入输出文件，
+内存占用只取决于配置的预算（块大小 + 待写出的日线缓冲），与小时历史长度无关。
+聚合口径与 resample('D').agg(...).dropna() 一致。
+
+要求小时CSV按 candle_begin_time 升序排列；遇到乱序的文件时退回为整文件读取。
+输出优先写 Parquet（需要 pyarrow），否则追加写 CSV。
+'''
+import os
+import numpy as np
+import pandas as pd
+
+from yquant.common.kline_cache import HOURLY_COLUMNS, pa, pq
+from yquant.common.local_ingest import DAILY_AGG, DAILY_COLUMNS, resample_daily, symbol_of
+
+
+# 参与聚合的数值列
+_AGG_COLUMNS = [col for col in DAILY_AGG if col != 'symbol']
+
+# 估算的单行内存占用（字节），用于把内存预算换算为行数
+_HOURLY_ROW_BYTES = 200
+_DAILY_ROW_BYTES = 150
+
+
+def get_stream_dir(local_data_path):
+    """
+    根据小时CSV目录得到流式输出目录
+
+    例如 .../coin-binance-spot-swap-preprocess-pkl-1h/split/swap/
+    对应 .../coin-binance-spot-swap-preprocess-pkl-1h/daily_stream/swap/
+    """
+    local_data_path = os.path.normpath(local_data_path)
+    market_type = os.path.basename(local_data_path)
+    root = os.path.dirname(os.path.dirname(local_data_path))
+    return os.path.join(root, 'daily_stream', market_type)
+
+
+class DailyWriter:
+    """
+    日线输出文件，缓冲满后整批写出
+    """
+
+    def __init__(self, out_dir, buffer_rows):
+        os.makedirs(out_dir, exist_ok=True)
+        self.buffer_rows = buffer_rows
+        self.buffer = []
+        self.buffered = 0
+        self.writer = None
+        if pq is not None:
+            self.path = os.path.join(out_dir, 'daily.parquet')
+        else:
+            self.path = os.path.join(out_dir, 'daily.csv')
+        self.tmp_path = self.path + '.tmp'
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def write(self, df_daily):
+        if len(df_daily) == 0:
+            return
+        self.buffer.append(df_daily)
+        self.buffered += len(df_daily)
+        if self.buffered >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        df = pd.concat(self.buffer, ignore_index=True)[DAILY_COLUMNS]
+        self.buffer = []
+        self.buffered = 0
+        if pq is not None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.tmp_path, table.schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+        else:
+            df.to_csv(self.tmp_path, mode='a', header=not os.path.exists(self.tmp_path), index=False)
+
+    def close(self):
+        """
+        写出剩余缓冲并替换正式文件，返回输出文件路径（没有任何数据时返回 None）
+        """
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+        if not os.path.exists(self.tmp_path):
+            return None
+        os.replace(self.tmp_path, self.path)
+        return self.path
+
+    def read(self):
+        if self.path.endswith('.parquet'):
+            return pd.read_parquet(self.path)
+        return pd.read_csv(self.path, parse_dates=['candle_begin_time'])
+
+
+def _aggregate_chunk(chunk):
+    """
+    单个数据块按日聚合，index 为当日0点
+    """
+    chunk = chunk[chunk['是否交易'] == 1]
+    day = chunk['candle_begin_time'].dt.floor('D').to_numpy()
+    agg = {col: DAILY_AGG[col] for col in _AGG_COLUMNS}
+    return chunk[_AGG_COLUMNS].astype('float64').groupby(day).agg(agg)
+
+
+def _merge_partial(earlier, later):
+    """
+    合并同一天被数据块边界切开的两段聚合结果
+    """
+    return pd.Series({
+        'open': earlier['open'] if pd.notna(earlier['open']) else later['open'],
+        'high': np.fmax(earlier['high'], later['high']),
+        'low': np.fmin(earlier['low'], later['low']),
+        'close': later['close'] if pd.notna(later['close']) else earlier['close'],
+        'volume': earlier['volume'] + later['volume'],
+        'quote_volume': earlier['quote_volume'] + later['quote_volume'],
+    }, name=later.name)
+
+
+def _finish(daily, symbol):
+    daily = daily.dropna()
+    daily.index.name = 'candle_begin_time'
+    daily = daily.reset_index()
+    daily['symbol'] = symbol
+    return daily
+
+
+def stream_daily_file(csv_file, chunk_rows):
+    """
+    按块读取单个币种的小时CSV，逐块产出已经结束的日线
+
+    Args:
+        csv_file: 小时CSV文件路径
+        chunk_rows: 每块读取的行数
+
+    Yields:
+        DataFrame: 已结束的日线，列为 DAILY_COLUMNS
+    """
+    symbol = symbol_of(csv_file)
+    carry = None  # 最后一天可能延续到下一块，暂不写出
+    last_time = None
+    reader = pd.read_csv(csv_file, usecols=HOURLY_COLUMNS, parse_dates=['candle_begin_time'], chunksize=chunk_rows)
+    for chunk in reader:
+        times = chunk['candle_begin_time']
+        if not times.is_monotonic_increasing or (last_time is not None and times.iloc[0] < last_time):
+            raise ValueError('小时K线未按时间升序排列')
+        last_time = times.iloc[-1]
+
+        daily = _aggregate_chunk(chunk)
+        if carry is not None:
+            if len(daily) > 0 and daily.index[0] == carry.name:
+                daily.iloc[0] = _merge_partial(carry, daily.iloc[0])
+            else:
+                daily = pd.concat([carry.to_frame().T, daily])
+        if len(daily) == 0:
+            continue
+
+        carry = daily.iloc[-1]
+        if len(daily) > 1:
+            yield _finish(daily.iloc[:-1], symbol)
+
+    if carry is not None:
+        yield _finish(carry.to_frame().T, symbol)
+
+
+def ingest_daily_streaming(csv_files, out_dir, memory_budget_mb=256):
+    """
+    流式读取所有币种的小时K线，日线写入 out_dir 后读回
+
+    Args:
+        csv_files: 小时CSV文件列表
+        out_dir: 日线输出目录
+        memory_budget_mb: 内存预算（MB），一半用于读取块，一半用于日线写出缓冲
+
+    Returns:
+        DataFrame: 所有币种的日线长表
+    """
+    budget = memory_budget_mb * 1024 * 1024
+    chunk_rows = max(1000, budget // 2 // _HOURLY_ROW_BYTES)
+    writer = DailyWriter(out_dir, buffer_rows=max(1000, budget // 2 // _DAILY_ROW_BYTES))
+
+    total_files = len(csv_files)
+    n_success = 0
+    errors = {}
+    for idx, csv_file in enumerate(csv_files, 1):
+        # 每处理50个文件显示一次进度
+        if idx % 50 == 0 or idx == total_files:
+            print(f'进度: {idx}/{total_files} ({idx*100//total_files}%)')
+        try:
+            # 单个币种的日线只有几千行，整文件结束后再交给 writer，乱序时可以干净地退回整文件读取
+            try:
+                parts = list(stream_daily_file(csv_file, chunk_rows))
+            except ValueError as e:
+                print(f'{os.path.basename(csv_file)}: {e}，整文件读取')
+                df_hourly = pd.read_csv(csv_file, usecols=HOURLY_COLUMNS, parse_dates=['candle_begin_time'])
+                df_daily = resample_daily(df_hourly, symbol_of(csv_file))
+                parts = [] if df_daily is None else [df_daily]
+        except Exception as e:
+            print(f'读取文件 {os.path.basename(csv_file)} 失败: {e}')
+            errors[os.path.basename(csv_file)] = str(e)
+            continue
+
+        for df_daily in parts:
+            writer.write(df_daily)
+        n_success += any(len(df_daily) > 0 for df_daily in parts)
+
+    print(f'成功读取 {n_success} 个币种的数据')
+    if writer.close() is None:
+        all_df = pd.DataFrame(columns=DAILY_COLUMNS)
+    else:
+        all_df = writer.read()
+    all_df.attrs['ingest_errors'] = errors
+    return all_df
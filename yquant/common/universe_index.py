@@ -0,0 +1,205 @@
+'''
+成交额前N成员索引
+
+两种指数每天都要回答"这一天成交额最大的50个币种是哪些"：
+山寨指数按 365 日均成交额（排除黑名单），全市场涨跌幅指数按 7 日成交额。
+成员索引把每个时间点的前N成员（币种编号，按名次排列）保存下来：
+    - 每次数据更新只筛选一次，所有周期的指数直接使用（见 index_engine.index_frames）
+    - 保存为 FLdata/{market_type}/universe/{名称}.npz，看板和研究脚本可以直接查询历史成员
+
+文件内容：
+    dates: 时间点（datetime64[ns]）
+    symbols: 币种列表（排序后），members 中的编号即在其中的位置
+    members: (时间点数, top_n) 的 int32 矩阵，每行按名次排列，不足 top_n 个时用 -1 补齐
+    meta: 成交额列、top_n、黑名单
+'''
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from yquant.common import index_engine
+
+
+def get_universe_dir(market_type):
+    """
+    成员索引目录
+    """
+    return os.path.join('/Users/houjl/Downloads/FLdata', market_type, 'universe')
+
+
+class Universe:
+    """
+    每个时间点成交额前N的成员
+
+    Attributes:
+        dates: 时间点，datetime64[ns]，升序
+        symbols: 币种列表（排序后）
+        members: (len(dates), top_n) int32 矩阵，按名次排列的币种编号，-1 为空位
+        volume_col: 筛选使用的成交额列
+        top_n: 入选数量
+        blacklist: 排除的币种
+    """
+
+    def __init__(self, dates, symbols, members, volume_col, top_n, blacklist=()):
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.symbols = [str(symbol) for symbol in symbols]
+        self.members = np.asarray(members, dtype='int32')
+        self.volume_col = volume_col
+        self.top_n = int(top_n)
+        self.blacklist = [str(symbol) for symbol in blacklist]
+
+    def __len__(self):
+        return len(self.dates)
+
+    def same_definition(self, volume_col, top_n, blacklist=()):
+        """
+        是否按同样的成交额列、top_n、黑名单筛选
+        """
+        return (self.volume_col == volume_col and self.top_n == top_n
+                and sorted(self.blacklist) == sorted(str(symbol) for symbol in blacklist))
+
+    def members_on(self, date):
+        """
+        某个时间点按名次排列的成员，时间点不存在时返回空列表
+        """
+        row = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(date), 'ns'))
+        if row >= len(self.dates) or self.dates[row] != np.datetime64(pd.Timestamp(date), 'ns'):
+            return []
+        return [self.symbols[i] for i in self.members[row] if i >= 0]
+
+    def membership(self, symbol):
+        """
+        某个币种每个时间点的名次，不在前N时为 NaN
+
+        Returns:
+            Series: index 为时间点
+        """
+        rank = np.full(len(self.dates), np.nan)
+        if symbol in self.symbols:
+            rows, positions = np.nonzero(self.members == self.symbols.index(symbol))
+            rank[rows] = positions + 1
+        return pd.Series(rank, index=pd.DatetimeIndex(self.dates, name='candle_begin_time'), name=symbol)
+
+    def to_frame(self):
+        """
+        长表形式：candle_begin_time/名次/symbol
+        """
+        rows, positions = np.nonzero(self.members >= 0)
+        return pd.DataFrame({
+            'candle_begin_time': self.dates[rows],
+            '名次': positions + 1,
+            'symbol': np.asarray(self.symbols, dtype=object)[self.members[rows, positions]],
+        })
+
+    def mask(self, dates, symbols):
+        """
+        给定时间点和币种列顺序的成员布尔矩阵，用于替代 index_engine.top_n_mask
+
+        Args:
+            dates: 时间点，必须都在成员索引中
+            symbols: 矩阵的列（币种），成员必须都在其中
+
+        Returns:
+            np.ndarray: (len(dates), len(symbols)) 布尔矩阵
+        """
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        rows = np.searchsorted(self.dates, dates)
+        if (rows >= len(self.dates)).any() or (self.dates[np.minimum(rows, len(self.dates) - 1)] != dates).any():
+            raise ValueError('成员索引不包含所有需要的时间点')
+        members = self.members[rows]
+
+        columns = np.searchsorted(symbols, self.symbols)
+        found = np.zeros(len(self.symbols), dtype=bool)
+        inside = columns < len(symbols)
+        found[inside] = np.asarray(symbols, dtype=object)[columns[inside]] == np.asarray(self.symbols, dtype=object)[inside]
+        if not found[members[members >= 0]].all():
+            raise ValueError('成员索引中的币种不在当前数据中')
+
+        out = np.zeros((len(dates), len(symbols)), dtype=bool)
+        rows, positions = np.nonzero(members >= 0)
+        out[rows, columns[members[rows, positions]]] = True
+        return out
+
+    def splice(self, newer, from_date, to_date=None):
+        """
+        用 newer 替换 from_date 及之后（to_date 不为 None 时到 to_date 为止）的时间点，两者的筛选口径必须相同
+
+        增量更新时 to_date 为 None；重算一段日期时只替换 [from_date, to_date]，之后的时间点保持不变
+
+        Returns:
+            Universe: 新的成员索引，币种列表为两者的并集
+        """
+        if not self.same_definition(newer.volume_col, newer.top_n, newer.blacklist):
+            raise ValueError('成员索引的筛选口径不同，不能拼接')
+        from_date = np.datetime64(pd.Timestamp(from_date), 'ns')
+        old_before = self.dates < from_date
+        new_rows = newer.dates >= from_date
+        if to_date is None:
+            old_after = np.zeros(len(self.dates), dtype=bool)
+        else:
+            to_date = np.datetime64(pd.Timestamp(to_date), 'ns')
+            old_after = self.dates > to_date
+            new_rows &= newer.dates <= to_date
+        symbols = sorted(set(self.symbols) | set(newer.symbols))
+
+        def remap(universe, rows):
+            ids = np.searchsorted(symbols, universe.symbols).astype('int32')
+            members = universe.members[rows]
+            return np.where(members >= 0, ids[np.maximum(members, 0)], -1)
+
+        return Universe(np.concatenate([self.dates[old_before], newer.dates[new_rows], self.dates[old_after]]), symbols,
+                        np.concatenate([remap(self, old_before), remap(newer, new_rows), remap(self, old_after)]),
+                        self.volume_col, self.top_n, self.blacklist)
+
+
+def build_universe(features, volume_col, top_n=50, blacklist=(), section=None):
+    """
+    从长表筛选每个时间点成交额前 top_n 的成员（口径同 index_engine.top_n_mask，并列按币种顺序）
+
+    Args:
+        features: 包含 candle_begin_time/symbol/volume_col 的长表，按 symbol 稳定排序，或包含 volume_col 的 PanelSection
+        volume_col: 筛选使用的成交额列
+        top_n: 入选数量
+        blacklist: 排除的币种
+        section: 已有的 index_engine.CrossSection，可省去重建
+
+    Returns:
+        Universe
+    """
+    section = section if section is not None else index_engine.cross_section(features)
+    excluded = np.isin(section.symbols, list(blacklist))
+    members = np.full((len(section.dates), top_n), -1, dtype='int32')
+    for start, stop, matrices in section.blocks([volume_col]):
+        volume = np.where(excluded, np.nan, matrices[volume_col])
+        mask = index_engine.top_n_mask(volume, top_n)
+        # 成员按名次排列：成交额降序，并列按列顺序
+        order = np.argsort(-np.where(mask, volume, np.nan), axis=1, kind='stable')[:, :top_n]
+        count = mask.sum(axis=1)
+        members[start:stop, :order.shape[1]] = np.where(np.arange(order.shape[1]) < count[:, None], order, -1)
+    return Universe(section.dates, section.symbols, members, volume_col, top_n, blacklist)
+
+
+def save_universe(path, universe):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    meta = {'volume_col': universe.volume_col, 'top_n': universe.top_n, 'blacklist': universe.blacklist}
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, dates=universe.dates.astype('int64'), symbols=np.asarray(universe.symbols, dtype=str),
+                 members=universe.members, meta=np.asarray(json.dumps(meta, ensure_ascii=False)))
+    os.replace(path + '.tmp', path)
+
+
+def load_universe(path):
+    """
+    读取成员索引，不存在或损坏时返回 None
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return Universe(data['dates'].astype('datetime64[ns]'), data['symbols'].tolist(), data['members'],
+                            meta['volume_col'], meta['top_n'], meta['blacklist'])
+    except Exception as e:
+        print(f'读取成员索引失败: {e}')
+        return None
@@ -9,10 +9,11 @@ class BinanceConfig:
     def __init__(self):
         # API请求基础配置
         self.timeout = 30000  # 超时时间（毫秒）
-        self.rateLimit = 1000  # 请求频率限制（毫秒）
+        self.rateLimit = 1000  # 请求频率限制（毫秒），仅在 enableRateLimit 时由 ccxt 使用
+        self.weightSafety = 0.8  # 每分钟只使用交易所权重上限的比例（见 yquant/common/rate_limit.py）
         self.verbose = False  # 是否显示详细日志
         self.hostname = 'fapi.binance.com'  # API主机名，修改为futures API
-        self.enableRateLimit = True  # 是否启用频率限制
+        self.enableRateLimit = False  # 是否启用 ccxt 的固定间隔限频，下载K线时按权重限频（rate_limit）
         # 代理配置
         self.proxies = {
             # "http": "http://127.0.0.1:8888",